@@ -0,0 +1,519 @@
+"""
+Abertura de aplicativos por voz ("Mirai, abre o Spotify")
+
+- Índice dos aplicativos montado uma vez (nome, nomes traduzidos, nome
+  genérico, palavras-chave e o executável de cada .desktop)
+- Atualização incremental: só os arquivos que mudaram são lidos de novo
+  (watchdog se estiver instalado, senão verificação periódica das pastas)
+- Busca por trigramas do texto e de uma chave fonética (esqueleto de
+  consoantes), para aceitar o que o reconhecimento de fala entende,
+  ex: "espotifai" -> Spotify, "discorde" -> Discord
+- Tudo pré-calculado: resolver um nome leva microssegundos
+"""
+import os
+import re
+import sys
+import time
+import shlex
+import threading
+import subprocess
+import unicodedata
+from math import ceil
+from collections import defaultdict
+
+PASTAS_LINUX = (
+    "~/.local/share/applications",
+    "/usr/share/applications",
+    "/usr/local/share/applications",
+    "/var/lib/flatpak/exports/share/applications",
+    "~/.local/share/flatpak/exports/share/applications",
+    "/var/lib/snapd/desktop/applications",
+)
+PASTAS_WINDOWS = (
+    r"%APPDATA%\Microsoft\Windows\Start Menu\Programs",
+    r"%PROGRAMDATA%\Microsoft\Windows\Start Menu\Programs",
+)
+PASTAS_MAC = ("/Applications", "~/Applications", "/System/Applications")
+
+# Idiomas lidos dos campos traduzidos (Name[pt_BR]=...)
+IDIOMAS = ("pt_BR", "pt")
+
+# Peso de cada tipo de apelido na pontuação
+PESOS = {"name": 1.0, "exec": 0.9, "generic": 0.85, "keyword": 0.8}
+# Apelidos genéricos ("Jogos", "Music Player") dizem pouco sobre qual app é
+APELIDOS_FRACOS = ("generic", "keyword")
+
+# Códigos de campo do Exec (%f, %U...) que não vão para a linha de comando
+CODIGOS_EXEC = re.compile(r"%[fFuUdDnNickvm]")
+
+ACENTOS = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüçñ", "aaaaaeeeeiiiiooooouuuucn")
+
+# Regras da chave fonética, aplicadas em ordem sobre o texto sem acentos
+REGRAS_FONETICAS = [
+    (re.compile(r"\bes(?=[bcdfgkmpqstvz])"), ""),  # "espotifai" -> "potifai" (o s volta abaixo)
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"(ch|sh)"), "x"),
+    (re.compile(r"(ck|qu|q|c(?=[aoukrlt])|c$)"), "k"),
+    (re.compile(r"c"), "s"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"w"), "u"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"h"), ""),
+]
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só letras/números separados por espaço"""
+    texto = texto.lower().translate(ACENTOS)
+    if not texto.isascii():
+        texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+
+def chave_fonetica(texto):
+    """
+    Esqueleto de consoantes de cada palavra (a primeira letra é mantida)
+
+    Aproxima grafias em inglês do que o ASR em português devolve:
+    "spotify" e "espotifai" viram "sptf"; "steam" e "estim" viram "stm".
+    """
+    palavras = []
+    for palavra in normalizar(texto).split():
+        original = palavra
+        for regra, troca in REGRAS_FONETICAS:
+            palavra = regra.sub(troca, palavra)
+        if original.startswith("es") and not palavra.startswith("s") and palavra != original:
+            palavra = "s" + palavra  # "espotifai" -> "spotifai"
+        if not palavra:
+            continue
+        esqueleto = palavra[0] + re.sub(r"[aeiou]", "", palavra[1:])
+        palavras.append(re.sub(r"(.)\1+", r"\1", esqueleto))
+    return " ".join(palavras)
+
+
+def trigramas(texto):
+    """Trigramas com as bordas de cada palavra marcadas"""
+    grams = set()
+    for palavra in texto.split():
+        padded = f" {palavra} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def ler_desktop(path):
+    """
+    Lê um arquivo .desktop
+
+    Returns:
+        dict com name, exec e aliases [(tipo, texto)], ou None se não for um
+        aplicativo que aparece no menu
+    """
+    entry = {}
+    section = None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("["):
+                    section = line
+                    continue
+                if section != "[Desktop Entry]" or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                entry[key.strip()] = value.strip()
+    except OSError:
+        return None
+
+    if entry.get("Type", "Application") != "Application":
+        return None
+    if entry.get("NoDisplay", "").lower() == "true" or entry.get("Hidden", "").lower() == "true":
+        return None
+    if "Name" not in entry or "Exec" not in entry:
+        return None
+
+    def localizados(campo):
+        valores = [entry[campo]] if campo in entry else []
+        valores += [entry[f"{campo}[{lang}]"] for lang in IDIOMAS if f"{campo}[{lang}]" in entry]
+        return valores
+
+    comando = CODIGOS_EXEC.sub("", entry["Exec"]).strip()
+    aliases = [("name", nome) for nome in localizados("Name")]
+    aliases += [("generic", nome) for nome in localizados("GenericName")]
+    for valor in localizados("Keywords"):
+        aliases += [("keyword", k) for k in valor.split(";") if k.strip()]
+    try:
+        executavel = os.path.basename(shlex.split(comando)[0])
+        if executavel and executavel not in ("env", "flatpak", "snap"):
+            aliases.append(("exec", executavel))
+    except (ValueError, IndexError):
+        pass
+
+    return {"name": entry.get(f"Name[{IDIOMAS[0]}]", entry["Name"]), "exec": comando,
+            "path": path, "aliases": aliases}
+
+
+def ler_atalho(path):
+    """Atalho do Windows (.lnk) ou pacote do macOS (.app): o nome do arquivo é o nome do app"""
+    nome = os.path.splitext(os.path.basename(path))[0]
+    return {"name": nome, "exec": None, "path": path, "aliases": [("name", nome)]}
+
+
+class MiraiAppLauncher:
+    def __init__(self, dirs=None, min_score=0.45, min_weak_score=0.7, confirm_below=0.8, poll_interval=10.0):
+        """
+        Índice de aplicativos para abrir por voz
+
+        Args:
+            dirs: Pastas com atalhos (padrão: pastas do sistema operacional)
+            min_score: Similaridade mínima (0-1) para aceitar um aplicativo pelo nome
+            min_weak_score: Mínimo quando o casamento é só pela chave fonética ou por um
+                apelido genérico/palavra-chave ("inicia o stream" não pode virar Steam)
+            confirm_below: Abaixo disso quem chama deve confirmar antes de abrir
+            poll_interval: Segundos entre verificações de mudança sem watchdog (0 = não observa)
+        """
+        self.dirs = [os.path.expandvars(os.path.expanduser(d)) for d in (dirs or self._default_dirs())]
+        self.min_score = min_score
+        self.min_weak_score = min_weak_score
+        self.confirm_below = confirm_below
+        self.poll_interval = poll_interval
+
+        self.apps = {}  # caminho -> app
+        self._mtimes = {}  # caminho -> mtime lido
+        self._aliases = {}  # id -> (caminho, peso, normalizado, trigramas, trigramas fonéticos, tipo)
+        self._by_app = defaultdict(list)  # caminho -> ids dos apelidos
+        self._postings = defaultdict(set)  # trigrama -> ids
+        self._phonetic = defaultdict(set)  # trigrama fonético -> ids
+        self._exact = {}  # texto normalizado -> id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._observer = None
+        self.stats = {"build_ms": 0.0, "files": 0, "refreshes": 0}
+
+    @staticmethod
+    def _default_dirs():
+        if sys.platform == "win32":
+            return PASTAS_WINDOWS
+        if sys.platform == "darwin":
+            return PASTAS_MAC
+        return PASTAS_LINUX
+
+    @staticmethod
+    def _is_app_file(name):
+        return name.endswith((".desktop", ".lnk", ".app"))
+
+    def _scan(self):
+        """Caminho -> mtime de todos os atalhos das pastas"""
+        found = {}
+        for base in self.dirs:
+            if not os.path.isdir(base):
+                continue
+            for root, subdirs, files in os.walk(base):
+                # Pacotes .app do macOS são pastas
+                for name in list(subdirs):
+                    if name.endswith(".app"):
+                        subdirs.remove(name)
+                        path = os.path.join(root, name)
+                        found[path] = os.stat(path).st_mtime
+                for name in files:
+                    if self._is_app_file(name):
+                        path = os.path.join(root, name)
+                        try:
+                            found[path] = os.stat(path).st_mtime
+                        except OSError:
+                            pass
+        return found
+
+    def build(self):
+        """Monta o índice do zero e começa a observar as pastas"""
+        start = time.perf_counter()
+        for path, mtime in self._scan().items():
+            self._add(path, mtime)
+        self.stats["build_ms"] = (time.perf_counter() - start) * 1000
+        self.stats["files"] = len(self._mtimes)
+        print(f"🚀 {len(self.apps)} aplicativos indexados em {self.stats['build_ms']:.0f} ms")
+        self._watch()
+        return self
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    def _add(self, path, mtime=None):
+        app = ler_desktop(path) if path.endswith(".desktop") else ler_atalho(path)
+        with self._lock:
+            self._mtimes[path] = mtime if mtime is not None else os.stat(path).st_mtime
+            if app is None:
+                return
+            self.apps[path] = app
+            for kind, text in app["aliases"]:
+                normalized = normalizar(text)
+                if not normalized:
+                    continue
+                alias_id = self._next_id
+                self._next_id += 1
+                grams = trigramas(normalized)
+                phonetic = trigramas(chave_fonetica(normalized))
+                self._aliases[alias_id] = (path, PESOS[kind], normalized, grams, phonetic, kind)
+                self._by_app[path].append(alias_id)
+                for gram in grams:
+                    self._postings[gram].add(alias_id)
+                for gram in phonetic:
+                    self._phonetic[gram].add(alias_id)
+                current = self._exact.get(normalized)
+                if current is None or self._aliases[current][1] < PESOS[kind]:
+                    self._exact[normalized] = alias_id
+
+    def _remove(self, path):
+        with self._lock:
+            self._mtimes.pop(path, None)
+            self.apps.pop(path, None)
+            for alias_id in self._by_app.pop(path, []):
+                _, _, normalized, grams, phonetic, _ = self._aliases.pop(alias_id)
+                for gram in grams:
+                    self._postings[gram].discard(alias_id)
+                for gram in phonetic:
+                    self._phonetic[gram].discard(alias_id)
+                if self._exact.get(normalized) == alias_id:
+                    del self._exact[normalized]
+
+    def refresh_path(self, path):
+        """Relê um único atalho (criado, alterado ou removido)"""
+        self.stats["refreshes"] += 1
+        self._remove(path)
+        if os.path.exists(path) and self._is_app_file(os.path.basename(path)):
+            self._add(path)
+
+    def refresh(self):
+        """Compara as pastas com o índice e relê só o que mudou"""
+        found = self._scan()
+        with self._lock:
+            known = dict(self._mtimes)
+        changed = [p for p, mtime in found.items() if known.get(p) != mtime]
+        removed = [p for p in known if p not in found]
+        for path in removed:
+            self._remove(path)
+        for path in changed:
+            self._remove(path)
+            self._add(path, found[path])
+        return len(changed) + len(removed)
+
+    # ------------------------------------------------------------------
+    # Observação das pastas
+    # ------------------------------------------------------------------
+
+    def _watch(self):
+        if not self.poll_interval or self._running:
+            return
+        self._running = True
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            threading.Thread(target=self._poll_loop, daemon=True).start()
+            return
+
+        launcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", None)):
+                    if path and launcher._is_app_file(os.path.basename(path)):
+                        launcher.refresh_path(path)
+
+        self._observer = Observer()
+        for base in self.dirs:
+            if os.path.isdir(base):
+                self._observer.schedule(Handler(), base, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def _poll_loop(self):
+        while self._running:
+            time.sleep(self.poll_interval)
+            try:
+                if self.refresh():
+                    print(f"🔄 Índice de aplicativos atualizado ({len(self.apps)} aplicativos)")
+            except Exception as e:
+                print(f"⚠️  Erro ao atualizar aplicativos: {e}")
+
+    def stop(self):
+        self._running = False
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    # ------------------------------------------------------------------
+    # Busca e abertura
+    # ------------------------------------------------------------------
+
+    def resolve(self, spoken):
+        """
+        Aplicativo mais parecido com o nome falado
+
+        Returns:
+            tuple: (app, pontuação 0-1) ou (None, melhor pontuação)
+        """
+        normalized = normalizar(spoken)
+        if not normalized:
+            return None, 0.0
+
+        with self._lock:
+            alias_id = self._exact.get(normalized)
+            if alias_id is not None:
+                path, weight = self._aliases[alias_id][:2]
+                return self.apps[path], weight
+
+            grams = trigramas(normalized)
+            phonetic = trigramas(chave_fonetica(normalized))
+            candidates = (self._candidates(grams, self._postings, self.min_score)
+                          | self._candidates(phonetic, self._phonetic, self.min_score / 0.9))
+            best_rejected = 0.0
+
+            # Coeficiente de Dice por apelido; a chave fonética vale um pouco menos.
+            # Casamentos fracos (só pelo som ou por apelido genérico) precisam de
+            # min_weak_score; o nome escrito parecido basta com min_score
+            scores = {}
+            for candidate in candidates:
+                path, weight, _, alias_grams, alias_phonetic, kind = self._aliases[candidate]
+                text = 2 * len(grams & alias_grams) / (len(grams) + len(alias_grams))
+                sound = 0.0
+                if phonetic:
+                    sound = 2 * len(phonetic & alias_phonetic) / (len(phonetic) + len(alias_phonetic))
+                score = weight * max(text, 0.9 * sound)
+                weak = kind in APELIDOS_FRACOS or 0.9 * sound > text
+                minimum = self.min_weak_score if weak else self.min_score
+                if score >= minimum and score > scores.get(path, 0.0):
+                    scores[path] = score
+                elif score > best_rejected:
+                    best_rejected = score
+
+            if not scores:
+                return None, best_rejected
+            best = max(scores, key=scores.get)
+            return self.apps[best], scores[best]
+
+    @staticmethod
+    def _candidates(grams, postings, threshold):
+        """
+        Apelidos que podem atingir o limiar de similaridade (filtro de prefixo)
+
+        Dice >= t exige pelo menos t*|Q|/(2-t) trigramas em comum, então basta
+        olhar as listas dos |Q| - mínimo + 1 trigramas mais raros da busca.
+        """
+        if not grams or threshold >= 2:
+            return set()
+        minimum = max(1, ceil(threshold * len(grams) / (2 - threshold)))
+        ordered = sorted(grams, key=lambda g: len(postings.get(g, ())))
+        candidates = set()
+        for gram in ordered[:len(grams) - minimum + 1]:
+            candidates.update(postings.get(gram, ()))
+        return candidates
+
+    def launch(self, app):
+        """Abre o aplicativo sem esperar ele terminar"""
+        if app["exec"] is None:
+            if sys.platform == "win32":
+                os.startfile(app["path"])
+            else:
+                subprocess.Popen(["open", app["path"]], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        subprocess.Popen(
+            shlex.split(app["exec"]),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+    def open(self, spoken):
+        """
+        Resolve e abre o aplicativo falado
+
+        Returns:
+            app aberto ou None se nenhum for parecido o bastante
+        """
+        app, score = self.resolve(spoken)
+        if app is None:
+            print(f"🔍 Nenhum aplicativo parecido com '{spoken}' (melhor: {score:.2f})")
+            return None
+        print(f"🚀 Abrindo {app['name']} (similaridade {score:.2f})")
+        self.launch(app)
+        return app
+
+    def needs_confirmation(self, score):
+        """Casamento aceito mas incerto: perguntar antes de abrir"""
+        return score < self.confirm_below
+
+
+def benchmark(total=500):
+    """Monta o índice numa pasta temporária de .desktop falsos e mede a busca"""
+    import tempfile
+    import shutil
+
+    print("\n📊 Benchmark do índice de aplicativos")
+    print("="*50)
+
+    reais = [
+        ("Spotify", "Music Player", "music;audio;", "spotify %U"),
+        ("Firefox Web Browser", "Navegador Web", "internet;www;navegador;", "firefox %u"),
+        ("Discord", "Internet Messenger", "chat;voz;", "discord"),
+        ("Steam", "Jogos", "games;jogos;", "steam %U"),
+        ("Visual Studio Code", "Editor de texto", "code;programar;", "code --unity-launch %F"),
+        ("WhatsApp", "Mensagens", "zap;chat;", "whatsapp-desktop"),
+    ]
+
+    pasta = tempfile.mkdtemp(prefix="mirai_apps_")
+    try:
+        def escrever(nome, generico, palavras, comando, arquivo):
+            with open(os.path.join(pasta, arquivo), "w", encoding="utf-8") as f:
+                f.write("[Desktop Entry]\nType=Application\n"
+                        f"Name={nome}\nGenericName[pt_BR]={generico}\n"
+                        f"Keywords={palavras}\nExec={comando}\n")
+
+        for i, (nome, generico, palavras, comando) in enumerate(reais):
+            escrever(nome, generico, palavras, comando, f"real{i}.desktop")
+        for i in range(total - len(reais)):
+            escrever(f"Ferramenta {i:04d} Utilitario", "Utilitário", "ferramenta;", f"ferramenta{i}", f"fake{i}.desktop")
+
+        launcher = MiraiAppLauncher(dirs=[pasta], poll_interval=0).build()
+
+        falados = ["espotifai", "spotify", "firefox", "navegador", "discorde", "estim",
+                   "visual studio", "uatsap", "zap", "programa inexistente xyz", "stream", "jogo"]
+        for falado in falados:
+            app, score = launcher.resolve(falado)
+            confirmar = " (pede confirmação)" if app and launcher.needs_confirmation(score) else ""
+            print(f"  '{falado}' -> {app['name'] if app else '—'} ({score:.2f}){confirmar}")
+
+        repeticoes = 2000
+        start = time.perf_counter()
+        for i in range(repeticoes):
+            launcher.resolve(falados[i % len(falados)])
+        por_busca = (time.perf_counter() - start) / repeticoes * 1e6
+        print(f"⏱️  Índice: {launcher.stats['build_ms']:.0f} ms para {total} arquivos; "
+              f"busca: {por_busca:.0f} µs")
+
+        # Atualização incremental: um arquivo novo, um alterado e um removido
+        escrever("Obsidian", "Notas", "notas;", "obsidian", "novo.desktop")
+        escrever("Spotify Premium", "Music Player", "music;", "spotify", "real0.desktop")
+        os.utime(os.path.join(pasta, "real0.desktop"), (time.time() + 5, time.time() + 5))
+        os.remove(os.path.join(pasta, "real2.desktop"))
+        start = time.perf_counter()
+        changed = launcher.refresh()
+        print(f"🔄 Atualização incremental: {changed} arquivos em {(time.perf_counter() - start) * 1000:.1f} ms")
+        for falado in ("obsidian", "spotify premium", "discord"):
+            app, score = launcher.resolve(falado)
+            print(f"  '{falado}' -> {app['name'] if app else '—'} ({score:.2f})")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        MiraiAppLauncher(poll_interval=0).build().open(" ".join(sys.argv[1:]))
+    else:
+        benchmark()
@@ -0,0 +1,407 @@
+"""
+Funções auxiliares de áudio compartilhadas entre os módulos da MIRAI
+"""
+import time
+from math import gcd
+import numpy as np
+
+
+def para_float32(wav):
+    """
+    Converte a saída do TTS para um array float32
+
+    A escala original é mantida (sem normalizar pelo pico de cada fala): a
+    loudness é ajustada em streaming na saída (ver LoudnessNormalizer).
+
+    Args:
+        wav: Lista ou array numpy retornado pelo modelo
+
+    Returns:
+        np.ndarray: Áudio float32
+    """
+    # Converte para numpy array se necessário
+    if isinstance(wav, list):
+        wav = np.array(wav)
+
+    # Converte para float32 se necessário
+    if wav.dtype == np.int16:
+        wav = wav.astype(np.float32) / 32767.0
+    elif wav.dtype == np.int32:
+        wav = wav.astype(np.float32) / 2147483647.0
+    elif wav.dtype != np.float32:
+        wav = wav.astype(np.float32)
+
+    return wav
+
+
+def timed_blocks(blocks, stats):
+    """
+    Repassa blocos de áudio medindo a latência do primeiro bloco e da frase completa
+
+    Args:
+        blocks: Iterável de blocos float32
+        stats: dict preenchido com first_block_ms, total_ms, audio_samples, blocks
+    """
+    start = time.perf_counter()
+    stats.update(first_block_ms=None, total_ms=None, audio_samples=0, blocks=0)
+    for block in blocks:
+        if stats["first_block_ms"] is None:
+            stats["first_block_ms"] = (time.perf_counter() - start) * 1000
+        stats["audio_samples"] += len(block)
+        stats["blocks"] += 1
+        yield block
+    stats["total_ms"] = (time.perf_counter() - start) * 1000
+
+
+class PolyphaseResampler:
+    def __init__(self, src_rate, dst_rate, taps_per_phase=24, beta=8.0):
+        """
+        Reamostrador polifásico racional (L/M) para uso em streaming
+
+        O estado (histórico de entrada e fase) é mantido entre blocos,
+        então blocos consecutivos produzem o mesmo sinal que o áudio inteiro.
+
+        Args:
+            src_rate: Taxa de entrada (ex: 22050 do modelo)
+            dst_rate: Taxa de saída (ex: 48000 do dispositivo)
+            taps_per_phase: Coeficientes por fase do filtro
+            beta: Parâmetro da janela de Kaiser
+        """
+        g = gcd(int(src_rate), int(dst_rate))
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up = int(dst_rate) // g
+        self.down = int(src_rate) // g
+        self.taps = taps_per_phase
+
+        # Passa-baixas no domínio sobreamostrado, corte na menor das Nyquist
+        n = self.taps * self.up
+        cutoff = 1.0 / max(self.up, self.down)
+        t = np.arange(n) - (n - 1) / 2.0
+        h = np.sinc(cutoff * t) * np.kaiser(n, beta) * cutoff * self.up
+
+        # phases[p, k] = h[p + up * k]
+        self.phases = h.reshape(self.taps, self.up).T.astype(np.float32)
+        self._k = np.arange(self.taps)
+        self.reset()
+
+    def reset(self):
+        """Zera o estado (início de uma nova fala)"""
+        self._buffer = np.zeros(self.taps - 1, dtype=np.float32)
+        self._base = -(self.taps - 1)  # Índice absoluto de _buffer[0]
+        self._next = 0                 # Próxima amostra de saída
+
+    def process(self, block):
+        """
+        Reamostra um bloco
+
+        Returns:
+            np.ndarray float32 com as amostras de saída disponíveis
+        """
+        if self.up == self.down:
+            return np.asarray(block, dtype=np.float32)
+
+        self._buffer = np.concatenate((self._buffer, np.asarray(block, dtype=np.float32)))
+        last = self._base + len(self._buffer) - 1
+
+        # Saídas cujo índice de entrada m0 = n * down // up já está disponível
+        n_max = ((last + 1) * self.up - 1) // self.down
+        if n_max < self._next:
+            return np.zeros(0, dtype=np.float32)
+
+        n = np.arange(self._next, n_max + 1, dtype=np.int64)
+        q = n * self.down
+        m0 = q // self.up
+        phase = q - m0 * self.up
+
+        idx = (m0 - self._base)[:, None] - self._k[None, :]
+        out = np.einsum('ij,ij->i', self.phases[phase], self._buffer[idx]).astype(np.float32)
+
+        self._next = n_max + 1
+
+        # Mantém só o histórico necessário para o próximo bloco
+        keep = self.taps - 1
+        drop = len(self._buffer) - keep
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._base += drop
+
+        return out
+
+    def flush(self):
+        """Empurra as últimas amostras retidas no filtro"""
+        return self.process(np.zeros(self.taps // 2 + 1, dtype=np.float32))
+
+
+# Loudness alvo da fala (LUFS); -23 é o padrão de broadcast, fala em PC soa melhor mais alta
+ALVO_LUFS = -18.0
+
+
+def k_weighting_sos(sample_rate):
+    """
+    Filtro K da ITU-R BS.1770 (shelf de agudos + passa-altas RLB) para qualquer taxa
+
+    Returns:
+        np.ndarray (2, 6) no formato sos do scipy
+    """
+    # Estágio 1: high shelf (+4 dB acima de ~1.7 kHz)
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # Estágio 2: passa-altas em ~38 Hz
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass], dtype=np.float64)
+
+
+def _loudness_gated(energies):
+    """LUFS a partir das energias dos sub-blocos, com os gates absoluto (-70) e relativo (-20 LU)"""
+    energies = np.asarray(energies)
+    energies = energies[energies > 10 ** ((-70.0 + 0.691) / 10)]
+    if not len(energies):
+        return None
+    relative = np.mean(energies) * 10 ** (-20.0 / 10)
+    energies = energies[energies > relative]
+    return -0.691 + 10 * np.log10(np.mean(energies))
+
+
+def loudness_lufs(wav, sample_rate):
+    """Loudness integrada (gated) de um áudio inteiro, em LUFS (None se for só silêncio)"""
+    from scipy.signal import sosfilt
+
+    y = sosfilt(k_weighting_sos(sample_rate), np.asarray(wav, dtype=np.float64))
+    step = max(1, int(0.1 * sample_rate))
+    n = len(y) // step
+    if n == 0:
+        return _loudness_gated([np.mean(y * y)]) if len(y) else None
+    return _loudness_gated(np.mean((y[:n * step] ** 2).reshape(n, step), axis=1))
+
+
+def normalizar_loudness(wav, sample_rate, target_lufs=ALVO_LUFS, max_gain_db=12.0, ceiling_db=-1.0):
+    """
+    Leva uma fala inteira à loudness alvo, com o pico abaixo do teto
+
+    Versão offline do LoudnessNormalizer (para áudio gravado em arquivo, sem
+    tocar): com a fala toda em mãos basta um ganho único. Sem scipy só o teto
+    de pico é aplicado.
+
+    Args:
+        wav: Áudio float32
+        sample_rate: Taxa do áudio
+        target_lufs: Loudness alvo
+        max_gain_db: Limite do ganho (para cima e para baixo)
+        ceiling_db: Pico máximo (dBFS)
+
+    Returns:
+        np.ndarray float32
+    """
+    wav = np.asarray(wav, dtype=np.float32)
+    peak = float(np.max(np.abs(wav))) if len(wav) else 0.0
+    if peak <= 0:
+        return wav
+    try:
+        measured = loudness_lufs(wav, sample_rate)
+    except ImportError:
+        measured = None
+    gain_db = 0.0
+    if measured is not None:
+        gain_db = float(np.clip(target_lufs - measured, -max_gain_db, max_gain_db))
+    gain = min(10 ** (gain_db / 20), 10 ** (ceiling_db / 20) / peak)
+    return wav * np.float32(gain)
+
+
+def juntar_trechos(trechos, sample_rate, pausa_ms=40, fade_ms=5, threshold=0.01, max_gain_db=12.0):
+    """
+    Costura trechos sintetizados por vozes diferentes numa fala só
+
+    Cada trecho é reamostrado para `sample_rate`, tem o silêncio das pontas
+    cortado e é levado à loudness dos trechos de referência (a voz principal),
+    para a troca de voz não soar como um salto de volume. Entre os trechos fica
+    uma pausa curta fixa, com fades curtos contra cliques.
+
+    Args:
+        trechos: [(float32, taxa, é referência)]
+        sample_rate: Taxa da fala resultante
+        pausa_ms: Silêncio entre os trechos
+        max_gain_db: Limite do ajuste de loudness de cada trecho
+
+    Returns:
+        np.ndarray float32
+    """
+    fade = int(sample_rate * fade_ms / 1000)
+    pedacos = []
+    for wav, rate, referencia in trechos:
+        wav = np.asarray(wav, dtype=np.float32)
+        if rate != sample_rate:
+            resampler = PolyphaseResampler(rate, sample_rate)
+            wav = np.concatenate([resampler.process(wav), resampler.flush()])
+        voiced = np.flatnonzero(np.abs(wav) > threshold)
+        if not len(voiced):
+            continue
+        wav = wav[voiced[0]:voiced[-1] + 1].copy()
+        n = min(len(wav) // 2, fade)
+        if n:
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            wav[:n] *= ramp
+            wav[-n:] *= ramp[::-1]
+        pedacos.append((wav, referencia))
+    if not pedacos:
+        return np.zeros(0, dtype=np.float32)
+
+    try:
+        medidas = [loudness_lufs(wav, sample_rate) for wav, _ in pedacos]
+        referencias = [m for m, (_, ref) in zip(medidas, pedacos) if ref and m is not None]
+        alvo = np.mean(referencias) if referencias else None
+    except ImportError:
+        alvo = None  # Sem scipy: o normalizador da saída cuida do nível
+    if alvo is not None:
+        for i, ((wav, referencia), medida) in enumerate(zip(pedacos, medidas)):
+            if not referencia and medida is not None:
+                gain_db = np.clip(alvo - medida, -max_gain_db, max_gain_db)
+                pedacos[i] = (wav * np.float32(10 ** (gain_db / 20)), referencia)
+
+    pausa = np.zeros(int(sample_rate * pausa_ms / 1000), dtype=np.float32)
+    partes = []
+    for i, (wav, _) in enumerate(pedacos):
+        if i:
+            partes.append(pausa)
+        partes.append(wav)
+    return np.concatenate(partes)
+
+
+class LoudnessNormalizer:
+    def __init__(self, sample_rate, target_lufs=ALVO_LUFS, window=1.0, max_gain_db=12.0, min_gain_db=-12.0,
+                 attack_db=20.0, release_db=10.0, lookahead_ms=5.0, ceiling_db=-1.0):
+        """
+        Normalização de loudness em streaming, bloco a bloco
+
+        Mede a loudness de curto prazo (filtro K, janela de `window` segundos,
+        com gates como na EBU R128) e ajusta o ganho devagar, de forma contínua
+        entre as frases. Um limitador com look-ahead segura os picos abaixo do teto.
+        O estado dos filtros é mantido entre blocos.
+
+        Args:
+            sample_rate: Taxa dos blocos
+            target_lufs: Loudness alvo
+            window: Janela da medição (a "short-term" da R128 usa 3 s; 1 s acompanha
+                melhor frases curtas de TTS)
+            max_gain_db / min_gain_db: Limites do ganho aplicado
+            attack_db / release_db: Quanto o ganho pode cair / subir por segundo
+                (cai rápido quando a fala fica mais alta, sobe devagar para não "bombear")
+            lookahead_ms: Antecipação do limitador (também é a latência acrescentada)
+            ceiling_db: Pico máximo na saída (dBFS)
+        """
+        from scipy.signal import sosfilt
+
+        self._sosfilt = sosfilt
+        self.sample_rate = sample_rate
+        self.target_lufs = target_lufs
+        self.max_gain_db = max_gain_db
+        self.min_gain_db = min_gain_db
+        self.attack_db = attack_db
+        self.release_db = release_db
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self.volume = 1.0
+
+        self._sos = k_weighting_sos(sample_rate)
+        self._step = max(1, int(0.1 * sample_rate))  # Sub-blocos de 100 ms
+        self._energies = np.zeros(max(1, int(round(window / 0.1))))
+        self._filled = 0
+        self._lookahead = max(1, int(sample_rate * lookahead_ms / 1000))
+        self.gain_db = None  # Desconhecido até a primeira medição
+        self.reset()
+
+    def reset(self):
+        """Zera filtros e limitador (o ganho atual é mantido entre falas)"""
+        self._zi = np.zeros((self._sos.shape[0], 2))
+        self._acc = 0.0
+        self._acc_n = 0
+        self._history = np.zeros(2 * self._lookahead, dtype=np.float32)
+
+    def loudness(self):
+        """Loudness de curto prazo atual (LUFS) ou None"""
+        if not self._filled:
+            return None
+        return _loudness_gated(self._energies[-self._filled:])
+
+    def _measure(self, block):
+        """Filtro K com estado e energia por sub-bloco de 100 ms"""
+        y, self._zi = self._sosfilt(self._sos, block, zi=self._zi)
+        squares = y * y
+        pos = 0
+        while pos < len(squares):
+            take = min(self._step - self._acc_n, len(squares) - pos)
+            self._acc += float(np.sum(squares[pos:pos + take]))
+            self._acc_n += take
+            pos += take
+            if self._acc_n == self._step:
+                self._energies = np.roll(self._energies, -1)
+                self._energies[-1] = self._acc / self._step
+                self._filled = min(self._filled + 1, len(self._energies))
+                self._acc = 0.0
+                self._acc_n = 0
+
+    def process(self, block):
+        """
+        Normaliza um bloco
+
+        Returns:
+            np.ndarray float32 (atrasado em lookahead_ms pelo limitador)
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if not len(block):
+            return block
+
+        self._measure(block.astype(np.float64))
+        previous = self.gain_db
+        measured = self.loudness()
+        if measured is not None:
+            desired = min(self.max_gain_db, max(self.min_gain_db, self.target_lufs - measured))
+            if previous is None:
+                self.gain_db = desired
+            else:
+                seconds = len(block) / self.sample_rate
+                change = desired - previous
+                self.gain_db = previous + max(-self.attack_db * seconds, min(self.release_db * seconds, change))
+
+        start = previous if previous is not None else (self.gain_db or 0.0)
+        end = self.gain_db if self.gain_db is not None else 0.0
+        gains = 10 ** (np.linspace(start, end, len(block), dtype=np.float32) / 20) * self.volume
+        return self._limit(block * gains)
+
+    def _limit(self, block):
+        """
+        Limitador com look-ahead: o ganho necessário em cada pico é antecipado
+        (mínimo na janela seguinte) e suavizado (média na janela anterior),
+        então chega ao valor certo exatamente no pico, sem clipar
+        """
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        n = len(block)
+        la = self._lookahead
+        buf = np.concatenate((self._history, block))
+        peaks = np.abs(buf)
+        required = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9))
+
+        # ahead[i] = min(required[i:i+la]); depois média móvel de la amostras
+        ahead = sliding_window_view(required, la).min(axis=1)
+        csum = np.concatenate(([0.0], np.cumsum(ahead, dtype=np.float64)))
+        first = len(self._history) - la  # Saída atrasada em la amostras
+        idx = np.arange(first, first + n)
+        smooth = (csum[idx + 1] - csum[idx + 1 - la]) / la
+
+        out = (buf[first:first + n] * smooth).astype(np.float32)
+        self._history = buf[-len(self._history):]
+        return out
+
+    def flush(self):
+        """Empurra as amostras retidas pelo look-ahead (fim de uma fala)"""
+        tail = self._limit(np.zeros(self._lookahead, dtype=np.float32))
+        return tail
@@ -0,0 +1,512 @@
+"""
+Integração com avatar (Live2D / VMagicMirror) via protocolo VMC
+Calcula visemas (abertura da boca e formato de vogal A/I/U/E/O) a 60 Hz
+a partir do áudio float32 no momento em que ele é escrito no buffer de saída,
+e envia por OSC sobre UDP alinhado com o playhead.
+"""
+import re
+import socket
+import struct
+import threading
+import time
+import heapq
+import numpy as np
+
+VMC_PORTA_PADRAO = 39539
+VOGAIS = ("A", "I", "U", "E", "O")
+
+# Faixas de frequência (Hz) usadas para estimar F1 e F2
+BANDAS_F1 = ((200, 400), (400, 650), (650, 1100))      # baixo, médio, alto
+BANDAS_F2 = ((700, 1100), (1100, 1600), (1600, 2200), (2200, 3200))
+
+# Peso de cada vogal em cada faixa de F1 e F2
+# A: F1 alto/F2 médio, I: F1 baixo/F2 muito alto, U: F1 baixo/F2 baixo,
+# E: F1 médio/F2 alto, O: F1 médio/F2 baixo
+PERFIL_F1 = np.array([
+    [0.1, 0.3, 1.0],  # A
+    [1.0, 0.3, 0.0],  # I
+    [1.0, 0.4, 0.0],  # U
+    [0.3, 1.0, 0.3],  # E
+    [0.3, 1.0, 0.2],  # O
+], dtype=np.float32)
+PERFIL_F2 = np.array([
+    [0.6, 1.0, 0.4, 0.1],  # A
+    [0.0, 0.1, 0.5, 1.0],  # I
+    [1.0, 0.3, 0.0, 0.0],  # U
+    [0.0, 0.3, 1.0, 0.5],  # E
+    [1.0, 0.5, 0.1, 0.0],  # O
+], dtype=np.float32)
+
+# Tags de expressão emitidas pelo LLM -> blendshape VRM
+EXPRESSOES = {
+    "feliz": "Joy",
+    "alegre": "Joy",
+    "divertida": "Fun",
+    "triste": "Sorrow",
+    "raiva": "Angry",
+    "brava": "Angry",
+    "surpresa": "Surprised",
+    "neutra": None,
+    "neutro": None,
+    "pensativa": None,
+}
+BLENDSHAPES_EXPRESSAO = sorted({nome for nome in EXPRESSOES.values() if nome})
+NOME_DE_TAG = re.compile(r'^[a-zà-ú_\- ]{1,20}$', re.IGNORECASE)
+
+
+# ----------------------------------------------------------------------
+# OSC / VMC
+# ----------------------------------------------------------------------
+
+def _osc_string(text):
+    """String OSC: terminada em null e alinhada em 4 bytes"""
+    data = text.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+
+def osc_message(address, *args):
+    """Monta uma mensagem OSC com argumentos str/float/int"""
+    tags = ","
+    payload = b""
+    for arg in args:
+        if isinstance(arg, str):
+            tags += "s"
+            payload += _osc_string(arg)
+        elif isinstance(arg, int):
+            tags += "i"
+            payload += struct.pack(">i", arg)
+        else:
+            tags += "f"
+            payload += struct.pack(">f", float(arg))
+    return _osc_string(address) + _osc_string(tags) + payload
+
+
+def osc_bundle(messages):
+    """Agrupa mensagens num bundle OSC com timetag imediato"""
+    data = _osc_string("#bundle") + struct.pack(">Q", 1)
+    for message in messages:
+        data += struct.pack(">i", len(message)) + message
+    return data
+
+
+def parse_osc(data):
+    """
+    Decodifica um pacote OSC (mensagem ou bundle)
+
+    Returns:
+        list: [(endereço, [argumentos])]
+    """
+    def read_string(offset):
+        end = data.index(b"\0", offset)
+        text = data[offset:end].decode("utf-8")
+        return text, end + 1 + (-(end + 1) % 4)
+
+    if data.startswith(b"#bundle\0"):
+        messages = []
+        offset = 16
+        while offset < len(data):
+            size = struct.unpack_from(">i", data, offset)[0]
+            messages.extend(parse_osc(data[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return messages
+
+    address, offset = read_string(0)
+    tags, offset = read_string(offset)
+    args = []
+    for tag in tags[1:]:
+        if tag == "s":
+            value, offset = read_string(offset)
+        elif tag == "i":
+            value = struct.unpack_from(">i", data, offset)[0]
+            offset += 4
+        else:
+            value = struct.unpack_from(">f", data, offset)[0]
+            offset += 4
+        args.append(value)
+    return [(address, args)]
+
+
+class VMCSender:
+    def __init__(self, host="127.0.0.1", port=VMC_PORTA_PADRAO):
+        """
+        Envia blendshapes pelo protocolo VMC (OSC sobre UDP)
+
+        Args:
+            host: Endereço do VMagicMirror / receptor VMC
+            port: Porta UDP do receptor
+        """
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sent = 0
+        self.dropped = 0
+
+    def send_blendshapes(self, values):
+        """
+        Envia valores de blendshape e aplica no mesmo bundle
+
+        Args:
+            values: dict nome -> valor (0.0 a 1.0)
+        """
+        messages = [osc_message("/VMC/Ext/Blend/Val", name, value) for name, value in values.items()]
+        messages.append(osc_message("/VMC/Ext/Blend/Apply"))
+        try:
+            self.sock.sendto(osc_bundle(messages), self.address)
+            self.sent += 1
+        except (BlockingIOError, OSError):
+            # UDP: melhor perder um quadro do que travar o áudio
+            self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+
+# ----------------------------------------------------------------------
+# Visemas
+# ----------------------------------------------------------------------
+
+class MiraiVisemeEngine:
+    def __init__(self, sink, sample_rate=22050, fps=60, floor_db=-50.0, ceil_db=-12.0,
+                 attack=0.6, release=0.25):
+        """
+        Calcula visemas a partir do áudio de saída
+
+        Args:
+            sink: Objeto com send_blendshapes(dict) (ex: VMCSender)
+            sample_rate: Taxa do áudio recebido em process()
+            fps: Quadros de visema por segundo
+            floor_db / ceil_db: Faixa de RMS mapeada para boca fechada/aberta
+            attack / release: Suavização ao abrir / fechar a boca
+        """
+        self.sink = sink
+        self.fps = fps
+        self.floor_db = floor_db
+        self.ceil_db = ceil_db
+        self.attack = attack
+        self.release = release
+
+        self._lock = threading.Lock()
+        self._pending = []  # heap de (horário de envio, seq, valores)
+        self._seq = 0
+        self._wake = threading.Event()
+        self._running = True
+
+        self.set_sample_rate(sample_rate)
+        self.reset()
+
+        self.frames = 0
+        self.cpu_time = 0.0
+
+        self._thread = threading.Thread(target=self._sender_loop, name="viseme-sender", daemon=True)
+        self._thread.start()
+
+    def set_sample_rate(self, sample_rate):
+        """Recalcula o tamanho do quadro e as máscaras de banda do FFT"""
+        self.sample_rate = sample_rate
+        self.hop = int(round(sample_rate / self.fps))
+        self.window = np.hanning(self.hop).astype(np.float32)
+
+        freqs = np.fft.rfftfreq(self.hop, 1.0 / sample_rate)
+        self._f1_masks = np.array([(freqs >= lo) & (freqs < hi) for lo, hi in BANDAS_F1], dtype=np.float32)
+        self._f2_masks = np.array([(freqs >= lo) & (freqs < hi) for lo, hi in BANDAS_F2], dtype=np.float32)
+
+    def reset(self):
+        """Zera o estado entre falas"""
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._mouth = 0.0
+
+    def analyze(self, frames):
+        """
+        Calcula os visemas de vários quadros de uma vez (vetorizado)
+
+        Args:
+            frames: Array (n, hop) de áudio float32
+
+        Returns:
+            Array (n, 5) com os pesos A/I/U/E/O já escalados pela abertura da boca
+        """
+        # Abertura da boca pela energia RMS em dB
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        db = 20.0 * np.log10(rms)
+        opening = np.clip((db - self.floor_db) / (self.ceil_db - self.floor_db), 0.0, 1.0)
+
+        # Energia por banda de formante
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        f1 = spectrum @ self._f1_masks.T
+        f2 = spectrum @ self._f2_masks.T
+        f1 /= f1.sum(axis=1, keepdims=True) + 1e-12
+        f2 /= f2.sum(axis=1, keepdims=True) + 1e-12
+
+        # Afinidade com cada vogal = perfil F1 * perfil F2
+        scores = (f1 @ PERFIL_F1.T) * (f2 @ PERFIL_F2.T)
+        scores /= scores.sum(axis=1, keepdims=True) + 1e-12
+
+        # Suavização da abertura (ataque rápido, soltura lenta)
+        smoothed = np.empty_like(opening)
+        mouth = self._mouth
+        for i, target in enumerate(opening):
+            coef = self.attack if target > mouth else self.release
+            mouth += (target - mouth) * coef
+            smoothed[i] = mouth
+        self._mouth = mouth
+
+        return scores * smoothed[:, None]
+
+    def process(self, block, dac_time_offset=0.0):
+        """
+        Recebe o bloco que acabou de ser escrito no buffer de saída
+
+        Args:
+            block: Áudio float32 (mono) do bloco
+            dac_time_offset: Segundos até o primeiro sample do bloco sair no alto-falante
+        """
+        start = time.perf_counter()
+        block_start = time.monotonic() + dac_time_offset
+
+        # Junta com o resto do bloco anterior para manter os quadros alinhados
+        data = np.concatenate((self._remainder, block)) if len(self._remainder) else block
+        first_sample = -len(self._remainder)
+
+        n = len(data) // self.hop
+        if n:
+            values = self.analyze(data[:n * self.hop].reshape(n, self.hop))
+            with self._lock:
+                for i in range(n):
+                    # Horário em que o meio do quadro passa pelo playhead
+                    offset = first_sample + i * self.hop + self.hop // 2
+                    due = block_start + offset / self.sample_rate
+                    heapq.heappush(self._pending, (due, self._seq, values[i]))
+                    self._seq += 1
+            self._wake.set()
+            self.frames += n
+
+        self._remainder = data[n * self.hop:].copy()
+        self.cpu_time += time.perf_counter() - start
+
+    def close_mouth(self, dac_time_offset=0.0):
+        """Fecha a boca quando a fala termina"""
+        self.reset()
+        due = time.monotonic() + dac_time_offset
+        with self._lock:
+            heapq.heappush(self._pending, (due, self._seq, np.zeros(len(VOGAIS), dtype=np.float32)))
+            self._seq += 1
+        self._wake.set()
+
+    def _sender_loop(self):
+        """Envia cada quadro quando o playhead chega nele"""
+        while self._running:
+            with self._lock:
+                due = self._pending[0][0] if self._pending else None
+
+            if due is None:
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._wake.wait(min(delay, 0.1))
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                _, _, values = heapq.heappop(self._pending)
+            self.sink.send_blendshapes({v: float(x) for v, x in zip(VOGAIS, values)})
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+
+# ----------------------------------------------------------------------
+# Expressões
+# ----------------------------------------------------------------------
+
+class MiraiTagParser:
+    def __init__(self, max_tag_length=20):
+        """
+        Extrai tags como [feliz] do stream do LLM sem esperar a resposta inteira
+
+        Só o trecho entre '[' e ']' fica retido; o resto do texto passa direto.
+        """
+        self.max_tag_length = max_tag_length
+        self._partial = None  # Texto depois de um '[' ainda sem ']'
+
+    def feed(self, chunk):
+        """
+        Processa um pedaço do stream
+
+        Returns:
+            list: Eventos em ordem, ("text", texto) ou ("tag", nome)
+        """
+        events = []
+        text = []
+        i = 0
+
+        while i < len(chunk):
+            if self._partial is None:
+                start = chunk.find('[', i)
+                if start == -1:
+                    text.append(chunk[i:])
+                    break
+                text.append(chunk[i:start])
+                self._partial = ""
+                i = start + 1
+                continue
+
+            end = chunk.find(']', i)
+            if end == -1:
+                self._partial += chunk[i:]
+                if len(self._partial) > self.max_tag_length:
+                    # Não é tag: devolve como texto
+                    text.append('[' + self._partial)
+                    self._partial = None
+                break
+
+            name = self._partial + chunk[i:end]
+            self._partial = None
+            i = end + 1
+
+            if NOME_DE_TAG.match(name.strip()):
+                if text:
+                    events.append(("text", "".join(text)))
+                    text = []
+                events.append(("tag", name.strip().lower()))
+            else:
+                text.append('[' + name + ']')
+
+        if text and "".join(text):
+            events.append(("text", "".join(text)))
+        return events
+
+    def flush(self):
+        """Devolve um '[' pendente como texto"""
+        partial, self._partial = self._partial, None
+        return [("text", '[' + partial)] if partial else []
+
+
+class MiraiExpressionDispatcher:
+    def __init__(self, sink):
+        """
+        Aplica expressões no avatar no instante em que a frase começa a tocar
+
+        Args:
+            sink: Objeto com send_blendshapes(dict) (ex: VMCSender)
+        """
+        self.sink = sink
+        self.alignment_errors = []
+        self.unknown_tags = 0
+
+    def dispatch(self, tag, delay=0.0):
+        """
+        Agenda a expressão
+
+        Args:
+            tag: Nome da tag (ex: "feliz")
+            delay: Segundos até o início da frase sair no alto-falante
+        """
+        if tag not in EXPRESSOES:
+            self.unknown_tags += 1
+            return
+
+        due = time.monotonic() + delay
+        if delay <= 0:
+            self._apply(tag, due)
+            return
+
+        timer = threading.Timer(delay, self._apply, args=(tag, due))
+        timer.daemon = True
+        timer.start()
+
+    def _apply(self, tag, due):
+        # Erro de alinhamento: atraso entre o início do áudio e o envio da expressão
+        self.alignment_errors.append(time.monotonic() - due)
+
+        values = {nome: 0.0 for nome in BLENDSHAPES_EXPRESSAO}
+        target = EXPRESSOES[tag]
+        if target:
+            values[target] = 1.0
+        self.sink.send_blendshapes(values)
+
+    def alignment_stats(self):
+        """Erro médio e máximo (ms) entre a expressão e o início da frase"""
+        if not self.alignment_errors:
+            return {"count": 0, "mean_ms": 0.0, "max_ms": 0.0}
+        errors = [abs(e) * 1000 for e in self.alignment_errors]
+        return {"count": len(errors), "mean_ms": sum(errors) / len(errors), "max_ms": max(errors)}
+
+
+def benchmark_tags(replies=2000):
+    """Mede a vazão do parser e o erro de alinhamento do despacho"""
+    resposta = ("[feliz] Hai! Agora são quinze e trinta. [pensativa] Tem algum compromisso? "
+                "[surpresa] Sugoi, você zerou o Abismo! [divertida] Gambatte no próximo!")
+    chunks = [resposta[i:i + 4] for i in range(0, len(resposta), 4)]
+
+    start = time.perf_counter()
+    tags = 0
+    for _ in range(replies):
+        parser = MiraiTagParser()
+        for chunk in chunks:
+            tags += sum(1 for kind, _ in parser.feed(chunk) if kind == "tag")
+        parser.flush()
+    elapsed = time.perf_counter() - start
+
+    total_bytes = len(resposta.encode("utf-8")) * replies
+    print(f"🏷️  Parser: {total_bytes / elapsed / 1e6:.1f} MB/s, "
+          f"{elapsed / (replies * len(chunks)) * 1e6:.2f} µs por pedaço, {tags // replies} tags por resposta")
+
+    class _Silencioso:
+        def send_blendshapes(self, values):
+            pass
+
+    dispatcher = MiraiExpressionDispatcher(_Silencioso())
+    for i in range(50):
+        dispatcher.dispatch("feliz", delay=0.01 + (i % 5) * 0.02)
+    time.sleep(0.2)
+    stats = dispatcher.alignment_stats()
+    print(f"🎯 Alinhamento tag→áudio: média {stats['mean_ms']:.2f} ms, máximo {stats['max_ms']:.2f} ms "
+          f"({stats['count']} despachos)")
+
+
+def benchmark(seconds=10.0, sample_rate=22050, block=512):
+    """Mede o custo de CPU e confere os pacotes num listener UDP local"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    listener.bind(("127.0.0.1", 0))
+    listener.settimeout(0.5)
+
+    engine = MiraiVisemeEngine(VMCSender(port=listener.getsockname()[1]), sample_rate=sample_rate)
+
+    # Áudio sintético: vogais alternando a cada 250 ms (formantes aproximados)
+    formantes = {"A": (800, 1300), "I": (300, 2500), "U": (320, 850), "E": (500, 1900), "O": (520, 950)}
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = np.zeros_like(t, dtype=np.float32)
+    seg = int(0.25 * sample_rate)
+    for i, start in enumerate(range(0, len(t), seg)):
+        f1, f2 = formantes[VOGAIS[i % 5]]
+        tt = t[start:start + seg]
+        audio[start:start + seg] = 0.3 * np.sin(2 * np.pi * f1 * tt) + 0.15 * np.sin(2 * np.pi * f2 * tt)
+
+    # Alimenta como o callback de áudio faria (sem esperar o playhead)
+    for start in range(0, len(audio), block):
+        engine.process(audio[start:start + block])
+
+    received = 0
+    try:
+        while received < engine.frames:
+            data, _ = listener.recvfrom(4096)
+            if parse_osc(data)[-1][0] == "/VMC/Ext/Blend/Apply":
+                received += 1
+    except socket.timeout:
+        pass
+
+    engine.stop()
+    print(f"🎭 {engine.frames} quadros de visema, {received} recebidos pelo listener UDP")
+    print(f"⏱️  CPU: {engine.cpu_time * 1000:.1f} ms para {seconds:.0f}s de áudio "
+          f"({engine.cpu_time / seconds:.3%} do tempo real)")
+
+
+# Teste direto
+if __name__ == "__main__":
+    benchmark()
+    benchmark_tags()
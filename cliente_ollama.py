@@ -0,0 +1,921 @@
+"""
+Camada de cliente do Ollama com conexões persistentes
+Mantém um ollama.Client (pool keep-alive do httpx) por backend, aplica timeout
+por requisição, verifica a saúde dos backends em segundo plano e faz failover
+com circuit breaker para um modelo ou host secundário.
+
+Também tem um backend para APIs compatíveis com a OpenAI (LLM em nuvem,
+llama.cpp, vLLM...) e um cliente com hedging: se o principal demora mais que o
+p90 para mandar o primeiro token, o secundário é disparado e vence quem
+responder primeiro. Todos entregam chunks no formato do ollama.chat.
+"""
+import os
+import json
+import time
+import queue
+import socket
+import threading
+from collections import deque
+import httpx
+import ollama
+
+from metricas import OLLAMA_FAILURES, OLLAMA_FAILOVERS
+
+# Estados do circuit breaker
+FECHADO = "fechado"       # Backend saudável, recebe requisições
+ABERTO = "aberto"         # Backend com falhas, ignorado até o próximo probe
+MEIO_ABERTO = "meio-aberto"  # Probe passou, próxima requisição decide
+
+ERROS_DE_CONEXAO = (httpx.TransportError, ConnectionError, TimeoutError)
+
+# Corrida de hedging em andamento nesta thread (ver _Corrida): os ganchos do
+# httpx guardam o socket da requisição para que cancel() possa derrubá-lo
+_corrida_local = threading.local()
+
+
+def _corrida_atual():
+    return getattr(_corrida_local, "corrida", None)
+
+
+def _socket_de(stream):
+    try:
+        return stream.get_extra_info("socket") if stream is not None else None
+    except Exception:
+        return None
+
+
+def _rastrear_conexao(event, info):
+    """Trace do httpcore: socket de uma conexão aberta para a corrida"""
+    if event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+        corrida = _corrida_atual()
+        if corrida is not None:
+            corrida.attach(_socket_de(info.get("return_value")))
+
+
+def _rastrear_pedido(request):
+    if _corrida_atual() is not None:
+        request.extensions["trace"] = _rastrear_conexao
+
+
+def _rastrear_resposta(response):
+    corrida = _corrida_atual()
+    if corrida is not None:
+        corrida.attach(_socket_de(response.extensions.get("network_stream")))
+
+
+def ganchos_de_cancelamento():
+    """event_hooks do httpx que permitem cancelar uma corrida antes do primeiro token"""
+    return {"request": [_rastrear_pedido], "response": [_rastrear_resposta]}
+
+
+class OllamaBackend:
+    def __init__(self, host="http://localhost:11434", model="mistral", name=None,
+                 connect_timeout=2.0, read_timeout=60.0, max_connections=4):
+        """
+        Um host + modelo do Ollama com seu próprio pool de conexões
+
+        Args:
+            host: URL do servidor Ollama
+            model: Modelo usado neste backend
+            connect_timeout: Timeout para abrir conexão (s)
+            read_timeout: Timeout entre bytes da resposta (s)
+            max_connections: Conexões keep-alive mantidas abertas
+        """
+        self.host = host
+        self.model = model
+        self.name = name or f"{model}@{host}"
+
+        # O ollama.Client repassa os kwargs para httpx.Client (pool persistente)
+        self.client = ollama.Client(
+            host=host,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=300.0
+            ),
+            event_hooks=ganchos_de_cancelamento()
+        )
+
+        # Circuit breaker
+        self.state = FECHADO
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+
+        # Métricas
+        self.requests = 0
+        self.failures = 0
+
+    def chat(self, **kwargs):
+        """ollama.chat com o modelo deste backend (o 'model' pedido é ignorado)"""
+        kwargs.pop("model", None)
+        return self.client.chat(model=self.model, **kwargs)
+
+    def probe(self):
+        """Verifica se o servidor responde (GET /api/tags)"""
+        try:
+            self.client.list()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """Fecha o pool de conexões (ollama.Client.close; versões antigas não têm)"""
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+
+
+class OpenAIBackend:
+    def __init__(self, base_url, model, api_key=None, name=None,
+                 connect_timeout=2.0, read_timeout=60.0, max_connections=4):
+        """
+        Servidor compatível com a API da OpenAI (/v1/chat/completions)
+
+        Args:
+            base_url: URL base (ex: https://api.exemplo.com ou http://localhost:8080)
+            model: Modelo pedido ao servidor
+            api_key: Chave enviada como Bearer (opcional em servidores locais)
+        """
+        self.host = base_url.rstrip("/")
+        if self.host.endswith("/v1"):
+            self.host = self.host[:-3]
+        self.model = model
+        self.name = name or f"{model}@{self.host}"
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.Client(
+            base_url=self.host,
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=300.0
+            ),
+            event_hooks=ganchos_de_cancelamento()
+        )
+
+        self.state = FECHADO
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def _body(self, messages, stream, options):
+        options = options or {}
+        body = {"model": self.model, "messages": messages, "stream": stream}
+        for origem, destino in (("temperature", "temperature"), ("top_p", "top_p"),
+                                ("num_predict", "max_tokens"), ("stop", "stop")):
+            if options.get(origem) is not None:
+                body[destino] = options[origem]
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        return body
+
+    def chat(self, messages, stream=False, options=None, **kwargs):
+        """
+        Mesmo contrato de ollama.chat (chunks com message/done/done_reason/eval_count)
+
+        Erros HTTP viram ollama.ResponseError para o failover tratar igual.
+        """
+        body = self._body(messages, stream, options)
+        if not stream:
+            response = self.client.post("/v1/chat/completions", json=body)
+            if response.status_code >= 400:
+                raise ollama.ResponseError(response.text, response.status_code)
+            data = response.json()
+            choice = data["choices"][0]
+            return {
+                "message": {"role": "assistant", "content": choice["message"].get("content") or ""},
+                "done": True,
+                "done_reason": choice.get("finish_reason"),
+                "eval_count": (data.get("usage") or {}).get("completion_tokens"),
+            }
+        return self._stream(body)
+
+    def _stream(self, body):
+        # Fechar o gerador fecha a conexão e o servidor para de gerar
+        with self.client.stream("POST", "/v1/chat/completions", json=body) as response:
+            if response.status_code >= 400:
+                response.read()
+                raise ollama.ResponseError(response.text, response.status_code)
+
+            reason = None
+            tokens = 0
+            eval_count = None
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if event.get("usage"):
+                    eval_count = event["usage"].get("completion_tokens")
+                for choice in event.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        tokens += 1
+                        yield {"message": {"role": "assistant", "content": content}, "done": False}
+                    reason = choice.get("finish_reason") or reason
+
+            yield {
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": reason,
+                "eval_count": eval_count or tokens,
+            }
+
+    def probe(self):
+        """Verifica se o servidor responde (GET /v1/models)"""
+        try:
+            return self.client.get("/v1/models").status_code < 500
+        except Exception:
+            return False
+
+    def close(self):
+        self.client.close()
+
+
+class MiraiOllamaPool:
+    def __init__(self, backends, failure_threshold=3, reset_timeout=15.0, probe_interval=5.0):
+        """
+        Pool de backends do Ollama em ordem de preferência
+
+        Args:
+            backends: Lista de OllamaBackend (o primeiro é o principal)
+            failure_threshold: Falhas seguidas para abrir o circuito
+            reset_timeout: Segundos com o circuito aberto antes de testar de novo
+            probe_interval: Intervalo do health check em segundo plano
+        """
+        self.backends = list(backends)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self._stop = threading.Event()
+
+        self.stats = {
+            "requests": 0,
+            "failovers": 0,
+            "failover_times": [],
+            "exhausted": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Requisições
+    # ------------------------------------------------------------------
+
+    def chat(self, **kwargs):
+        """
+        Mesmo formato de ollama.chat; o modelo é definido por cada backend
+
+        Com stream=True o failover acontece até o primeiro chunk chegar.
+        """
+        self._ensure_probe_thread()
+        kwargs.pop("model", None)
+        stream = kwargs.get("stream", False)
+
+        with self._lock:
+            self.stats["requests"] += 1
+
+        first_failure_at = None
+        last_error = None
+
+        for backend in self._available_backends():
+            try:
+                backend.requests += 1
+                if stream:
+                    response = self._start_stream(backend, kwargs)
+                else:
+                    response = backend.chat(**kwargs)
+                self._record_success(backend)
+
+                if first_failure_at is not None:
+                    elapsed = time.perf_counter() - first_failure_at
+                    OLLAMA_FAILOVERS.inc()
+                    with self._lock:
+                        self.stats["failovers"] += 1
+                        self.stats["failover_times"].append(elapsed)
+                    print(f"🔀 Failover para {backend.name} em {elapsed * 1000:.0f} ms")
+
+                return response
+
+            except ollama.ResponseError as e:
+                # Erro do servidor (modelo inexistente, sobrecarga): tenta o próximo.
+                # 4xx é problema do pedido, não do backend: não conta para o circuito
+                last_error = e
+                if 400 <= e.status_code < 500:
+                    if first_failure_at is None:
+                        first_failure_at = time.perf_counter()
+                    continue
+            except ERROS_DE_CONEXAO as e:
+                # Perdedor de uma corrida de hedging: a conexão foi derrubada de propósito
+                corrida = _corrida_atual()
+                if corrida is not None and corrida.cancelled:
+                    raise
+                last_error = e
+
+            if first_failure_at is None:
+                first_failure_at = time.perf_counter()
+            self._record_failure(backend, last_error)
+
+        with self._lock:
+            self.stats["exhausted"] += 1
+        raise ConnectionError(f"Nenhum backend do Ollama disponível: {last_error}")
+
+    def _start_stream(self, backend, kwargs):
+        """Abre o stream e espera o primeiro chunk para confirmar o backend"""
+        iterator = iter(backend.chat(**kwargs))
+        first = next(iterator)
+
+        def _relay():
+            try:
+                yield first
+                yield from iterator
+            finally:
+                if hasattr(iterator, "close"):
+                    iterator.close()
+
+        return _relay()
+
+    def _available_backends(self):
+        """Backends com circuito fechado/meio-aberto, na ordem de preferência"""
+        now = time.monotonic()
+        with self._lock:
+            available = [
+                b for b in self.backends
+                if b.state != ABERTO or now - b.opened_at >= self.reset_timeout
+            ]
+        # Se tudo estiver aberto, tenta todos mesmo assim (melhor que falhar direto)
+        return available or list(self.backends)
+
+    def _record_success(self, backend):
+        with self._lock:
+            backend.consecutive_failures = 0
+            if backend.state != FECHADO:
+                print(f"✅ Backend {backend.name} recuperado")
+            backend.state = FECHADO
+
+    def _record_failure(self, backend, error):
+        OLLAMA_FAILURES.inc()
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.state == MEIO_ABERTO or backend.consecutive_failures >= self.failure_threshold:
+                if backend.state != ABERTO:
+                    print(f"⛔ Circuito aberto para {backend.name}: {error}")
+                backend.state = ABERTO
+                backend.opened_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Health check
+    # ------------------------------------------------------------------
+
+    def _ensure_probe_thread(self):
+        """Inicia o health check só quando o pool é usado"""
+        if self._probe_thread is None and self.probe_interval:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="ollama-health", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.check_health()
+
+    def check_health(self):
+        """Testa cada backend e atualiza o estado do circuito"""
+        for backend in self.backends:
+            healthy = backend.probe()
+            with self._lock:
+                if healthy and backend.state == ABERTO:
+                    backend.state = MEIO_ABERTO
+                elif not healthy and backend.state != ABERTO:
+                    backend.state = ABERTO
+                    backend.opened_at = time.monotonic()
+                    print(f"⛔ Health check falhou para {backend.name}")
+
+    def close(self):
+        """Para o health check e fecha as conexões"""
+        self._stop.set()
+        for backend in self.backends:
+            try:
+                backend.close()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        """Resumo de requisições, falhas e failovers"""
+        with self._lock:
+            times = self.stats["failover_times"]
+            return {
+                "requests": self.stats["requests"],
+                "failovers": self.stats["failovers"],
+                "exhausted": self.stats["exhausted"],
+                "failover_avg_ms": sum(times) / len(times) * 1000 if times else 0.0,
+                "backends": {
+                    b.name: {"state": b.state, "requests": b.requests, "failures": b.failures}
+                    for b in self.backends
+                },
+            }
+
+
+def build_pool(model="mistral", host="http://localhost:11434", fallback_model=None, fallback_host=None):
+    """
+    Cria o pool a partir da configuração da MIRAI
+
+    Args:
+        model: Modelo principal
+        host: Host principal
+        fallback_model: Modelo secundário (ex: um modelo menor local)
+        fallback_host: Host secundário (padrão: o mesmo host)
+    """
+    backends = [OllamaBackend(host=host, model=model)]
+    if fallback_model or fallback_host:
+        backends.append(OllamaBackend(
+            host=fallback_host or host,
+            model=fallback_model or model
+        ))
+    return MiraiOllamaPool(backends)
+
+
+def _derrubar(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _Corrida:
+    """Uma requisição disputando quem entrega o primeiro chunk"""
+
+    def __init__(self, name, client, kwargs, results, on_first=None):
+        self.name = name
+        self.first = None
+        self.iterator = None
+        self.error = None
+        self.ttft = None
+        self._done = False
+        self._cancelled = False
+        self._sockets = []
+        self._lock = threading.Lock()
+        self._on_first = on_first
+        self.started = time.perf_counter()
+        threading.Thread(target=self._run, args=(client, kwargs, results), daemon=True).start()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def attach(self, sock):
+        """Socket usado por esta corrida (ganchos do httpx, ver ganchos_de_cancelamento)"""
+        if sock is None:
+            return
+        with self._lock:
+            self._sockets.append(sock)
+            cancelled = self._cancelled
+        if cancelled:
+            _derrubar(sock)
+
+    def _run(self, client, kwargs, results):
+        _corrida_local.corrida = self
+        try:
+            response = client.chat(**kwargs)
+            if kwargs.get("stream"):
+                self.iterator = iter(response)
+                self.first = next(self.iterator)
+            else:
+                self.first = response
+            ttft = time.perf_counter() - self.started
+            with self._lock:
+                self.ttft = ttft
+                report = not self._cancelled
+            # Chegou depois do cancelamento: quem cancelou já registrou a medição censurada
+            if report and self._on_first is not None:
+                self._on_first(ttft)
+        except StopIteration:
+            self.error = ConnectionError(f"{self.name}: stream vazio")
+        except Exception as e:
+            self.error = e
+        finally:
+            _corrida_local.corrida = None
+
+        with self._lock:
+            self._done = True
+            cancelled = self._cancelled
+        if cancelled:
+            self._close()
+        results.put(self)
+
+    def cancel(self):
+        """
+        Perdeu a corrida: derruba a conexão
+
+        Se o primeiro chunk ainda não chegou, o socket da requisição é desligado
+        (shutdown acorda a thread bloqueada e o servidor para de gerar). Uma conexão
+        keep-alive reaproveitada só é conhecida quando os cabeçalhos da resposta
+        chegam; nesse caso ela é derrubada nesse instante, pelo gancho de resposta.
+
+        Returns:
+            bool: True se foi cancelada ainda esperando o primeiro chunk (sem erro)
+        """
+        with self._lock:
+            self._cancelled = True
+            done = self._done
+            waiting = self.ttft is None and not done
+            sockets = list(self._sockets)
+        if done:
+            self._close()
+        else:
+            for sock in sockets:
+                _derrubar(sock)
+        return waiting
+
+    def _close(self):
+        if self.iterator is not None and hasattr(self.iterator, "close"):
+            try:
+                self.iterator.close()
+            except Exception:
+                pass
+
+    def relay(self):
+        try:
+            yield self.first
+            yield from self.iterator
+        finally:
+            self._close()
+
+
+class MiraiHedgedClient:
+    def __init__(self, primary, secondary, quantile=0.9, initial_delay=1.0, min_delay=0.05,
+                 window=200, min_samples=10, timeout=120.0):
+        """
+        Hedging entre dois clientes com a interface de ollama.chat
+
+        O secundário só é disparado quando o principal passa do quantil
+        (p90) do seu próprio tempo até o primeiro token, então a carga extra
+        fica perto de 1 - quantile. Vence quem entregar o primeiro chunk;
+        o perdedor é cancelado.
+
+        Args:
+            primary: Cliente principal (ex: MiraiOllamaPool local)
+            secondary: Cliente secundário (ex: OpenAIBackend em nuvem)
+            quantile: Quantil do tempo até o primeiro token que dispara o hedge
+            initial_delay: Atraso usado até juntar min_samples medições
+            min_delay: Atraso mínimo (evita hedge em toda requisição)
+            window: Medições recentes consideradas
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.timeout = timeout
+        self._ttft = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hedged": 0, "secondary_wins": 0, "errors": 0}
+
+    def _record_ttft(self, seconds):
+        with self._lock:
+            self._ttft.append(seconds)
+
+    def _cancel(self, racer, delay):
+        """
+        Cancela uma corrida; o principal cancelado antes do primeiro token vira uma
+        medição censurada (pelo menos o que já esperou, e nunca abaixo do atraso
+        atual), senão o quantil só veria as respostas rápidas e o atraso encolheria
+        """
+        if racer.cancel() and racer.name == "principal":
+            self._record_ttft(max(time.perf_counter() - racer.started, delay))
+
+    def hedge_delay(self):
+        """Quantil do tempo até o primeiro token do principal"""
+        with self._lock:
+            samples = sorted(self._ttft)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        index = min(len(samples) - 1, int(self.quantile * len(samples)))
+        return max(self.min_delay, samples[index])
+
+    def chat(self, **kwargs):
+        """
+        Mesmo formato de ollama.chat
+
+        Com stream=True a corrida é pelo primeiro chunk; sem stream, pela resposta inteira.
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+        results = queue.Queue()
+        racers = [_Corrida("principal", self.primary, kwargs, results, on_first=self._record_ttft)]
+        delay = self.hedge_delay()
+
+        try:
+            winner = results.get(timeout=delay)
+        except queue.Empty:
+            winner = None
+
+        # Principal lento ou com erro: dispara o secundário
+        if winner is None or winner.error is not None:
+            with self._lock:
+                self.stats["hedged"] += 1
+            racers.append(_Corrida("secundário", self.secondary, kwargs, results))
+            finished = [winner] if winner is not None else []
+            winner = None
+            deadline = time.monotonic() + self.timeout
+            while len(finished) < len(racers):
+                try:
+                    racer = results.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                finished.append(racer)
+                if racer.error is None:
+                    winner = racer
+                    break
+
+        if winner is None:
+            for racer in racers:
+                self._cancel(racer, delay)
+            with self._lock:
+                self.stats["errors"] += 1
+            errors = [str(r.error) for r in racers if r.error is not None]
+            raise ConnectionError(f"Nenhum backend respondeu: {'; '.join(errors) or 'timeout'}")
+
+        for racer in racers:
+            if racer is not winner:
+                self._cancel(racer, delay)
+        if winner.name != "principal":
+            with self._lock:
+                self.stats["secondary_wins"] += 1
+
+        return winner.relay() if kwargs.get("stream") else winner.first
+
+    def close(self):
+        for client in (self.primary, self.secondary):
+            if hasattr(client, "close"):
+                client.close()
+
+    def get_stats(self):
+        """Taxa de hedge (carga extra) e atraso atual"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hedge_rate"] = stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+        stats["hedge_delay_ms"] = self.hedge_delay() * 1000
+        return stats
+
+
+def build_hedged(primary, url, model, kind="openai", api_key=None):
+    """
+    Envolve o cliente principal com hedging para um backend secundário
+
+    Args:
+        primary: Cliente principal (resultado de build_pool)
+        url: URL do backend secundário
+        model: Modelo do backend secundário
+        kind: "openai" (API compatível com a OpenAI) ou "ollama"
+        api_key: Chave da API (padrão: variável MIRAI_LLM_API_KEY)
+    """
+    if kind == "ollama":
+        secondary = OllamaBackend(host=url, model=model)
+    else:
+        secondary = OpenAIBackend(url, model, api_key=api_key or os.environ.get("MIRAI_LLM_API_KEY"))
+    print(f"🏁 Hedging com {secondary.name}")
+    return MiraiHedgedClient(primary, secondary)
+
+
+# ----------------------------------------------------------------------
+# Servidor falso para medir failover e reuso de conexões
+# ----------------------------------------------------------------------
+
+def start_fake_server(reply="Hai! Tudo certo por aqui.", delay=0.0):
+    """
+    Sobe um servidor HTTP/1.1 local que imita /api/chat e /api/tags
+    (e /v1/chat/completions e /v1/models da API da OpenAI)
+
+    Args:
+        delay: Segundos antes do primeiro byte, ou função que sorteia o atraso
+
+    Returns:
+        (servidor, url, contadores) - contadores tem 'connections' e 'requests'
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    counters = {"connections": 0, "requests": 0}
+    lock = threading.Lock()
+    open_sockets = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with lock:
+                counters["connections"] += 1
+                open_sockets.add(self.connection)
+
+        def finish(self):
+            super().finish()
+            with lock:
+                open_sockets.discard(self.connection)
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, body):
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._send_json(json.dumps({"models": [], "data": []}))
+
+        def do_POST(self):
+            with lock:
+                counters["requests"] += 1
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            wait = delay() if callable(delay) else delay
+            if wait:
+                time.sleep(wait)
+
+            model = request.get("model", "fake")
+            try:
+                if self.path.startswith("/v1/"):
+                    self._reply_openai(request, model)
+                else:
+                    self._reply_ollama(request, model)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Cliente cancelou (perdeu a corrida do hedging)
+
+        def _reply_openai(self, request, model):
+            words = reply.split(" ")
+            if not request.get("stream"):
+                self._send_json(json.dumps({
+                    "model": model,
+                    "choices": [{"message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                    "usage": {"completion_tokens": len(words)},
+                }))
+                return
+            events = [{"choices": [{"delta": {"content": w + " "}, "finish_reason": None}]} for w in words]
+            events.append({"choices": [{"delta": {}, "finish_reason": "stop"}]})
+            events.append({"choices": [], "usage": {"completion_tokens": len(words)}})
+            body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _reply_ollama(self, request, model):
+            if request.get("stream"):
+                words = reply.split(" ")
+                lines = [
+                    json.dumps({"model": model, "message": {"role": "assistant", "content": w + " "}, "done": False})
+                    for w in words
+                ]
+                lines.append(json.dumps({
+                    "model": model, "message": {"role": "assistant", "content": ""},
+                    "done": True, "done_reason": "stop", "eval_count": len(words)
+                }))
+                self._send_json("\n".join(lines) + "\n")
+            else:
+                self._send_json(json.dumps({
+                    "model": model, "message": {"role": "assistant", "content": reply}, "done": True
+                }))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.open_sockets = open_sockets
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, url, counters
+
+
+def stop_fake_server(server):
+    """Derruba o servidor falso, inclusive as conexões keep-alive abertas"""
+    import socket
+
+    server.shutdown()
+    server.server_close()
+    for sock in list(server.open_sockets):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def benchmark(requests=200):
+    """Mede reuso de conexões e tempo de failover contra servidores falsos"""
+    primary, primary_url, primary_counters = start_fake_server()
+    secondary, secondary_url, secondary_counters = start_fake_server(reply="Resposta do backend reserva.")
+
+    pool = MiraiOllamaPool(
+        [OllamaBackend(host=primary_url, model="mistral"),
+         OllamaBackend(host=secondary_url, model="mistral-pequeno")],
+        probe_interval=0.5
+    )
+    messages = [{"role": "user", "content": "Oi"}]
+
+    print("\n📊 Benchmark do pool de conexões")
+    print("="*50)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        pool.chat(messages=messages)
+    elapsed = time.perf_counter() - start
+
+    hit_rate = 1 - primary_counters["connections"] / primary_counters["requests"]
+    print(f"🔗 {primary_counters['requests']} requisições, {primary_counters['connections']} conexões "
+          f"(reuso {hit_rate:.1%}), {elapsed / requests * 1000:.2f} ms/req")
+
+    # Derruba o principal e mede o failover
+    stop_fake_server(primary)
+
+    start = time.perf_counter()
+    for _ in range(20):
+        pool.chat(messages=messages)
+    elapsed = time.perf_counter() - start
+
+    stats = pool.get_stats()
+    print(f"🔀 Failover médio: {stats['failover_avg_ms']:.1f} ms em {stats['failovers']} requisições")
+    print(f"⏱️  20 requisições após a queda: {elapsed * 1000:.1f} ms")
+    for name, info in stats["backends"].items():
+        print(f"   • {name}: {info}")
+
+    pool.close()
+    stop_fake_server(secondary)
+    print("="*50)
+
+
+def _percentis(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return pick(0.5), pick(0.9), pick(0.99)
+
+
+def benchmark_hedging(requests=150, seed=7):
+    """
+    Tempo até o primeiro token com e sem hedging
+
+    Principal: Ollama local falso, rápido em 90% das vezes e com cauda longa.
+    Secundário: servidor compatível com a OpenAI, mais lento porém estável.
+    """
+    import random
+    rng = random.Random(seed)
+
+    def latencia_local():
+        return rng.uniform(0.05, 0.12) if rng.random() < 0.9 else rng.uniform(0.8, 1.5)
+
+    def latencia_nuvem():
+        return rng.uniform(0.15, 0.25)
+
+    primary, primary_url, primary_counters = start_fake_server(delay=latencia_local)
+    secondary, secondary_url, secondary_counters = start_fake_server(
+        reply="Resposta do backend secundário.", delay=latencia_nuvem)
+    messages = [{"role": "user", "content": "Oi"}]
+
+    def ttft(client):
+        start = time.perf_counter()
+        stream = client.chat(model="mistral", messages=messages, stream=True)
+        next(iter(stream))
+        elapsed = time.perf_counter() - start
+        stream.close()
+        return elapsed
+
+    print("\n📊 Benchmark de hedging (tempo até o primeiro token)")
+    print("="*50)
+
+    local = OllamaBackend(host=primary_url, model="mistral")
+    sozinho = [ttft(local) for _ in range(requests)]
+
+    hedged = MiraiHedgedClient(OllamaBackend(host=primary_url, model="mistral"),
+                               OpenAIBackend(secondary_url, "nuvem"))
+    com_hedge = [ttft(hedged) for _ in range(requests)]
+    stats = hedged.get_stats()
+
+    p50, p90, p99 = _percentis(sozinho)
+    print(f"  Só o principal: p50 {p50:.0f} ms, p90 {p90:.0f} ms, p99 {p99:.0f} ms")
+    p50, p90, p99 = _percentis(com_hedge)
+    print(f"  Com hedging:    p50 {p50:.0f} ms, p90 {p90:.0f} ms, p99 {p99:.0f} ms")
+    print(f"  Hedge disparado em {stats['hedge_rate']:.1%} das requisições "
+          f"(atraso atual {stats['hedge_delay_ms']:.0f} ms), secundário venceu {stats['secondary_wins']}")
+    print(f"  Carga extra: {secondary_counters['requests']} requisições no secundário "
+          f"para {requests} turnos ({secondary_counters['requests'] / requests:.1%})")
+
+    hedged.close()
+    stop_fake_server(primary)
+    stop_fake_server(secondary)
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    benchmark()
+    benchmark_hedging()
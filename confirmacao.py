@@ -0,0 +1,225 @@
+"""
+Confirmações curtas para mascarar a latência do LLM
+
+Um pequeno banco de falas ("Hai!", "Hmm...") é sintetizado uma vez e fica na
+memória como float32 já na taxa do dispositivo. Quando a resposta deve demorar
+(estimativa pela média móvel dos últimos turnos), uma delas toca logo depois do
+fim da fala do usuário, por cima da fila de saída, e some em crossfade quando
+a resposta de verdade começa (ver MiraiAudioOutput.cue).
+"""
+import time
+import random
+import threading
+import numpy as np
+
+from audio_utils import PolyphaseResampler, ALVO_LUFS, loudness_lufs
+
+CONFIRMACOES = ("Hai!", "Hmm...", "Wakarimashita!", "Deixa eu ver...")
+
+# Abaixo disso a resposta chega rápido o bastante sem confirmação
+LIMIAR_SEGUNDOS = 0.8
+
+# Estimativa inicial (LLM local em CPU costuma levar alguns segundos)
+LATENCIA_INICIAL = 2.0
+
+
+def _preparar(wav, threshold=0.01, fade_ms=15, sample_rate=22050):
+    """Corta o silêncio das pontas, leva à loudness da saída e suaviza início/fim"""
+    wav = np.asarray(wav, dtype=np.float32)
+    voiced = np.flatnonzero(np.abs(wav) > threshold)
+    if len(voiced):
+        wav = wav[voiced[0]:voiced[-1] + 1]
+    # A confirmação não passa pelo normalizador do stream: já sai no mesmo nível
+    peak = np.max(np.abs(wav)) if len(wav) else 0.0
+    if peak > 0:
+        try:
+            measured = loudness_lufs(wav, sample_rate)
+        except ImportError:
+            measured = None
+        gain = 0.8 / peak
+        if measured is not None:
+            gain = min(gain, 10 ** ((ALVO_LUFS - measured) / 20))
+        wav = wav * gain
+    fade = min(len(wav) // 2, int(sample_rate * fade_ms / 1000))
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        wav[:fade] *= ramp
+        wav[-fade:] *= ramp[::-1]
+    return np.ascontiguousarray(wav, dtype=np.float32)
+
+
+class MiraiAcknowledgments:
+    def __init__(self, tts, texts=CONFIRMACOES, threshold=LIMIAR_SEGUNDOS, alpha=0.3):
+        """
+        Banco de confirmações pré-sintetizadas
+
+        Args:
+            tts: MiraiTTS (síntese e stream de saída)
+            texts: Frases do banco
+            threshold: Latência prevista (s) a partir da qual a confirmação toca
+            alpha: Peso do último turno na média móvel da latência
+        """
+        self.tts = tts
+        self.texts = texts
+        self.threshold = threshold
+        self.alpha = alpha
+        self.predicted = LATENCIA_INICIAL
+        self._clips = []  # (texto, float32, taxa de origem)
+        self._by_rate = {}  # taxa do dispositivo -> lista de float32
+        self._last = None
+        self._ready = threading.Event()
+        self._endpoint_at = None
+        self.stats = {"played": 0, "skipped": 0, "trigger_ms": [], "prepare_ms": 0.0}
+
+    def prepare(self, background=True):
+        """Sintetiza o banco (em segundo plano por padrão, a inicialização não espera)"""
+        if background:
+            threading.Thread(target=self._prepare, daemon=True).start()
+        else:
+            self._prepare()
+        return self
+
+    def _prepare(self):
+        start = time.perf_counter()
+        for text in self.texts:
+            try:
+                wav, sample_rate = self.tts.generate_speech(text)
+            except Exception as e:
+                print(f"⚠️  Erro ao sintetizar confirmação '{text}': {e}")
+                continue
+            if wav is not None and len(wav):
+                self._clips.append((text, _preparar(wav, sample_rate=sample_rate), sample_rate))
+        try:
+            self._resampled(self.tts.get_output().sample_rate)
+        except Exception as e:
+            print(f"⚠️  Saída de áudio indisponível para confirmações: {e}")
+        self.stats["prepare_ms"] = (time.perf_counter() - start) * 1000
+        self._ready.set()
+        print(f"💬 {len(self._clips)} confirmações prontas em {self.stats['prepare_ms']:.0f} ms")
+
+    def _resampled(self, device_rate):
+        """Banco na taxa do dispositivo (calculado uma vez por taxa)"""
+        clips = self._by_rate.get(device_rate)
+        if clips is None:
+            clips = []
+            for _, wav, sample_rate in self._clips:
+                if sample_rate == device_rate:
+                    clips.append(wav)
+                else:
+                    resampler = PolyphaseResampler(sample_rate, device_rate)
+                    clips.append(np.concatenate([resampler.process(wav), resampler.flush()]))
+            self._by_rate[device_rate] = clips
+        return clips
+
+    def _choose(self, clips):
+        """Evita repetir a mesma confirmação duas vezes seguidas"""
+        options = [i for i in range(len(clips)) if i != self._last] or list(range(len(clips)))
+        self._last = random.choice(options)
+        return clips[self._last]
+
+    def on_endpoint(self):
+        """
+        Chamado quando o usuário termina de falar
+
+        Toca uma confirmação se a resposta prevista passa do limiar.
+
+        Returns:
+            _Confirmacao ou None
+        """
+        self._endpoint_at = time.perf_counter()
+        if not self._ready.is_set() or not self._clips or self.predicted < self.threshold:
+            self.stats["skipped"] += 1
+            return None
+
+        output = self.tts.get_output()
+        samples = self._choose(self._resampled(output.sample_rate))
+        if self.tts.volume != 1.0:
+            samples = samples * self.tts.volume
+        cue = output.cue(samples)
+        if cue is None:
+            self.stats["skipped"] += 1
+            return None
+
+        self.stats["played"] += 1
+        self.stats["trigger_ms"].append((time.perf_counter() - self._endpoint_at) * 1000)
+        return cue
+
+    def on_reply_start(self, dac_offset):
+        """
+        Chamado quando a primeira frase da resposta começa a tocar
+
+        Atualiza a média móvel usada para prever a latência do próximo turno.
+
+        Returns:
+            float: Latência do fim da fala do usuário até a resposta (s) ou None
+        """
+        if self._endpoint_at is None:
+            return None
+        latency = time.perf_counter() - self._endpoint_at + dac_offset
+        self._endpoint_at = None
+        self.predicted = self.alpha * latency + (1 - self.alpha) * self.predicted
+        return latency
+
+
+def benchmark(tts=None, device=None, latencies=(0.5, 1.0, 2.0, 4.0)):
+    """
+    Latência percebida (primeiro som depois do fim da fala) com e sem confirmação
+
+    Simula respostas do LLM com as latências informadas; sem TTS usa tons
+    curtos no lugar das falas.
+    """
+    from saida_audio import MiraiAudioOutput
+
+    print("\n📊 Benchmark de confirmações")
+    print("="*50)
+
+    output = MiraiAudioOutput(device)
+    if tts is not None:
+        tts.output = output
+        acks = MiraiAcknowledgments(tts).prepare(background=False)
+        clips = acks._resampled(output.sample_rate)
+    else:
+        t = np.arange(int(0.35 * output.sample_rate)) / output.sample_rate
+        clips = [_preparar(0.3 * np.sin(2 * np.pi * 660 * t), sample_rate=output.sample_rate)]
+
+    reply_rate = 22050
+    t = np.arange(int(1.0 * reply_rate)) / reply_rate
+    reply = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    print(f"  {'LLM':>6} {'sem':>9} {'com':>9} {'disparo':>9}")
+    for latency in latencies:
+        resultados = {}
+        for with_ack in (False, True):
+            endpoint = time.perf_counter()
+            first = []
+            trigger_ms = None
+            if with_ack:
+                cue = output.cue(clips[0])
+                trigger_ms = (time.perf_counter() - endpoint) * 1000
+                if cue is not None and cue.event.wait(1.0):
+                    first.append(time.perf_counter() - endpoint + cue.offset)
+
+            # A resposta "chega" depois da latência do LLM
+            time.sleep(max(0.0, latency - (time.perf_counter() - endpoint)))
+            output.play([reply], reply_rate,
+                        on_start=lambda offset: first.append(time.perf_counter() - endpoint + offset))
+            resultados[with_ack] = (min(first) if first else float("nan"), trigger_ms)
+            time.sleep(0.2)
+
+        sem = resultados[False][0] * 1000
+        com, trigger_ms = resultados[True]
+        print(f"  {latency:>5.1f}s {sem:>7.0f}ms {com * 1000:>7.0f}ms {trigger_ms:>7.2f}ms "
+              f"(-{sem - com * 1000:.0f} ms percebidos)")
+
+    output.close()
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    import sys
+    if "--sem-tts" in sys.argv:
+        benchmark()
+    else:
+        from falar import MiraiTTS
+        benchmark(MiraiTTS())
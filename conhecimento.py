@@ -0,0 +1,362 @@
+"""
+Base de conhecimento local (RAG) para os assuntos da persona
+Os textos (guias de Genshin, Star Rail, Pokémon...) são divididos em trechos e
+convertidos em embeddings uma única vez; em cada turno só os poucos trechos
+mais parecidos com a pergunta entram no prompt.
+
+Uso:
+    python conhecimento.py build conhecimento/           # gera conhecimento/indice/
+    python conhecimento.py query "Quem é a Furina?"
+    python conhecimento.py bench                         # latência com 100 mil trechos
+"""
+import os
+import re
+import json
+import time
+import argparse
+import numpy as np
+
+INDICE_PADRAO = "conhecimento/indice"
+MODELO_EMBEDDING = "nomic-embed-text"
+EXTENSOES = (".txt", ".md")
+
+PARAGRAFO = re.compile(r'\n\s*\n')
+SENTENCA = re.compile(r'(?<=[.!?…])\s+')
+
+
+def _normalizar_linhas(matrix):
+    """Normaliza cada linha para norma 1 (cosseno vira produto escalar)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def dividir_em_trechos(texto, max_chars=600):
+    """
+    Divide um texto em trechos de até max_chars, sem quebrar frases
+
+    A última frase de um trecho se repete no início do próximo para não
+    perder o contexto na fronteira.
+    """
+    trechos = []
+    for paragrafo in PARAGRAFO.split(texto):
+        frases = [f.strip() for f in SENTENCA.split(paragrafo.strip()) if f.strip()]
+        atual = []
+        tamanho = 0
+        for frase in frases:
+            if atual and tamanho + len(frase) > max_chars:
+                trechos.append(" ".join(atual))
+                atual = atual[-1:]
+                tamanho = len(atual[0])
+            atual.append(frase)
+            tamanho += len(frase) + 1
+        if atual:
+            trechos.append(" ".join(atual))
+    return trechos
+
+
+class OllamaEmbedder:
+    def __init__(self, model=MODELO_EMBEDDING, host="http://localhost:11434"):
+        """
+        Gera embeddings com um modelo do Ollama
+
+        Args:
+            model: Modelo de embedding (ex: nomic-embed-text, bge-m3)
+            host: Servidor Ollama
+        """
+        import ollama
+
+        self.model = model
+        self.client = ollama.Client(host=host)
+
+    def __call__(self, texts):
+        """
+        Returns:
+            np.ndarray float32 [len(texts), dim]
+        """
+        response = self.client.embed(model=self.model, input=list(texts))
+        return np.asarray(response["embeddings"], dtype=np.float32)
+
+
+def _kmeans_esferico(matrix, k, iterations=10, sample=None, seed=0):
+    """K-means por cosseno (centróides normalizados) numa amostra das linhas"""
+    rng = np.random.default_rng(seed)
+    n = len(matrix)
+    if sample and n > sample:
+        data = np.asarray(matrix[np.sort(rng.choice(n, sample, replace=False))])
+    else:
+        data = np.asarray(matrix)
+
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = np.bincount(assign, minlength=k) == 0
+        # Lista vazia recebe um ponto aleatório para não perder o centróide
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = _normalizar_linhas(sums)
+    return centroids
+
+
+def _atribuir(matrix, centroids, batch=8192):
+    """Centróide mais próximo de cada linha (em lotes, a matriz pode ser um memmap)"""
+    assign = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), batch):
+        assign[start:start + batch] = np.argmax(matrix[start:start + batch] @ centroids.T, axis=1)
+    return assign
+
+
+def gravar_indice(output_dir, embeddings, trechos, fontes, model, nlist=None):
+    """
+    Grava a matriz de embeddings (float32, lida por memmap) e os trechos
+
+    Com nlist > 0 as linhas são agrupadas por k-means (IVF): cada lista fica
+    contígua no arquivo e a busca só lê as listas mais próximas da pergunta.
+
+    Args:
+        embeddings: Matriz [n, dim] (normalizada aqui)
+        trechos: Textos dos trechos, na mesma ordem
+        fontes: Arquivo de origem de cada trecho
+        nlist: Número de listas (None = automático, 0 = busca exata)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    matrix = _normalizar_linhas(np.asarray(embeddings, dtype=np.float32))
+    n, dim = matrix.shape
+
+    if nlist is None:
+        nlist = 0 if n < 20000 else int(2 * np.sqrt(n))
+
+    order = np.arange(n)
+    if nlist:
+        centroids = _kmeans_esferico(matrix, nlist, sample=nlist * 64)
+        assign = _atribuir(matrix, centroids)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=nlist))))
+        np.save(os.path.join(output_dir, "centroids.npy"), centroids)
+        np.save(os.path.join(output_dir, "list_offsets.npy"), list_offsets.astype(np.int64))
+
+    out = np.lib.format.open_memmap(
+        os.path.join(output_dir, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(n, dim)
+    )
+    out[:] = matrix[order]
+    out.flush()
+    del out
+
+    # Textos num arquivo só; cada linha da matriz aponta para (início, fim) em bytes
+    spans = np.empty((n, 2), dtype=np.int64)
+    posicao = 0
+    with open(os.path.join(output_dir, "chunks.txt"), "wb") as f:
+        for row, i in enumerate(order):
+            dados = trechos[i].encode("utf-8")
+            f.write(dados)
+            spans[row] = (posicao, posicao + len(dados))
+            posicao += len(dados)
+    np.save(os.path.join(output_dir, "chunk_spans.npy"), spans)
+
+    with open(os.path.join(output_dir, "sources.json"), "w", encoding="utf-8") as f:
+        json.dump([fontes[i] for i in order], f, ensure_ascii=False)
+
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model, "dim": dim, "chunks": n, "nlist": nlist}, f, indent=2)
+
+
+def build_index(corpus_dir, output_dir=INDICE_PADRAO, embedder=None, batch_size=32, nlist=None,
+                max_chars=600):
+    """
+    Ingestão offline: lê .txt/.md do corpus, divide em trechos e gera o índice
+
+    Args:
+        corpus_dir: Pasta com os textos
+        embedder: Callable textos -> matriz (padrão: OllamaEmbedder)
+    """
+    embedder = embedder or OllamaEmbedder()
+
+    trechos, fontes = [], []
+    for raiz, _, arquivos in os.walk(corpus_dir):
+        if os.path.abspath(raiz).startswith(os.path.abspath(output_dir)):
+            continue
+        for nome in sorted(arquivos):
+            if not nome.lower().endswith(EXTENSOES):
+                continue
+            caminho = os.path.join(raiz, nome)
+            with open(caminho, encoding="utf-8", errors="ignore") as f:
+                for trecho in dividir_em_trechos(f.read(), max_chars):
+                    trechos.append(trecho)
+                    fontes.append(os.path.relpath(caminho, corpus_dir))
+
+    if not trechos:
+        print(f"❌ Nenhum texto encontrado em {corpus_dir}")
+        return None
+
+    print(f"📚 {len(trechos)} trechos de {len(set(fontes))} arquivos")
+    start = time.perf_counter()
+    partes = []
+    for i in range(0, len(trechos), batch_size):
+        partes.append(embedder(trechos[i:i + batch_size]))
+        print(f"\r🔢 Embeddings: {min(i + batch_size, len(trechos))}/{len(trechos)}", end="", flush=True)
+    print(f"\n⏱️  Embeddings gerados em {time.perf_counter() - start:.1f}s")
+
+    gravar_indice(output_dir, np.concatenate(partes), trechos, fontes,
+                  getattr(embedder, "model", None), nlist)
+    print(f"✅ Índice gravado em {output_dir}")
+    return output_dir
+
+
+class MiraiKnowledgeIndex:
+    def __init__(self, index_dir=INDICE_PADRAO, embedder=None, nprobe=16, min_score=0.5):
+        """
+        Busca top-k por cosseno no índice gravado por build_index
+
+        A matriz é aberta por memmap: nada é carregado além das linhas lidas.
+
+        Args:
+            embedder: Callable textos -> matriz (padrão: OllamaEmbedder com o modelo do índice)
+            nprobe: Listas IVF visitadas por busca (ignorado na busca exata)
+            min_score: Similaridade mínima para um trecho entrar no prompt
+        """
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.index_dir = index_dir
+        self.embedder = embedder or OllamaEmbedder(self.meta.get("model") or MODELO_EMBEDDING)
+        self.nprobe = nprobe
+        self.min_score = min_score
+
+        self.matrix = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        self.spans = np.load(os.path.join(index_dir, "chunk_spans.npy"))
+        with open(os.path.join(index_dir, "sources.json"), encoding="utf-8") as f:
+            self.sources = json.load(f)
+
+        self.centroids = None
+        self.list_offsets = None
+        if self.meta.get("nlist"):
+            self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+            self.list_offsets = np.load(os.path.join(index_dir, "list_offsets.npy"))
+
+        self._chunks = open(os.path.join(index_dir, "chunks.txt"), "rb")
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search_vector(self, query, k=3):
+        """
+        Top-k para um embedding já calculado
+
+        Returns:
+            tuple: (linhas, similaridades) em ordem decrescente
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.centroids is None:
+            rows = np.arange(len(self.matrix))
+            scores = self.matrix @ query
+        else:
+            nearest = np.argpartition(-(self.centroids @ query), min(self.nprobe, len(self.centroids)) - 1)
+            partes_rows, partes_scores = [], []
+            for lista in nearest[:self.nprobe]:
+                a, b = self.list_offsets[lista], self.list_offsets[lista + 1]
+                if b > a:
+                    partes_rows.append(np.arange(a, b))
+                    partes_scores.append(self.matrix[a:b] @ query)
+            if not partes_rows:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            rows = np.concatenate(partes_rows)
+            scores = np.concatenate(partes_scores)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def chunk(self, row):
+        """Texto do trecho (lido do disco sob demanda)"""
+        start, end = self.spans[row]
+        self._chunks.seek(start)
+        return self._chunks.read(end - start).decode("utf-8")
+
+    def search(self, texto, k=3, min_score=None):
+        """
+        Trechos mais parecidos com o texto
+
+        Returns:
+            list: [{"text", "source", "score"}] acima de min_score
+        """
+        min_score = self.min_score if min_score is None else min_score
+        query = self.embedder([texto])[0]
+        rows, scores = self.search_vector(query, k)
+        return [
+            {"text": self.chunk(row), "source": self.sources[row], "score": float(score)}
+            for row, score in zip(rows, scores)
+            if score >= min_score
+        ]
+
+    def close(self):
+        self._chunks.close()
+
+
+def benchmark(n=100_000, dim=768, queries=200, k=3, output_dir="benchmark_indice"):
+    """Latência da busca exata x IVF com n trechos sintéticos agrupados"""
+    import shutil
+
+    print(f"\n📊 Benchmark do índice de conhecimento ({n:,} trechos, dim {dim})")
+    print("="*60)
+
+    # Embeddings reais formam grupos por assunto; simula com uma mistura de gaussianas
+    rng = np.random.default_rng(0)
+    temas = rng.standard_normal((500, dim)).astype(np.float32)
+    matrix = temas[rng.integers(0, len(temas), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    perguntas = matrix[rng.integers(0, n, queries)] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    trechos = [f"trecho {i}" for i in range(n)]
+
+    resultados = {}
+    for nome, nlist in (("exata", 0), ("ivf", None)):
+        pasta = os.path.join(output_dir, nome)
+        start = time.perf_counter()
+        gravar_indice(pasta, matrix, trechos, ["sintetico"] * n, None, nlist)
+        build = time.perf_counter() - start
+
+        index = MiraiKnowledgeIndex(pasta, embedder=lambda texts: None)
+        index.search_vector(perguntas[0], k)  # aquecimento (páginas do memmap)
+
+        latencias, encontrados = [], []
+        for q in perguntas:
+            t0 = time.perf_counter()
+            rows, _ = index.search_vector(q, k)
+            latencias.append((time.perf_counter() - t0) * 1000)
+            encontrados.append({index.chunk(r) for r in rows})
+        index.close()
+        latencias.sort()
+        resultados[nome] = encontrados
+
+        extra = ""
+        if nome == "ivf":
+            recall = np.mean([len(a & b) / k for a, b in zip(resultados["exata"], encontrados)])
+            extra = f" | recall@{k} {recall:.2f} (nprobe {index.nprobe}, nlist {index.meta['nlist']})"
+        print(f"  {nome:<6} build {build:5.1f}s | p50 {latencias[len(latencias) // 2]:.2f} ms "
+              f"p99 {latencias[int(len(latencias) * 0.99)]:.2f} ms{extra}")
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    print("="*60)
+
+
+# Teste direto
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Base de conhecimento da Mirai")
+    parser.add_argument("comando", choices=["build", "query", "bench"])
+    parser.add_argument("alvo", nargs="?", help="Pasta do corpus (build) ou pergunta (query)")
+    parser.add_argument("--dir", default=INDICE_PADRAO)
+    parser.add_argument("--model", default=MODELO_EMBEDDING)
+    parser.add_argument("--host", default="http://localhost:11434")
+    parser.add_argument("--nlist", type=int, default=None, help="Listas IVF (0 = busca exata)")
+    args = parser.parse_args()
+
+    if args.comando == "build":
+        build_index(args.alvo or "conhecimento", args.dir, OllamaEmbedder(args.model, args.host), nlist=args.nlist)
+    elif args.comando == "query":
+        index = MiraiKnowledgeIndex(args.dir, OllamaEmbedder(args.model, args.host))
+        for item in index.search(args.alvo or "", k=5, min_score=0.0):
+            print(f"[{item['score']:.3f}] ({item['source']}) {item['text'][:120]}")
+    else:
+        benchmark()
@@ -0,0 +1,380 @@
+"""
+Registro de dispositivos de áudio (saída e microfone)
+
+- Enumera uma vez, em segundo plano, sem travar a inicialização
+- Identifica cada dispositivo por nome + host API (o índice muda quando algo é plugado)
+- Observa mudanças (hot-plug) e avisa quem usa os dispositivos: no Linux
+  comparando /proc/asound e /dev/snd (leitura de arquivos, sem PortAudio); em
+  todos os sistemas quando um stream de áudio falha (report_error)
+- Converte o dispositivo salvo na configuração para o índice atual
+
+Microfones do SpeechRecognition usam os mesmos índices do PortAudio,
+então sr.Microphone(device_index=...) aceita os índices daqui.
+"""
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+import sounddevice as sd
+
+SAIDA = "output"
+ENTRADA = "input"
+
+
+def assinatura_sistema():
+    """
+    Assinatura barata das placas de som do sistema (sem tocar no PortAudio)
+
+    Returns:
+        tuple, ou None se o sistema não oferece uma (aí só report_error detecta mudanças)
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        with open("/proc/asound/cards", encoding="utf-8", errors="replace") as f:
+            cards = f.read()
+        nodes = tuple(sorted(os.listdir("/dev/snd"))) if os.path.isdir("/dev/snd") else ()
+    except OSError:
+        return None
+    return cards, nodes
+
+
+def _reiniciar_portaudio():
+    """
+    Reinicializa o PortAudio para ele enxergar dispositivos novos
+
+    O sounddevice não tem API pública para isso. A contagem de Pa_Initialize é
+    compartilhada com o PyAudio (microfone do SpeechRecognition): só reinicializa
+    de verdade sem microfone aberto, por isso o registro espera hold() liberar.
+    """
+    while sd._initialized:
+        sd._terminate()
+    sd._initialize()
+
+
+def chave(device):
+    """Identificador estável: nome + host API"""
+    return f"{device['name']}|{device['hostapi']}"
+
+
+def enumerar():
+    """
+    Lista os dispositivos do PortAudio deste processo
+
+    Returns:
+        list: [{"index", "name", "hostapi", "key", "inputs", "outputs", "sample_rate"}]
+    """
+    apis = sd.query_hostapis()
+    devices = []
+    for i, d in enumerate(sd.query_devices()):
+        device = {
+            "index": i,
+            "name": d["name"],
+            "hostapi": apis[d["hostapi"]]["name"],
+            "inputs": d["max_input_channels"],
+            "outputs": d["max_output_channels"],
+            "sample_rate": d["default_samplerate"],
+        }
+        device["key"] = chave(device)
+        devices.append(device)
+    return devices
+
+
+class MiraiDeviceRegistry:
+    def __init__(self, poll_interval=5.0):
+        """
+        Cache de dispositivos com detecção de hot-plug
+
+        Args:
+            poll_interval: Segundos entre verificações de mudança (0 = não observa)
+        """
+        self.poll_interval = poll_interval
+        self._devices = []
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._warned = set()
+        self._ready = threading.Event()
+        self._on_ready = []
+        self._running = False
+        self._thread = None
+        # Mudança detectada e ainda não aplicada; streams do PyAudio abertos (ver hold).
+        # hold() e a reinicialização do PortAudio se excluem pela condição _portaudio
+        self._stale = False
+        self._held = 0
+        self._refreshing = False
+        self._portaudio = threading.Condition()
+        self._signature = assinatura_sistema()
+        self.stats = {"enumerations": 0, "changes": 0, "enumerate_ms": 0.0, "checks": 0, "errors": 0}
+
+    def start(self):
+        """Enumera em segundo plano e começa a observar mudanças (não bloqueia)"""
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _enumerate(self):
+        start = time.perf_counter()
+        devices = enumerar()
+        with self._lock:
+            self._devices = devices
+        self.stats["enumerations"] += 1
+        self.stats["enumerate_ms"] = (time.perf_counter() - start) * 1000
+        self._set_ready()
+        return devices
+
+    def _set_ready(self):
+        with self._lock:
+            if self._ready.is_set():
+                return
+            self._ready.set()
+            callbacks, self._on_ready = self._on_ready, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️  Erro ao listar dispositivos de áudio: {e}")
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def when_ready(self, callback):
+        """Chama `callback` depois da primeira enumeração (na hora, se já terminou)"""
+        self.start()
+        with self._lock:
+            if not self._ready.is_set():
+                self._on_ready.append(callback)
+                return
+        callback()
+
+    def _watch_loop(self):
+        try:
+            self._enumerate()
+        except Exception as e:
+            print(f"⚠️  Erro ao enumerar dispositivos de áudio: {e}")
+            self._set_ready()
+
+        while self._running and self.poll_interval:
+            time.sleep(self.poll_interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️  Erro ao verificar dispositivos de áudio: {e}")
+
+    def check(self):
+        """
+        Verifica se as placas de som mudaram e aplica a mudança quando possível
+
+        Returns:
+            bool: True se o registro foi atualizado
+        """
+        self.stats["checks"] += 1
+        signature = assinatura_sistema()
+        if signature is not None and signature != self._signature:
+            self._signature = signature
+            self._stale = True
+        with self._portaudio:
+            if not self._stale or self._held or self._refreshing:
+                return False
+            self._refreshing = True
+        self._refresh()
+        return True
+
+    def report_error(self, error=None):
+        """Um stream falhou (ex: dispositivo removido): enumera de novo na próxima verificação"""
+        self.stats["errors"] += 1
+        self._stale = True
+        if error is not None:
+            print(f"⚠️  Erro no stream de áudio ({error}), verificando dispositivos...")
+
+    @contextmanager
+    def hold(self):
+        """
+        Marca um stream do PyAudio aberto (a reinicialização do PortAudio espera)
+
+        Se uma reinicialização já começou, espera ela terminar antes de abrir.
+        """
+        with self._portaudio:
+            self._portaudio.wait_for(lambda: not self._refreshing)
+            self._held += 1
+        try:
+            yield
+        finally:
+            with self._portaudio:
+                self._held -= 1
+                self._portaudio.notify_all()
+
+    def refresh(self):
+        """Reinicializa o PortAudio, enumera de novo e avisa os ouvintes (espera os streams fecharem)"""
+        with self._portaudio:
+            self._portaudio.wait_for(lambda: not self._held and not self._refreshing)
+            self._refreshing = True
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Chamado com _refreshing marcado: hold() espera até o PortAudio voltar. Os
+        ouvintes são avisados depois, e podem abrir streams de novo em on_change
+        """
+        try:
+            added, removed = self._reset()
+        finally:
+            with self._portaudio:
+                self._refreshing = False
+                self._portaudio.notify_all()
+
+        for listener in list(self._listeners):
+            listener["on_change"](added, removed)
+
+    def _reset(self):
+        with self._lock:
+            antes = {d["key"]: d for d in self._devices}
+
+        # Streams abertos precisam fechar antes de reinicializar o PortAudio
+        for listener in list(self._listeners):
+            if listener["before_reset"] is not None:
+                listener["before_reset"]()
+
+        _reiniciar_portaudio()
+        self._stale = False
+        devices = self._enumerate()
+        self._warned.clear()
+
+        depois = {d["key"]: d for d in devices}
+        added = [depois[k] for k in depois if k not in antes]
+        removed = [antes[k] for k in antes if k not in depois]
+        self.stats["changes"] += 1
+
+        for device in added:
+            print(f"🔌 Dispositivo conectado: {device['name']} ({device['hostapi']})")
+        for device in removed:
+            print(f"🔌 Dispositivo removido: {device['name']} ({device['hostapi']})")
+        return added, removed
+
+    def add_listener(self, on_change, before_reset=None):
+        """
+        Registra quem usa dispositivos
+
+        Args:
+            on_change: Chamado com (adicionados, removidos) depois de cada mudança
+            before_reset: Chamado antes de reinicializar o PortAudio (fechar streams)
+        """
+        self._listeners.append({"on_change": on_change, "before_reset": before_reset})
+
+    def devices(self, kind=None, timeout=10.0):
+        """
+        Dispositivos em cache (espera a primeira enumeração se preciso)
+
+        Na inicialização, prefira when_ready para não esperar.
+
+        Args:
+            kind: SAIDA, ENTRADA ou None para todos
+            timeout: Espera máxima pela primeira enumeração (0 = devolve o que houver)
+        """
+        self.start()
+        self._ready.wait(timeout)
+        with self._lock:
+            devices = list(self._devices)
+        if kind == SAIDA:
+            return [d for d in devices if d["outputs"] > 0]
+        if kind == ENTRADA:
+            return [d for d in devices if d["inputs"] > 0]
+        return devices
+
+    def outputs(self):
+        return self.devices(SAIDA)
+
+    def inputs(self):
+        return self.devices(ENTRADA)
+
+    def by_index(self, index):
+        for device in self.devices():
+            if device["index"] == index:
+                return device
+        return None
+
+    def default_index(self, kind):
+        """Índice do dispositivo padrão do sistema (None se não houver)"""
+        try:
+            default = sd.default.device[1 if kind == SAIDA else 0]
+        except Exception:
+            return None
+        return default if default is not None and default >= 0 else None
+
+    def resolve(self, key=None, index=None, kind=SAIDA):
+        """
+        Índice atual de um dispositivo salvo na configuração
+
+        Procura pela chave (nome + host API), depois só pelo nome; se a
+        configuração antiga só tem o índice, confere se ele ainda existe.
+
+        Returns:
+            int ou None (None = dispositivo padrão do sistema)
+        """
+        devices = self.devices(kind)
+        if key:
+            for device in devices:
+                if device["key"] == key:
+                    return device["index"]
+            nome = key.split("|", 1)[0]
+            for device in devices:
+                if device["name"] == nome:
+                    return device["index"]
+            if key not in self._warned:
+                self._warned.add(key)
+                print(f"⚠️  Dispositivo '{nome}' não encontrado, usando o padrão do sistema")
+            return None
+        if index is not None and any(d["index"] == index for d in devices):
+            return index
+        return None
+
+    def key_of(self, index):
+        """Chave estável do índice atual (para salvar na configuração)"""
+        device = self.by_index(index) if index is not None else None
+        return device["key"] if device else None
+
+    def stop(self):
+        self._running = False
+
+
+# Instância global: começa a enumerar no primeiro uso
+_registry = None
+
+
+def get_registry():
+    """Obtém ou cria o registro de dispositivos (singleton, já iniciado)"""
+    global _registry
+    if _registry is None:
+        _registry = MiraiDeviceRegistry().start()
+    return _registry
+
+
+# Teste direto
+if __name__ == "__main__":
+    print("🎧 Registro de dispositivos de áudio")
+    print("="*50)
+
+    start = time.perf_counter()
+    registry = MiraiDeviceRegistry(poll_interval=2.0).start()
+    print(f"⏱️  start() voltou em {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    devices = registry.devices()
+    print(f"⏱️  Enumeração: {registry.stats['enumerate_ms']:.1f} ms, {len(devices)} dispositivos")
+    for device in devices:
+        tipos = ("🎤" if device["inputs"] else "") + ("🔊" if device["outputs"] else "")
+        print(f"  [{device['index']}] {tipos} {device['key']}")
+
+    start = time.perf_counter()
+    registry.check()
+    print(f"⏱️  Verificação de mudança: {(time.perf_counter() - start) * 1e6:.0f} µs")
+
+    print("\n🔌 Plugue ou remova um dispositivo (Ctrl+C para sair)...")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
@@ -1,29 +1,50 @@
-import torch
 import numpy as np
 import sounddevice as sd
 import threading
+import queue
 import time
-from TTS.api import TTS
 import sys
 import os
+import contextlib
+from audio_utils import para_float32, timed_blocks, normalizar_loudness, ALVO_LUFS
+from dispositivos import get_registry, SAIDA
+from metricas import metrics, observe_stage, stage_timer
 
 class MiraiTTS:
-    def __init__(self, model_name="tts_models/pt/cv/vits"):
+    def __init__(self, model_name="tts_models/pt/cv/vits", backend="torch", onnx_dir="models/onnx",
+                 onnx_int8=False):
         """
         Inicializa o Coqui TTS com seleção de dispositivo de áudio
+        
+        Args:
+            backend: "torch" (Coqui TTS) ou "onnx" (onnxruntime, ver tts_onnx.py)
+            onnx_dir: Pasta com o modelo exportado
+            onnx_int8: Usa o modelo ONNX quantizado
         """
         print("🔊 Inicializando sistema de fala...")
         
-        # Configura dispositivo de computação
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"📱 Dispositivo de computação: {self.device}")
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.onnx_int8 = onnx_int8
+        
+        # Configura dispositivo de computação (torch só é importado se for usado)
+        if backend == "onnx":
+            self.device = "cpu"
+        else:
+            import torch
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"📱 Dispositivo de computação: {self.device} ({backend})")
         
         # Atributo sample_rate (CRÍTICO - estava faltando)
         self.sample_rate = 22050  # Taxa de amostragem padrão para maioria dos modelos TTS
         
-        # Lista dispositivos de áudio disponíveis
-        self.audio_devices = self.list_audio_devices()
+        # Lista dispositivos de áudio disponíveis (registro em cache, ver dispositivos.py)
+        self.registry = get_registry()
+        self.audio_devices = []
+        self.registry.when_ready(self._update_devices)  # Não espera a enumeração
         self.selected_device = None
+        self.selected_device_key = None
+        self.registry.add_listener(self._on_devices_changed, before_reset=self._close_output)
         
         # Configurações de voz
         self.volume = 1.0
@@ -33,10 +54,42 @@ class MiraiTTS:
         self.model_name = model_name
         self.tts = None
         self.load_tts_model()
+        
+        # Pool de processos para síntese (opcional, ver enable_worker_pool)
+        self.synth_pool = None
+        
+        # Motor de visemas do avatar (opcional, ver attach_viseme_engine)
+        self.viseme_engine = None
+        
+        # Síntese em blocos: a reprodução começa antes da frase terminar
+        self.streaming = False
+        self.last_stream_stats = None
+        
+        # Stream de saída aberto uma vez na taxa nativa do dispositivo (ver get_output)
+        self.output = None
+        self.recorder = None  # Gravação de sessão (hash do áudio sintetizado, ver sessao.py)
+        
+        # Vozes de outros idiomas pré-carregadas (ver load_voices); cada trecho da frase
+        # vai para a voz do seu idioma
+        self.language = "pt"
+        self.voices = {}
+        self.language_id = None
+        
+        # Modo de pouca memória: o modelo sai da memória quando ocioso (ver attach_lifecycle)
+        self.lifecycle = None
+        self._weights = None
+        
+        metrics.gauge("mirai_audio_queue_depth", "Blocos aguardando no buffer de saída",
+                      fn=lambda: self.output._queue.qsize() if self.output is not None else 0)
     
     def load_tts_model(self):
         """Carrega o modelo TTS com tratamento de erro"""
+        self._weights = None  # Cache de pesos é do modelo anterior
+        if self.backend == "onnx" and self.load_onnx_model():
+            return
+        
         try:
+            from TTS.api import TTS
             print(f"🔄 Carregando modelo: {self.model_name}")
             self.tts = TTS(model_name=self.model_name, progress_bar=False).to(self.device)
             print(f"✅ TTS carregado: {self.model_name}")
@@ -59,8 +112,198 @@ class MiraiTTS:
             print("🔧 Tentando modelo alternativo...")
             self.try_alternative_models()
     
+    def load_onnx_model(self):
+        """
+        Carrega a voz exportada para ONNX
+        
+        Returns:
+            bool: True se carregou; False cai para o backend torch
+        """
+        try:
+            from tts_onnx import MiraiOnnxVoice
+            print(f"🔄 Carregando modelo ONNX de {self.onnx_dir}{' (int8)' if self.onnx_int8 else ''}")
+            self.tts = MiraiOnnxVoice(self.onnx_dir, quantized=self.onnx_int8)
+            self.sample_rate = self.tts.sample_rate
+            print(f"✅ TTS ONNX carregado ({self.tts.frontend['model_name']})")
+            print(f"📊 Sample rate: {self.sample_rate} Hz")
+            return True
+        except Exception as e:
+            print(f"⚠️  Erro ao carregar modelo ONNX: {e}")
+            print("🔧 Usando backend torch...")
+            self.backend = "torch"
+            import torch
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            return False
+    
+    def load_voices(self, models, background=True):
+        """
+        Ativa o roteamento por idioma e pré-carrega as vozes dos outros idiomas
+        
+        As vozes carregam fora do turno: enquanto uma não está pronta, os trechos
+        do idioma dela ficam com a voz principal (nunca há carga de modelo no meio
+        de uma fala). Idiomas que o modelo principal multilíngue já fala não
+        precisam de voz própria.
+        
+        Args:
+            models: {"en": "tts_models/en/ljspeech/vits", "ja": "tts_models/ja/kokoro/tacotron2-DDC"}
+            background: Carrega em segundo plano (a inicialização não espera)
+        """
+        from idiomas import MiraiLanguageId, IDIOMAS
+        
+        self.language_id = MiraiLanguageId(principal=self.language)
+        proprias = self._multilingual_languages()
+        pending = {}
+        for language, model in models.items():
+            if language not in IDIOMAS:
+                print(f"⚠️  Idioma '{language}' não é reconhecido pelo identificador ({', '.join(IDIOMAS)})")
+            elif language != self.language and language not in proprias and model:
+                pending[language] = model
+        
+        if background:
+            threading.Thread(target=self._load_voices, args=(pending,), daemon=True).start()
+        else:
+            self._load_voices(pending)
+    
+    def _load_voices(self, models):
+        from TTS.api import TTS
+        
+        for language, model in models.items():
+            try:
+                start = time.perf_counter()
+                voice = TTS(model_name=model, progress_bar=False).to(self.device)
+                synthesizer = getattr(voice, 'synthesizer', None)
+                sample_rate = getattr(synthesizer, 'output_sample_rate', None) or self.sample_rate
+                self.voices[language] = (voice, sample_rate)
+                print(f"✅ Voz '{language}' carregada em {time.perf_counter() - start:.1f}s: {model} ({sample_rate} Hz)")
+            except Exception as e:
+                print(f"⚠️  Erro ao carregar voz '{language}' ({model}): {e}")
+    
+    def _multilingual_languages(self):
+        """Idiomas que o próprio modelo principal fala (XTTS e outros multilíngues)"""
+        if self.tts is None or not (hasattr(self.tts, 'language') or getattr(self.tts, 'is_multi_lingual', False)):
+            return ()
+        return tuple(getattr(self.tts, 'languages', None) or ())
+    
+    def languages(self):
+        """Idiomas com voz pronta (só o principal se o roteamento estiver desligado)"""
+        if self.language_id is None:
+            return (self.language,)
+        return (self.language,) + tuple(self.voices) + self._multilingual_languages()
+    
+    @property
+    def lexicon(self):
+        """Léxico do normalizador: com voz japonesa, o japonês fica na grafia original"""
+        from normalizar import lexico_para
+        return lexico_para(self.languages())
+    
+    def route(self, text):
+        """
+        Divide a frase em trechos por voz
+        
+        Returns:
+            list: [(idioma, trecho)]; idiomas sem voz pronta ficam com a voz principal
+        """
+        if self.language_id is None:
+            return [(self.language, text)]
+        from idiomas import unir_trechos
+        
+        available = self.languages()
+        spans = [(language if language in available else self.language, span)
+                 for language, span in self.language_id.segment(text)]
+        return unir_trechos(spans) or [(self.language, text)]
+    
+    def _synthesize_span(self, language, text, speaker=None):
+        """Sintetiza um trecho na voz do idioma (a principal se não houver outra)"""
+        if language == "ja":
+            from idiomas import romaji_em_kana
+            text = romaji_em_kana(text)  # Vozes japonesas esperam kana, não romaji
+        
+        voice = self.voices.get(language)
+        if voice is None:
+            return self._generate_speech(text, speaker, language)
+        
+        model, sample_rate = voice
+        print(f"🗣️  Sintetizando [{language}]: '{text[:60]}'")
+        try:
+            with stage_timer("tts"):
+                wav = model.tts(text=text)
+            return para_float32(wav), sample_rate
+        except Exception as e:
+            print(f"❌ Erro na voz '{language}': {e}")
+            return None, None
+    
+    def _generate_mixed(self, spans, speaker=None):
+        """Uma voz por trecho, costurados na taxa e na loudness da voz principal"""
+        from audio_utils import juntar_trechos
+        
+        pieces = []
+        for language, span in spans:
+            wav, sample_rate = self._synthesize_span(language, span, speaker)
+            if wav is not None and len(wav):
+                pieces.append((wav, sample_rate, language == self.language))
+        if not pieces:
+            return None, None
+        return juntar_trechos(pieces, self.sample_rate), self.sample_rate
+    
+    def attach_lifecycle(self, lifecycle, ttl=None):
+        """
+        Registra a voz no gerenciador de ciclo de vida (modelos.py)
+        
+        Torch: os pesos vão para um arquivo safetensors em cache e voltam mapeados
+        em memória. ONNX: a sessão é fechada e aberta de novo.
+        """
+        self.lifecycle = lifecycle
+        lifecycle.register("tts", self._reload_model, self._unload_model, ttl)
+    
+    def _torch_modules(self):
+        synthesizer = getattr(self.tts, 'synthesizer', None)
+        if synthesizer is None:
+            return None
+        modules = {"tts": synthesizer.tts_model}
+        if getattr(synthesizer, 'vocoder_model', None) is not None:
+            modules["vocoder"] = synthesizer.vocoder_model
+        return modules
+    
+    def _unload_model(self):
+        if self._weights is None:
+            modules = self._torch_modules()
+            if modules is None:
+                self.tts = None  # ONNX: reabre a sessão na próxima fala
+                return
+            from modelos import MiraiOffloadedWeights, arquivo_cache
+            synthesizer = self.tts.synthesizer
+            sources = (getattr(synthesizer, 'tts_checkpoint', None),
+                       getattr(synthesizer, 'vocoder_checkpoint', None))
+            self._weights = MiraiOffloadedWeights(modules, arquivo_cache(self.model_name, sources))
+        self._weights.unload()
+    
+    def _reload_model(self):
+        if self._weights is not None:
+            try:
+                self._weights.load(self.device)
+                return
+            except ValueError as e:
+                # Cache corrompido ou de outro checkpoint: recarrega o modelo inteiro
+                print(f"⚠️  {e}")
+        self.load_tts_model()
+    
+    def available(self):
+        """
+        Há como sintetizar (o modelo descarregado pelo ciclo de vida conta como disponível:
+        model_in_use recarrega antes da síntese)
+        """
+        return self.tts is not None or self.synth_pool is not None or self.lifecycle is not None
+    
+    def model_in_use(self):
+        """Contexto que mantém o modelo carregado (recarrega se o ciclo de vida o tirou)"""
+        if self.lifecycle is None:
+            return contextlib.nullcontext()
+        return self.lifecycle.use("tts")
+    
     def try_alternative_models(self):
         """Tenta carregar modelos alternativos"""
+        from TTS.api import TTS
+        
         alternative_models = [
             "tts_models/multilingual/multi-dataset/your_tts",
             "tts_models/multilingual/multi-dataset/xtts_v2",
@@ -87,27 +330,71 @@ class MiraiTTS:
         """Lista todos os dispositivos de áudio de saída disponíveis"""
         devices = []
         try:
-            all_devices = sd.query_devices()
-            for i, device in enumerate(all_devices):
-                if device['max_output_channels'] > 0:
-                    devices.append({
-                        'id': i,
-                        'name': device['name'],
-                        'channels': device['max_output_channels'],
-                        'default': device['name'] == sd.default.device[1] if isinstance(sd.default.device, tuple) else i == sd.default.device,
-                        'sample_rate': device['default_samplerate']
-                    })
+            default = self.registry.default_index(SAIDA)
+            for device in self.registry.outputs():
+                devices.append({
+                    'id': device['index'],
+                    'name': device['name'],
+                    'key': device['key'],
+                    'channels': device['outputs'],
+                    'default': device['index'] == default,
+                    'sample_rate': device['sample_rate']
+                })
         except Exception as e:
             print(f"⚠️  Erro ao listar dispositivos: {e}")
         
         return devices
     
+    def _update_devices(self):
+        self.audio_devices = self.list_audio_devices()
+    
+    def _close_output(self):
+        """Fecha o stream de saída (antes do PortAudio ser reinicializado)"""
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+    
+    def _on_devices_changed(self, added, removed):
+        """Hot-plug: atualiza a lista e remapeia (ou troca) o dispositivo selecionado"""
+        self.audio_devices = self.list_audio_devices()
+        if self.selected_device_key is None:
+            return
+        
+        index = self.registry.resolve(self.selected_device_key, kind=SAIDA)
+        if index is None:
+            print("🔀 Dispositivo de saída removido, usando o padrão do sistema")
+            self.selected_device_key = None
+        self.selected_device = index
+        sd.default.device = (sd.default.device[0], index) if index is not None else None
+    
+    def _set_device(self, device_id):
+        """Seleciona pelo índice atual e guarda a chave estável"""
+        self.selected_device = device_id
+        self.selected_device_key = self.registry.key_of(device_id)
+        sd.default.device = device_id
+    
+    def select_device_by_key(self, key, index=None):
+        """
+        Seleciona o dispositivo salvo na configuração (chave estável ou índice antigo)
+        
+        Returns:
+            bool: True se encontrou o dispositivo
+        """
+        device_id = self.registry.resolve(key, index, kind=SAIDA)
+        if device_id is None:
+            return False
+        self._set_device(device_id)
+        print(f"✅ Dispositivo selecionado: {self.selected_device_key}")
+        return True
+    
     def show_audio_devices_menu(self):
         """Mostra menu para selecionar dispositivo de áudio"""
         print("\n" + "="*50)
         print("🎧 DISPOSITIVOS DE ÁUDIO DISPONÍVEIS")
         print("="*50)
         
+        if not self.audio_devices:
+            self.audio_devices = self.list_audio_devices()  # Menu interativo: pode esperar a enumeração
         if not self.audio_devices:
             print("❌ Nenhum dispositivo de saída encontrado!")
             return None
@@ -141,6 +428,7 @@ class MiraiTTS:
                 
                 if choice == 'P':
                     self.selected_device = None
+                    self.selected_device_key = None
                     sd.default.device = None
                     print("✅ Usando dispositivo padrão do sistema")
                     return True
@@ -150,6 +438,7 @@ class MiraiTTS:
                     continue
                 
                 elif choice == 'L':
+                    self.registry.check()
                     self.audio_devices = self.list_audio_devices()
                     self.show_audio_devices_menu()
                     continue
@@ -160,10 +449,10 @@ class MiraiTTS:
                 
                 elif choice.isdigit():
                     device_id = int(choice)
-                    if any(d['id'] == device_id for d in self.audio_devices):
-                        self.selected_device = device_id
-                        sd.default.device = device_id
-                        print(f"✅ Dispositivo selecionado: {self.audio_devices[device_id]['name']}")
+                    device = next((d for d in self.audio_devices if d['id'] == device_id), None)
+                    if device is not None:
+                        self._set_device(device_id)
+                        print(f"✅ Dispositivo selecionado: {device['name']}")
                         return True
                     else:
                         print("❌ ID inválido")
@@ -173,8 +462,7 @@ class MiraiTTS:
         else:
             # Seleção direta por ID
             if any(d['id'] == device_id for d in self.audio_devices):
-                self.selected_device = device_id
-                sd.default.device = device_id
+                self._set_device(device_id)
                 print(f"✅ Dispositivo selecionado: ID {device_id}")
                 return True
             else:
@@ -222,12 +510,52 @@ class MiraiTTS:
             print("⚠️  Texto vazio para síntese")
             return None, None
         
+        seed = self._next_seed()
+        with self.model_in_use():
+            spans = self.route(text)
+            if len(spans) == 1 and spans[0][0] == self.language:
+                wav, sr = self._generate_speech(text, speaker, seed=seed)
+            else:
+                if seed is not None and self.synth_pool is None:
+                    semear(seed)
+                if len(spans) > 1:
+                    wav, sr = self._generate_mixed(spans, speaker)
+                else:
+                    wav, sr = self._synthesize_span(spans[0][0], text, speaker)
+        if wav is None and seed is not None:
+            self.recorder.drop_seed(seed)
+        return wav, sr
+    
+    def _decoder_lock(self):
+        """
+        Trava do decoder do VITS
+        
+        O streaming (sintese_stream.vits_latent) troca o decoder do modelo compartilhado
+        por um instante; uma síntese comum nesse meio tempo sairia com o decoder falso.
+        """
+        model = getattr(getattr(self.tts, 'synthesizer', None), 'tts_model', None)
+        if type(model).__name__ != "Vits":
+            return contextlib.nullcontext()
+        import sintese_stream
+        return sintese_stream.decoder_lock
+    
+    def _next_seed(self):
+        """Semente da próxima fala quando a sessão está sendo gravada (replay reprodutível)"""
+        if self.recorder is None:
+            return None
+        return self.recorder.next_seed()
+    
+    def _generate_speech(self, text, speaker=None, language=None, seed=None):
         if self.tts is None:
             print("❌ TTS não inicializado")
             return None, None
         
         print(f"🗣️  Sintetizando: '{text[:60]}...'")
         
+        # Delega para o pool de workers se estiver ativo
+        if self.synth_pool is not None:
+            return self.synth_pool.synthesize(text, language=language, seed=seed)
+        
         try:
             # Parâmetros para síntese
             kwargs = {"text": text}
@@ -241,33 +569,20 @@ class MiraiTTS:
             
             # Adiciona language se o modelo suportar
             if hasattr(self.tts, 'language'):
-                kwargs["language"] = "pt"
+                kwargs["language"] = language or self.language
             
             print(f"⚙️  Parâmetros: {kwargs}")
             
             # Gera áudio
-            wav = self.tts.tts(**kwargs)
-            
-            # Converte para numpy array se necessário
-            if isinstance(wav, list):
-                wav = np.array(wav)
+            with stage_timer("tts"), self._decoder_lock():
+                if seed is not None:
+                    semear(seed)
+                wav = self.tts.tts(**kwargs)
             
-            # Verifica o tipo de dados
+            # Converte para float32
+            wav = para_float32(wav)
             print(f"📊 Tipo de áudio: {wav.dtype}, Forma: {wav.shape}")
             
-            # Converte para float32 se necessário
-            if wav.dtype == np.int16:
-                wav = wav.astype(np.float32) / 32767.0
-            elif wav.dtype == np.int32:
-                wav = wav.astype(np.float32) / 2147483647.0
-            elif wav.dtype != np.float32:
-                wav = wav.astype(np.float32)
-            
-            # Normaliza se necessário
-            max_val = np.max(np.abs(wav))
-            if max_val > 1.0:
-                wav = wav / max_val
-            
             duration = len(wav) / self.sample_rate
             print(f"✅ Áudio gerado: {duration:.2f}s, {len(wav)} amostras")
             
@@ -279,21 +594,110 @@ class MiraiTTS:
             traceback.print_exc()
             return None, None
     
-    def play_audio(self, wav, sample_rate, blocking=True):
-        """Reproduz áudio no dispositivo selecionado"""
+    def generate_speech_stream(self, text, speaker=None):
+        """
+        Gera áudio em blocos enquanto sintetiza
+        
+        VITS decodifica em janelas do latente e XTTS usa o streaming nativo;
+        outros backends (pool, ONNX, demais modelos) entregam a frase em um bloco só.
+        
+        Returns:
+            tuple: (iterador de blocos float32, sample_rate)
+        """
+        self.last_stream_stats = {}
+        return timed_blocks(self._stream_blocks(text, speaker), self.last_stream_stats), self.sample_rate
+    
+    def _stream_blocks(self, text, speaker=None):
+        # O modelo só é consultado dentro do contexto: no modo de pouca memória ele pode
+        # ter sido descarregado (ONNX fica com self.tts = None até recarregar)
+        with self.model_in_use():
+            synthesizer = getattr(self.tts, 'synthesizer', None)
+            model = getattr(synthesizer, 'tts_model', None)
+            kind = type(model).__name__ if model is not None else None
+            
+            # Frases com mais de uma voz são sintetizadas inteiras e costuradas (ver generate_speech)
+            spans = self.route(text)
+            single_voice = len(spans) == 1 and spans[0][0] == self.language
+            
+            if self.synth_pool is None and kind in ("Vits", "Xtts") and single_voice:
+                import sintese_stream
+                seed = self._next_seed()
+                if kind == "Vits":
+                    yield from sintese_stream.stream_vits(model, text, seed=seed)
+                else:
+                    yield from sintese_stream.stream_xtts(model, text, language=self.language,
+                                                          speaker=speaker, seed=seed)
+            else:
+                wav, _ = self.generate_speech(text, speaker)
+                if wav is not None:
+                    yield wav
+    
+    def enable_worker_pool(self, workers=None):
+        """
+        Ativa síntese em processos separados (um modelo por worker)
+        
+        Args:
+            workers: Número de processos (None = núcleos físicos, 0 = desativa)
+        """
+        if self.synth_pool is not None:
+            self.synth_pool.shutdown()
+            self.synth_pool = None
+        
+        if workers == 0:
+            print("⚙️  Pool de síntese desativado")
+            return
+        
+        from sintese_pool import MiraiSynthesisPool
+        self.synth_pool = MiraiSynthesisPool(model_name=self.model_name, workers=workers)
+    
+    def get_output(self):
+        """
+        Stream de saída persistente do dispositivo selecionado
+        
+        Aberto uma vez na taxa e formato nativos do dispositivo (ver saida_audio.py);
+        reaberto só quando o dispositivo muda.
+        """
+        if self.output is not None and self.output.device != self.selected_device:
+            self.output.close()
+            self.output = None
+        
+        if self.output is None:
+            from saida_audio import MiraiAudioOutput
+            try:
+                self.output = MiraiAudioOutput(self.selected_device)
+            except Exception as e:
+                self.registry.report_error(e)
+                raise
+            self.output.set_volume(self.volume)
+            self.output.attach_viseme_engine(self.viseme_engine)
+        
+        return self.output
+    
+    @property
+    def underruns(self):
+        """Blocos de silêncio tocados no meio de uma fala"""
+        return self.output.underruns if self.output is not None else 0
+    
+    def play_audio(self, wav, sample_rate, blocking=True, on_start=None):
+        """
+        Reproduz áudio no dispositivo selecionado
+        
+        Args:
+            on_start: Callback chamado com os segundos até o primeiro sample sair no alto-falante
+        """
         try:
             print(f"▶️  Reproduzindo no dispositivo {self.selected_device or 'padrão'}...")
             print(f"📊 Taxa: {sample_rate} Hz, Duração: {len(wav)/sample_rate:.2f}s")
             
-            # Reproduz no dispositivo selecionado
-            if self.selected_device is not None:
-                sd.play(wav, sample_rate, device=self.selected_device)
-            else:
-                sd.play(wav, sample_rate)
-            
             if blocking:
-                sd.wait()
+                self.play_blocks([wav], sample_rate, on_start)
                 print("✅ Fala concluída")
+            else:
+                threading.Thread(
+                    target=self.play_blocks,
+                    args=([wav], sample_rate, on_start),
+                    daemon=True
+                ).start()
             
         except Exception as e:
             print(f"❌ Erro na reprodução: {e}")
@@ -301,6 +705,38 @@ class MiraiTTS:
             import traceback
             traceback.print_exc()
     
+    def play_blocks(self, blocks, sample_rate, on_start=None):
+        """
+        Reproduz blocos de áudio à medida que chegam, pelo stream persistente
+        
+        Os blocos são reamostrados para a taxa do dispositivo antes de tocar.
+        Cada bloco escrito no buffer de saída também vai para o motor de visemas.
+        Se o próximo bloco ainda não chegou, o callback toca silêncio (underrun)
+        em vez de travar o stream.
+        
+        Args:
+            blocks: Iterável de blocos float32 (pode ser um gerador de síntese)
+            sample_rate: Taxa dos blocos
+            on_start: Callback com os segundos até o primeiro sample sair no alto-falante
+        """
+        if self.recorder is not None:
+            blocks = self.recorder.tts_blocks(blocks, sample_rate)
+        self.get_output().play(blocks, sample_rate, on_start)
+    
+    def attach_viseme_engine(self, engine):
+        """
+        Conecta um motor de visemas (avatar.MiraiVisemeEngine)
+        
+        Args:
+            engine: Motor de visemas ou None para desconectar
+        """
+        if self.viseme_engine is not None and engine is not self.viseme_engine:
+            self.viseme_engine.stop()
+        self.viseme_engine = engine
+        if self.output is not None:
+            self.output.attach_viseme_engine(engine)
+        print(f"🎭 Visemas do avatar {'ativados' if engine else 'desativados'}")
+    
     def speak(self, text, speaker=None, blocking=True):
         """
         Sintetiza e fala o texto
@@ -310,7 +746,7 @@ class MiraiTTS:
             speaker: Falante específico
             blocking: Se True, espera terminar de falar
         """
-        if self.tts is None:
+        if not self.available():
             print("❌ TTS não disponível. Verifique se os modelos foram baixados.")
             print("💡 Tente: python -c 'from TTS.api import TTS; print(TTS().list_models())'")
             return None
@@ -325,10 +761,7 @@ class MiraiTTS:
         wav, sr = self.generate_speech(text, speaker)
         
         if wav is not None and sr is not None:
-            # Ajusta volume
-            wav = wav * self.volume
-            
-            # Reproduz
+            # Volume e loudness são aplicados no stream de saída
             if blocking:
                 self.play_audio(wav, sr, blocking=True)
             else:
@@ -345,6 +778,85 @@ class MiraiTTS:
         
         return None
     
+    def speak_sentences(self, sentences, speaker=None, on_start=None):
+        """
+        Fala frase a frase: a próxima frase é sintetizada enquanto a atual toca
+        
+        Args:
+            sentences: Iterável de frases (pode ser alimentado durante o stream do LLM)
+            speaker: Falante específico
+            on_start: Callback (índice da frase, segundos até o áudio sair) no início de cada frase
+        """
+        if not self.available():
+            print("❌ TTS não disponível. Verifique se os modelos foram baixados.")
+            return
+        
+        if self.streaming:
+            self._speak_sentences_streaming(sentences, speaker, on_start)
+            return
+        
+        prontos = queue.Queue(maxsize=2)
+        
+        def _sintetizar():
+            try:
+                for index, frase in enumerate(sentences):
+                    wav, sr = self.generate_speech(frase, speaker)
+                    if wav is not None:
+                        prontos.put((index, wav, sr))
+            finally:
+                prontos.put(None)
+        
+        threading.Thread(target=_sintetizar, daemon=True).start()
+        
+        for index, wav, sr in iter(prontos.get, None):
+            start_callback = None
+            if on_start is not None:
+                start_callback = lambda offset, index=index: on_start(index, offset)
+            self.play_audio(wav, sr, blocking=True, on_start=start_callback)
+    
+    def _speak_sentences_streaming(self, sentences, speaker=None, on_start=None):
+        """
+        Cada frase começa a tocar assim que o primeiro bloco fica pronto
+        
+        Os blocos são gerados numa thread à parte: terminada uma frase, a síntese
+        da próxima começa enquanto a atual ainda toca (como em speak_sentences).
+        """
+        prontos = queue.Queue(maxsize=2)
+        
+        def _sintetizar():
+            try:
+                for index, frase in enumerate(sentences):
+                    print(f"🗣️  Sintetizando em blocos: '{frase[:60]}...'")
+                    blocks, sr = self.generate_speech_stream(frase, speaker)
+                    stats = self.last_stream_stats
+                    saida = queue.Queue()
+                    prontos.put((index, saida, sr, stats))
+                    try:
+                        for block in blocks:
+                            saida.put(block)
+                    except Exception as e:
+                        print(f"❌ Erro ao gerar blocos de áudio: {e}")
+                    finally:
+                        saida.put(None)
+            finally:
+                prontos.put(None)
+        
+        threading.Thread(target=_sintetizar, daemon=True).start()
+        
+        for index, saida, sr, stats in iter(prontos.get, None):
+            start_callback = None
+            if on_start is not None:
+                start_callback = lambda offset, index=index: on_start(index, offset)
+            
+            self.play_blocks(_ate_o_fim(saida), sr, on_start=start_callback)
+            
+            if stats and stats.get("first_block_ms") is not None:
+                observe_stage("tts_first_block", stats["first_block_ms"] / 1000)
+                duration = stats["audio_samples"] / sr
+                print(f"⚡ Primeiro bloco em {stats['first_block_ms']:.0f} ms, "
+                      f"frase completa em {stats['total_ms']:.0f} ms "
+                      f"({duration:.2f}s de áudio, {stats['blocks']} blocos)")
+    
     def set_voice_settings(self, volume=1.0, rate=1.0):
         """
         Ajusta configurações de voz
@@ -354,6 +866,8 @@ class MiraiTTS:
             rate: Velocidade (0.5 a 2.0)
         """
         self.volume = max(0.0, min(2.0, volume))
+        if self.output is not None:
+            self.output.set_volume(self.volume)
         self.speech_rate = max(0.5, min(2.0, rate))
         print(f"⚙️  Configurações: volume={volume}, velocidade={rate}")
     
@@ -412,6 +926,7 @@ class MiraiTTS:
         """Lista modelos TTS disponíveis"""
         print("\n📋 Modelos disponíveis:")
         try:
+            from TTS.api import TTS
             models = TTS().list_models()
             pt_models = [m for m in models if 'pt' in m.lower()]
             multilingual = [m for m in models if 'multilingual' in m.lower()]
@@ -439,6 +954,7 @@ class MiraiTTS:
         if new_model:
             try:
                 self.model_name = new_model
+                self.backend = "torch"  # O modelo ONNX exportado é de um modelo só
                 self.load_tts_model()
             except Exception as e:
                 print(f"❌ Erro ao carregar modelo: {e}")
@@ -446,13 +962,26 @@ class MiraiTTS:
 # Instância global com inicialização preguiçosa
 _tts_engine = None
 
-def get_tts_engine():
+def get_tts_engine(**kwargs):
     """Obtém ou cria instância do TTS (singleton)"""
     global _tts_engine
     if _tts_engine is None:
-        _tts_engine = MiraiTTS()
+        _tts_engine = MiraiTTS(**kwargs)
     return _tts_engine
 
+def _ate_o_fim(fila):
+    """Blocos de uma fila até o None que marca o fim da frase"""
+    while True:
+        block = fila.get()
+        if block is None:
+            return
+        yield block
+
+def semear(seed):
+    """Fixa a semente do torch (o VITS sorteia ruído a cada síntese)"""
+    if "torch" in sys.modules:
+        sys.modules["torch"].manual_seed(seed)
+
 def falar(texto, **kwargs):
     """Função de conveniência"""
     try:
@@ -462,8 +991,210 @@ def falar(texto, **kwargs):
         print(f"❌ Erro na função falar: {e}")
         return None
 
+# ----------------------------------------------------------------------
+# Renderização em lote (falas pré-gravadas para lives)
+# ----------------------------------------------------------------------
+
+FORMATOS_LOTE = ("wav", "flac")
+
+
+def ler_roteiro(path):
+    """
+    Lê um roteiro de falas
+    
+    Formatos:
+        .txt: uma fala por linha (linhas vazias e começando com # são ignoradas)
+        .csv: coluna 'texto' (ou 'text', ou a primeira) e 'nome' opcional
+        .jsonl: {"texto": ..., "nome": ...} por linha
+    
+    Returns:
+        list: [{"line", "text", "name"}]
+    """
+    import csv
+    import json
+    
+    entries = []
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames or []
+            text_field = next((c for c in ("texto", "text") if c in fields), fields[0] if fields else None)
+            name_field = next((c for c in ("nome", "name", "id") if c in fields), None)
+            for i, row in enumerate(reader, start=2):
+                text = (row.get(text_field) or "").strip()
+                if text:
+                    entries.append({"line": i, "text": text,
+                                    "name": (row.get(name_field) or "").strip() or None if name_field else None})
+        elif ext == ".jsonl":
+            for i, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                text = (item.get("texto") or item.get("text") or "").strip()
+                if text:
+                    entries.append({"line": i, "text": text, "name": item.get("nome") or item.get("name")})
+        else:
+            for i, line in enumerate(f, start=1):
+                text = line.strip()
+                if text and not text.startswith("#"):
+                    entries.append({"line": i, "text": text, "name": None})
+    return entries
+
+
+def chave_da_fala(text, model_name):
+    """Hash do texto + modelo: a mesma fala nunca é sintetizada duas vezes"""
+    import hashlib
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def gravar_audio(path, wav, sample_rate, fmt="wav"):
+    """Grava o áudio de forma atômica (arquivo temporário + rename)"""
+    tmp = path + ".tmp"
+    if fmt == "flac":
+        import soundfile as sf
+        sf.write(tmp, np.clip(wav, -1.0, 1.0), sample_rate, format="FLAC", subtype="PCM_16")
+    else:
+        import wave
+        pcm = (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2")
+        with wave.open(tmp, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(sample_rate)
+            f.writeframes(pcm.tobytes())
+    os.replace(tmp, path)
+
+
+def renderizar_lote(script, output_dir, model_name="tts_models/pt/cv/vits", workers=None, fmt="wav",
+                    normalize=True, target_lufs=ALVO_LUFS):
+    """
+    Sintetiza um roteiro inteiro em arquivos de áudio, sem tocar nada
+    
+    Falas repetidas são sintetizadas uma vez; falas já renderizadas (mesmo
+    hash) são puladas, então basta rodar de novo depois de uma queda.
+    
+    Args:
+        script: Caminho do roteiro (.txt, .csv ou .jsonl, ver ler_roteiro)
+        output_dir: Pasta dos áudios e do manifest.json
+        workers: Processos de síntese (padrão: núcleos físicos)
+        fmt: "wav" ou "flac" (flac precisa do soundfile)
+        normalize: Passa o texto pelo normalizador da fala (números, siglas...)
+        target_lufs: Loudness de cada arquivo (None mantém o nível do modelo; o
+            teto de pico vale sempre, a saída do TTS não vem normalizada)
+    
+    Returns:
+        dict: Estatísticas (rendered, skipped, audio_seconds, wall_seconds)
+    """
+    import json
+    from sintese_pool import MiraiSynthesisPool
+    
+    if fmt not in FORMATOS_LOTE:
+        raise ValueError(f"Formato '{fmt}' não suportado (use {', '.join(FORMATOS_LOTE)})")
+    if fmt == "flac":
+        try:
+            import soundfile  # noqa: F401
+        except ImportError:
+            raise RuntimeError("FLAC precisa do soundfile: pip install soundfile")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    entries = ler_roteiro(script)
+    if normalize:
+        from normalizar import normalizar_texto
+        for entry in entries:
+            entry["spoken"] = normalizar_texto(entry["text"])
+    
+    # Índice do que já foi renderizado (sobrevive a quedas: uma linha por arquivo pronto)
+    index_path = os.path.join(output_dir, "renderizados.jsonl")
+    done = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # Linha cortada pela queda
+                if os.path.exists(os.path.join(output_dir, item["file"])):
+                    done[item["key"]] = item
+    
+    pending = {}
+    for entry in entries:
+        spoken = entry.get("spoken", entry["text"])
+        entry["key"] = chave_da_fala(spoken, model_name)
+        if entry["key"] not in done:
+            pending.setdefault(entry["key"], spoken)
+    
+    print(f"🎬 Roteiro: {len(entries)} falas, {len(set(e['key'] for e in entries))} únicas, "
+          f"{len(pending)} para renderizar")
+    
+    stats = {"rendered": 0, "skipped": len(entries) - len(pending), "failed": 0,
+             "audio_seconds": 0.0, "wall_seconds": 0.0}
+    start = time.perf_counter()
+    
+    if pending:
+        pool = MiraiSynthesisPool(model_name=model_name, workers=workers)
+        keys = list(pending)
+        try:
+            with open(index_path, "a", encoding="utf-8") as index:
+                for key, (wav, sample_rate) in zip(keys, pool.synthesize_many(pending[k] for k in keys)):
+                    if wav is None:
+                        stats["failed"] += 1
+                        continue
+                    if target_lufs is not None:
+                        wav = normalizar_loudness(wav, sample_rate, target_lufs)
+                    else:
+                        wav = normalizar_loudness(wav, sample_rate, max_gain_db=0.0)
+                    file_name = f"{key}.{fmt}"
+                    gravar_audio(os.path.join(output_dir, file_name), wav, sample_rate, fmt)
+                    item = {"key": key, "file": file_name, "text": pending[key],
+                            "duration": len(wav) / sample_rate, "sample_rate": sample_rate}
+                    index.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    index.flush()
+                    done[key] = item
+                    stats["rendered"] += 1
+                    stats["audio_seconds"] += item["duration"]
+                    print(f"  ✅ [{stats['rendered']}/{len(keys)}] {file_name} ({item['duration']:.1f}s)")
+        finally:
+            pool.shutdown()
+    
+    stats["wall_seconds"] = time.perf_counter() - start
+    
+    # Manifesto: cada linha do roteiro aponta para o arquivo da sua fala
+    manifest = []
+    for entry in entries:
+        item = done.get(entry["key"])
+        manifest.append({
+            "line": entry["line"], "name": entry["name"], "text": entry["text"],
+            "file": item["file"] if item else None,
+            "duration": item["duration"] if item else None,
+        })
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "format": fmt, "items": manifest}, f, indent=2, ensure_ascii=False)
+    
+    if stats["wall_seconds"] > 0 and stats["audio_seconds"]:
+        print(f"⏱️  {stats['audio_seconds']:.1f}s de áudio em {stats['wall_seconds']:.1f}s "
+              f"({stats['audio_seconds'] / stats['wall_seconds']:.2f}s de áudio por segundo)")
+    print(f"📄 {stats['rendered']} renderizadas, {stats['skipped']} puladas, {stats['failed']} falhas "
+          f"-> {os.path.join(output_dir, 'manifest.json')}")
+    return stats
+
 # Teste direto
-if __name__ == "__main__":
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "lote":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Renderiza um roteiro de falas em arquivos de áudio")
+    parser.add_argument("lote")
+    parser.add_argument("roteiro", help=".txt, .csv ou .jsonl")
+    parser.add_argument("--saida", default="falas")
+    parser.add_argument("--modelo", default="tts_models/pt/cv/vits")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--formato", choices=FORMATOS_LOTE, default="wav")
+    parser.add_argument("--sem-normalizar", action="store_true")
+    args = parser.parse_args()
+    
+    renderizar_lote(args.roteiro, args.saida, model_name=args.modelo, workers=args.workers,
+                    fmt=args.formato, normalize=not args.sem_normalizar)
+
+elif __name__ == "__main__":
     print("🧪 Teste do sistema de fala MIRAI")
     print("="*50)
     
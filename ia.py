@@ -1,13 +1,356 @@
-import ollama
 import json
-import re
+import os
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from normalizar import limpar_marcacoes, FIM_DE_FRASE
+from cliente_ollama import build_pool
+from metricas import metrics, stage_timer
+
+# Classes de prioridade (menor número = mais urgente)
+PRIORIDADE_INTERATIVA = 0   # Turno do usuário esperando resposta
+PRIORIDADE_ESPECULATIVA = 1 # Pré-geração que pode ser descartada
+PRIORIDADE_BACKGROUND = 2   # Resumos, pré-aquecimento de cache etc.
+
+NOMES_PRIORIDADE = {
+    PRIORIDADE_INTERATIVA: "interativa",
+    PRIORIDADE_ESPECULATIVA: "especulativa",
+    PRIORIDADE_BACKGROUND: "background",
+}
+
+class JobDescartado(Exception):
+    """Job removido da fila (prazo vencido ou descarte sob carga)"""
+    pass
+
+class MiraiLLMScheduler:
+    def __init__(self, max_in_flight=None, speculative_limit=2):
+        """
+        Fila de chamadas ao Ollama com prioridade e prazo
+        
+        Args:
+            max_in_flight: Máximo de chamadas simultâneas (padrão: OLLAMA_NUM_PARALLEL)
+            speculative_limit: Profundidade de fila a partir da qual jobs
+                               especulativos são rebaixados ou descartados
+        """
+        if max_in_flight is None:
+            try:
+                max_in_flight = int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+            except ValueError:
+                max_in_flight = 1
+        self.max_in_flight = max(1, max_in_flight)
+        self.speculative_limit = speculative_limit
+        
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        
+        # Métricas
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "dropped": 0,
+            "downgraded": 0,
+            "wait_total": {p: 0.0 for p in NOMES_PRIORIDADE},
+            "wait_count": {p: 0 for p in NOMES_PRIORIDADE},
+            "wait_max": {p: 0.0 for p in NOMES_PRIORIDADE},
+        }
+        
+        # Workers fixos, um por vaga de execução
+        self._workers = []
+        for i in range(self.max_in_flight):
+            worker = threading.Thread(target=self._worker_loop, name=f"llm-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def submit(self, fn, *args, priority=PRIORIDADE_INTERATIVA, deadline=None, **kwargs):
+        """
+        Enfileira uma chamada ao LLM
+        
+        Args:
+            fn: Função a executar (ex: client.chat)
+            priority: Classe de prioridade
+            deadline: Segundos a partir de agora; jobs vencidos são descartados
+        
+        Returns:
+            Future com o resultado de fn
+        """
+        future = Future()
+        now = time.monotonic()
+        expires = now + deadline if deadline is not None else None
+        
+        with self._cond:
+            self.metrics["submitted"] += 1
+            
+            # Sob carga, especulativos não competem com turnos interativos
+            if priority == PRIORIDADE_ESPECULATIVA and self._busy():
+                if expires is not None:
+                    self.metrics["dropped"] += 1
+                    future.set_exception(JobDescartado("fila cheia para job especulativo"))
+                    return future
+                priority = PRIORIDADE_BACKGROUND
+                self.metrics["downgraded"] += 1
+            
+            # Ordenação: prioridade, prazo mais próximo, ordem de chegada
+            sort_deadline = expires if expires is not None else float("inf")
+            heapq.heappush(
+                self._heap,
+                (priority, sort_deadline, next(self._counter), now, expires, future, fn, args, kwargs)
+            )
+            self._cond.notify()
+        
+        return future
+    
+    def run(self, fn, *args, priority=PRIORIDADE_INTERATIVA, deadline=None, **kwargs):
+        """Enfileira e espera o resultado"""
+        return self.submit(fn, *args, priority=priority, deadline=deadline, **kwargs).result()
+    
+    def _busy(self):
+        """Fila acima do limite ou todas as vagas ocupadas com fila pendente"""
+        return len(self._heap) >= self.speculative_limit or (
+            self._in_flight >= self.max_in_flight and self._heap
+        )
+    
+    def _worker_loop(self):
+        """Retira jobs da fila respeitando o limite de execução simultânea"""
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                priority, _, _, queued_at, expires, future, fn, args, kwargs = heapq.heappop(self._heap)
+                
+                now = time.monotonic()
+                if expires is not None and now > expires:
+                    self.metrics["dropped"] += 1
+                    future.set_exception(JobDescartado("prazo vencido na fila"))
+                    continue
+                
+                if not future.set_running_or_notify_cancel():
+                    continue
+                
+                waited = now - queued_at
+                self.metrics["wait_total"][priority] += waited
+                self.metrics["wait_count"][priority] += 1
+                self.metrics["wait_max"][priority] = max(self.metrics["wait_max"][priority], waited)
+                self._in_flight += 1
+            
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self.metrics["completed"] += 1
+    
+    def queue_depth(self):
+        """Número de jobs aguardando, por classe de prioridade"""
+        with self._cond:
+            depth = {nome: 0 for nome in NOMES_PRIORIDADE.values()}
+            for item in self._heap:
+                depth[NOMES_PRIORIDADE[item[0]]] += 1
+            return depth
+    
+    def get_metrics(self):
+        """Resumo das métricas de fila e espera"""
+        with self._cond:
+            wait_avg = {}
+            wait_max = {}
+            for p, nome in NOMES_PRIORIDADE.items():
+                count = self.metrics["wait_count"][p]
+                wait_avg[nome] = self.metrics["wait_total"][p] / count if count else 0.0
+                wait_max[nome] = self.metrics["wait_max"][p]
+            
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": len(self._heap),
+                "submitted": self.metrics["submitted"],
+                "completed": self.metrics["completed"],
+                "dropped": self.metrics["dropped"],
+                "downgraded": self.metrics["downgraded"],
+                "wait_avg": wait_avg,
+                "wait_max": wait_max,
+            }
+
+# Scheduler compartilhado por todas as instâncias (o Ollama é um só)
+llm_scheduler = MiraiLLMScheduler()
+
+for _nome in NOMES_PRIORIDADE.values():
+    metrics.gauge("mirai_llm_queue_depth", "Jobs aguardando na fila do LLM",
+                  fn=lambda nome=_nome: llm_scheduler.queue_depth()[nome], priority=_nome)
+
+# Duração alvo da fala (segundos) por intenção do usuário
+ORCAMENTO_POR_INTENCAO = {
+    "rapida": 6.0,     # Perguntas diretas: horas, sim/não, confirmações
+    "conversa": 12.0,  # Conversa normal
+    "longa": 25.0,     # Piadas, histórias, explicações pedidas
+}
+
+PALAVRAS_INTENCAO = {
+    "rapida": ["que horas", "que dia", "sim ou não", "quanto é", "qual é", "obrigad", "tchau", "bom dia", "boa noite"],
+    "longa": ["conta", "piada", "história", "explica", "explique", "descreva", "resuma", "fale sobre"],
+}
+
+# Sequências que indicam que o modelo começou a inventar o próximo turno
+STOP_SEQUENCES = ["Usuário:", "\nMirai:", "\n\n\n"]
+
+class MiraiGenerationControl:
+    def __init__(self, chars_per_second=15.0, chars_per_token=3.5, stop_sequences=None):
+        """
+        Controla o tamanho das respostas faladas
+        
+        Args:
+            chars_per_second: Caracteres falados por segundo na velocidade 1.0
+            chars_per_token: Média de caracteres por token em português
+            stop_sequences: Sequências que encerram a geração
+        """
+        self.chars_per_second = chars_per_second
+        self.chars_per_token = chars_per_token
+        self.stop_sequences = stop_sequences if stop_sequences is not None else list(STOP_SEQUENCES)
+        
+        # Totais acumulados para ver o desperdício de geração
+        self.totals = {"turns": 0, "tokens_generated": 0, "tokens_spoken": 0, "early_stops": 0}
+    
+    def classify_intent(self, texto):
+        """Classifica a intenção do pedido por palavras-chave"""
+        texto = texto.lower()
+        for intent in ("longa", "rapida"):
+            if any(palavra in texto for palavra in PALAVRAS_INTENCAO[intent]):
+                return intent
+        return "conversa"
+    
+    def budget(self, texto, speech_rate=1.0, max_tokens=200):
+        """
+        Calcula o orçamento de geração para um turno
+        
+        Returns:
+            dict: intent, target_seconds, target_chars, num_predict
+        """
+        intent = self.classify_intent(texto)
+        target_seconds = ORCAMENTO_POR_INTENCAO[intent]
+        target_chars = int(target_seconds * self.chars_per_second * speech_rate)
+        
+        # Margem para o modelo fechar a frase depois de atingir o alvo
+        num_predict = int(target_chars / self.chars_per_token * 1.5)
+        
+        return {
+            "intent": intent,
+            "target_seconds": target_seconds,
+            "target_chars": target_chars,
+            "num_predict": max(16, min(max_tokens, num_predict)),
+        }
+    
+    def run(self, stream, budget, on_chunk=None):
+        """
+        Consome o stream do Ollama parando no primeiro fim de frase depois do alvo
+        
+        Args:
+            stream: Iterador de chunks de ollama.chat(stream=True)
+            budget: Resultado de budget()
+            on_chunk: Callback chamado com cada pedaço de texto recebido
+        
+        Returns:
+            dict: text, tokens_generated, tokens_spoken, stopped_early, trimmed
+        """
+        text = ""
+        ends = []  # Tamanho do texto ao fim de cada token
+        tokens_generated = 0
+        stopped_early = False
+        cut = None
+        sentence_start = None  # Início da frase em andamento quando o alvo foi atingido
+        
+        try:
+            for chunk in stream:
+                piece = chunk["message"]["content"]
+                if piece:
+                    text += piece
+                    tokens_generated += 1
+                    ends.append(len(text))
+                    if on_chunk is not None:
+                        on_chunk(piece)
+                
+                if chunk.get("done"):
+                    # O Ollama informa o total real de tokens no último chunk
+                    tokens_generated = max(tokens_generated, chunk.get("eval_count") or 0)
+                    if chunk.get("done_reason") == "length":
+                        # Cortado pelo num_predict: descarta a frase incompleta
+                        cut = self._last_sentence_end(text)
+                    break
+                
+                # Sequências de parada (o servidor também recebe, mas pode atrasar)
+                stop_at = self._find_stop(text)
+                if stop_at is not None:
+                    cut = stop_at
+                    stopped_early = True
+                    break
+                
+                # Alvo de duração atingido: deixa a frase em andamento terminar
+                # (o num_predict limita) em vez de voltar ao último fim de frase
+                if len(text) >= budget["target_chars"]:
+                    boundary = self._last_sentence_end(text)
+                    if sentence_start is None:
+                        sentence_start = boundary or 0
+                    if boundary is not None and (boundary > sentence_start or boundary >= len(text.rstrip())):
+                        cut = boundary
+                        stopped_early = True
+                        break
+        finally:
+            # Fecha a conexão para o Ollama parar de gerar
+            if hasattr(stream, "close"):
+                stream.close()
+        
+        # Só conta como corte se sobrou texto depois do ponto de parada
+        trimmed = cut is not None and cut < len(text)
+        if trimmed:
+            text = text[:cut]
+        tokens_spoken = sum(1 for end in ends if end <= len(text))
+        if ends and len(text) > (ends[tokens_spoken - 1] if tokens_spoken else 0):
+            tokens_spoken += 1  # Token parcialmente falado
+        
+        self.totals["turns"] += 1
+        self.totals["tokens_generated"] += tokens_generated
+        self.totals["tokens_spoken"] += tokens_spoken
+        self.totals["early_stops"] += int(stopped_early)
+        
+        return {
+            "text": text,
+            "tokens_generated": tokens_generated,
+            "tokens_spoken": tokens_spoken,
+            "stopped_early": stopped_early,
+            "trimmed": trimmed,
+        }
+    
+    def _find_stop(self, text):
+        """Posição da primeira sequência de parada no texto"""
+        positions = [text.find(seq) for seq in self.stop_sequences if seq in text]
+        return min(positions) if positions else None
+    
+    def _last_sentence_end(self, text):
+        """Posição logo após o último fim de frase"""
+        last = None
+        for match in FIM_DE_FRASE.finditer(text):
+            last = match.end()
+        return last
 
 class MiraiAI:
-    def __init__(self, model="mistral"):
+    def __init__(self, model="mistral", scheduler=None, client=None, memory=None, knowledge=None):
         self.model = model
-        self.conversation_history = []
+        self.scheduler = scheduler or llm_scheduler
+        # Pool de conexões com failover; pode vir envolvido em hedging com
+        # um backend compatível com a OpenAI (ver cliente_ollama.py)
+        self.client = client or build_pool(model=model)
+        # Memória de longo prazo em disco (ver memoria.py); restaura o histórico recente
+        self.memory = memory
+        self.conversation_history = memory.recent(16) if memory is not None else []
+        # Base de conhecimento dos jogos da persona (ver conhecimento.py)
+        self.knowledge = knowledge
         self.system_prompt = self._create_system_prompt()
-        self.config = {"temperature": 1.1}  # Inicializa o atributo config aqui
+        self.config = {"temperature": 1.1, "speech_rate": 1.0}  # Inicializa o atributo config aqui
+        self.generation = MiraiGenerationControl()
+        self.last_turn_stats = None
     
     def _create_system_prompt(self):
         return """Você é a Mirai, uma assistente virtual brasileira.
@@ -29,31 +372,95 @@ PERSONALIDADE:
 - Mostre personalidade, seja divertida quando apropriado
 - Se não souber algo, seja honesta
 
+EXPRESSÕES:
+- Comece cada frase com uma tag de expressão entre colchetes
+- Tags disponíveis: [feliz], [divertida], [triste], [raiva], [surpresa], [pensativa], [neutra]
+- Troque de tag só quando a emoção da frase mudar
+
 EXEMPLOS:
 Usuário: "Mirai, que horas são?"
-Mirai: "Hai! Agora são 15:30. Tem algum compromisso importante?"
+Mirai: "[feliz] Hai! Agora são 15:30. [pensativa] Tem algum compromisso importante?"
 
 Usuário: "Conta uma piada"
-Mirai: "Sugoi! Por que o Python foi ao psiquiatra? Porque tinha muitas classes! Arigatō por me pedir!"
+Mirai: "[divertida] Sugoi! Por que o Python foi ao psiquiatra? Porque tinha muitas classes! [feliz] Arigatō por me pedir!"
 
 FORMATO:
-- Responda apenas com o texto da fala
-- Não use markdown, asteriscos ou formatação
+- Responda apenas com o texto da fala e as tags de expressão
+- Não use markdown, asteriscos ou outra formatação
 - Seja natural como em uma conversa real"""
 
+    def _memory_prompt(self, texto_usuario, recentes):
+        """
+        Busca conversas antigas relacionadas e monta a mensagem de contexto
+        
+        Args:
+            recentes: Mensagens do histórico que já vão no prompt
+        
+        Returns:
+            dict ou None: Mensagem de sistema com as lembranças
+        """
+        if self.memory is None:
+            return None
+        
+        # A fala atual ainda não foi gravada; as demais recentes já estão no prompt
+        start = time.perf_counter()
+        lembrancas = self.memory.search(texto_usuario, limit=3, exclude_recent=max(0, len(recentes) - 1))
+        elapsed = (time.perf_counter() - start) * 1000
+        if not lembrancas:
+            return None
+        
+        print(f"🗂️  {len(lembrancas)} lembranças recuperadas em {elapsed:.2f} ms")
+        linhas = []
+        for lembranca in lembrancas:
+            quem = "O usuário disse" if lembranca["role"] == "user" else "Você disse"
+            linhas.append(f"- {quem}: {lembranca['content'][:200]}")
+        return {
+            "role": "system",
+            "content": "LEMBRANÇAS DE CONVERSAS ANTERIORES (use só se for relevante):\n" + "\n".join(linhas)
+        }
+    
+    def _knowledge_prompt(self, texto_usuario):
+        """
+        Busca os trechos da base de conhecimento mais parecidos com a pergunta
+        
+        Returns:
+            dict ou None: Mensagem de sistema com os fatos encontrados
+        """
+        if self.knowledge is None:
+            return None
+        
+        start = time.perf_counter()
+        try:
+            trechos = self.knowledge.search(texto_usuario, k=3)
+        except Exception as e:
+            print(f"⚠️  Erro na base de conhecimento: {e}")
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        if not trechos:
+            return None
+        
+        print(f"📚 {len(trechos)} trechos da base de conhecimento em {elapsed:.1f} ms")
+        return {
+            "role": "system",
+            "content": "FATOS CONFIRMADOS (use para responder, não invente além disso):\n"
+                       + "\n".join(f"- {trecho['text']}" for trecho in trechos)
+        }
+    
     def clean_response(self, text):
         """Limpa a resposta removendo marcações indesejadas"""
-        # Remove ações entre asteriscos
-        text = re.sub(r'\*.*?\*', '', text)
-        # Remove markdown
-        text = re.sub(r'[#_*`]', '', text)
-        # Remove múltiplos espaços e quebras
-        text = re.sub(r'\s+', ' ', text)
-        # Remove espaços no início/fim
-        return text.strip()
+        # Padrões pré-compilados em normalizar.py
+        return limpar_marcacoes(text)
     
-    def responder(self, texto_usuario, max_tokens=200):
-        """Gera resposta para o usuário"""
+    def responder(self, texto_usuario, max_tokens=200, priority=PRIORIDADE_INTERATIVA, deadline=None,
+                  on_chunk=None):
+        """
+        Gera resposta para o usuário
+        
+        Args:
+            on_chunk: Callback chamado com cada pedaço do stream (ex: normalizador do TTS)
+        """
+        
+        self.last_turn_stats = None
         
         if not texto_usuario or texto_usuario.strip() == "":
             return "Hai! Eu ouvi você, mas não entendi o que disse. Pode repetir?"
@@ -69,35 +476,72 @@ FORMATO:
         
         # Prepara mensagens para o modelo
         messages = [{"role": "system", "content": self.system_prompt}]
-        messages.extend(self.conversation_history[-4:])  # Últimas 4 interações
+        recentes = self.conversation_history[-4:]  # Últimas 4 interações
+        memoria = self._memory_prompt(texto_usuario, recentes)
+        if memoria is not None:
+            messages.append(memoria)
+        fatos = self._knowledge_prompt(texto_usuario)
+        if fatos is not None:
+            messages.append(fatos)
+        messages.extend(recentes)
         
-        try:
-            # Chama o Ollama - usa temperatura da configuração
-            response = ollama.chat(
+        # Orçamento de fala conforme intenção e velocidade atual do TTS
+        budget = self.generation.budget(
+            texto_usuario,
+            speech_rate=self.config.get("speech_rate", 1.0),
+            max_tokens=max_tokens
+        )
+        
+        def _generate():
+            stream = self.client.chat(
                 model=self.model,
                 messages=messages,
+                stream=True,
                 options={
                     "temperature": self.config.get("temperature", 1.1),
                     "top_p": 0.9,
-                    "num_predict": max_tokens
+                    "num_predict": budget["num_predict"],
+                    "stop": self.generation.stop_sequences
                 }
             )
+            return self.generation.run(stream, budget, on_chunk=on_chunk)
+        
+        try:
+            # Chama o Ollama via fila - usa temperatura da configuração
+            with stage_timer("llm"):
+                result = self.scheduler.run(_generate, priority=priority, deadline=deadline)
             
-            resposta_texto = response["message"]["content"]
+            resposta_texto = result["text"]
             resposta_limpa = self.clean_response(resposta_texto)
             
+            self.last_turn_stats = dict(result, intent=budget["intent"], num_predict=budget["num_predict"])
+            wasted = result["tokens_generated"] - result["tokens_spoken"]
+            print(f"📏 Tokens: {result['tokens_generated']} gerados, {result['tokens_spoken']} falados "
+                  f"({wasted} desperdiçados, intenção '{budget['intent']}'"
+                  f"{', parada antecipada' if result['stopped_early'] else ''})")
+            
             # Adiciona resposta à história
             self.conversation_history.append({"role": "assistant", "content": resposta_limpa})
             
+            # Grava o turno completo (escrita em lote, fora deste caminho)
+            if self.memory is not None:
+                self.memory.append("user", texto_usuario)
+                self.memory.append("assistant", resposta_limpa)
+            
             print(f"🤖 Resposta gerada: {resposta_limpa[:50]}...")
             return resposta_limpa
             
+        except JobDescartado as e:
+            print(f"⏭️  Requisição descartada: {e}")
+            self.conversation_history.pop()
+            return None
+            
         except Exception as e:
             print(f"❌ Erro ao chamar Ollama: {e}")
             return "Gomen nasai! (Desculpe!) Estou tendo problemas para pensar agora. Pode tentar novamente?"
 
     def reset_conversation(self):
-        """Reseta o histórico de conversação"""
+        """Reseta o histórico de conversação (a memória de longo prazo continua no banco)"""
         self.conversation_history = []
         print("🔄 Conversação reiniciada")
 
@@ -0,0 +1,429 @@
+"""
+Identificação de idioma por trechos da resposta
+
+A persona mistura palavras japonesas ("Hai!", "Arigatō") e o usuário às vezes
+troca para o inglês. Cada frase é dividida em trechos de um idioma só para que
+a síntese use a voz certa em cada um (ver MiraiTTS.route).
+
+O classificador é um modelo de n-gramas de caracteres (1 a 3) treinado no
+import com os textos de referência abaixo, mais um bônus para palavras
+conhecidas. Japonês romanizado só é aceito se a palavra se decompõe em sílabas
+Hepburn; kana/kanji decidem direto. A segmentação é um Viterbi sobre as
+palavras com custo de troca de idioma (menor depois de pontuação), então uma
+palavra estrangeira solta no meio da frase ("o game") não vira um trecho.
+
+Uso:
+    python idiomas.py   # trechos de exemplo e µs por frase
+"""
+import re
+import math
+import time
+from collections import Counter
+
+IDIOMAS = ("pt", "en", "ja")
+
+# Textos de referência (fala coloquial de assistente, o registro das respostas)
+REFERENCIAS = {
+    "pt": """
+        olá eu sou a mirai sua assistente virtual como posso ajudar você hoje claro
+        que sim vou verificar isso para você agora são três horas da tarde e amanhã
+        vai chover então leve um guarda chuva não se preocupe está tudo bem você já
+        jogou o novo evento do genshin eu adorei a história e os personagens são
+        muito bonitos acho que vale a pena tentar de novo mais tarde se precisar de
+        alguma coisa é só me chamar obrigada por perguntar que legal fico feliz em
+        saber disso entendi vou abrir o programa para você não consegui encontrar
+        esse arquivo quer que eu procure em outra pasta sua reunião começa daqui a
+        dez minutos lembre de beber água e descansar um pouco também estou aqui
+        pensando no que você disse ontem sobre a viagem parece uma ótima ideia
+        quando você quiser podemos conversar sobre isso com calma boa noite durma
+        bem bom dia tudo bem com você muito obrigado pela ajuda até logo nossa que
+        incrível parabéns pela conquista você conseguiu o personagem cinco estrelas
+        a música está alta demais posso diminuir o volume mas primeiro preciso
+        saber qual dispositivo você está usando então me diga por favor qual é o
+        seu preferido depois eu configuro tudo sozinha sem problema nenhum ainda
+        não sei a resposta mas posso pesquisar na internet e te contar daqui a
+        pouco isso depende de quanto tempo você tem disponível hoje à noite
+        também gosto de pokémon e de jogos de luta com os meus amigos ele foi
+        embora cedo mas ela disse que volta logo oi sim tchau nunca sempre agora
+        acabou de chegar em casa fiquei com fome vamos comer alguma coisa gostosa
+        meu gato é fofo e dorme o dia inteiro na cama sabia que amanhã é feriado
+        ontem ele tomou um café comeu um bolo e depois saiu o meu time ganhou o
+        jogo todo mundo comemorou ela falou que chegou tarde e deixou a mochila
+        na sala quem comprou o presente gostou muito vamos time força pessoal
+    """,
+    "en": """
+        hello i am mirai your virtual assistant how can i help you today of course
+        let me check that for you right now it is three in the afternoon and it
+        will rain tomorrow so take an umbrella with you don't worry everything is
+        fine have you played the new event yet i loved the story and the characters
+        are really pretty i think it is worth trying again later if you need
+        anything just call me thanks for asking that's awesome i'm happy to hear
+        that got it i will open the program for you i couldn't find that file do
+        you want me to look in another folder your meeting starts in ten minutes
+        remember to drink some water and take a break too oh i see well that makes
+        sense what do you mean by that sounds good to me good luck with the boss
+        fight you can do it nice job that was amazing see you later good night
+        good morning what's up how are you doing thank you so much by the way the
+        music is too loud can you turn it down please which device are you using
+        right now i don't know the answer yet but i can search the web and tell
+        you in a minute it depends on how much time you have tonight i also like
+        fighting games with my friends oh my god no way seriously let's go he
+        left early but she said she would be back soon yes hi bye never always
+        just got home i'm hungry let's eat something my cat is cute and sleeps
+        all day did you know tomorrow is a holiday
+    """,
+    "ja": """
+        hai arigatō arigatou arigato gozaimasu sugoi yappari wakarimashita wakatta
+        gambatte ganbatte ganbare konnichiwa konbanwa ohayō ohayou ohayo gomen
+        gomennasai nasai baka kawaii sayōnara sayounara sayonara daijōbu daijoubu
+        daijobu desu ka nani sou desu ne ii yo itadakimasu gochisousama oyasumi
+        sumimasen onegai shimasu kudasai senpai sensei kun chan san sama watashi
+        anata kore sore are doko nande demo dakara yoshi ikuzo yatta mou ureshii
+        tanoshii oishii kirei subarashii omedetou omedetō tadaima okaeri mata ne
+        jaa ne matte chotto hontou honto ni naruhodo maji sasuga kakkoii muri
+        yamete dame daisuki suki genki ogenki nee ano etto uso sou ka yokatta
+        hajimemashite yoroshiku onegaishimasu irasshaimase kanpai sakura kokoro
+        tomodachi minna issho ni ikimashou mochiron zettai kimochi ii ne
+    """,
+}
+
+# Bônus (log) para palavras vistas na referência
+BONUS_CONHECIDA = 2.5
+# Custo de trocar de idioma no meio de uma oração / depois de vírgula / depois de fim de frase
+CUSTO_TROCA = 5.0
+CUSTO_TROCA_VIRGULA = 3.0
+CUSTO_TROCA_PONTUACAO = 1.0
+# Preferência pelo idioma principal, por palavra
+PREFERENCIA_PRINCIPAL = 0.4
+# Teto da evidência de uma palavra (nenhuma palavra sozinha decide tudo)
+EVIDENCIA_MAXIMA = 10.0
+# Palavras não decomponíveis em sílabas japonesas
+IMPOSSIVEL = -50.0
+# Um trecho fora do idioma principal só é mantido com pelo menos duas palavras
+# que preferem o idioma do trecho por MARGEM_PALAVRA, ou com a soma das margens
+# de todas as palavras chegando a MARGEM_TRECHO ("Vamos, time!" fica em português)
+MARGEM_PALAVRA = 1.0
+MARGEM_TRECHO = 7.0
+# Nomes que aparecem em qualquer idioma (não puxam o trecho para lado nenhum)
+NEUTRAS = {"mirai", "genshin", "pokémon", "pokemon", "ok"}
+
+PALAVRA = re.compile(r"\S+")
+NUCLEO = re.compile(r"[\w'’-]+")
+FIM_DE_FRASE = re.compile(r"[.!?…]$")
+VIRGULA = re.compile(r"[,;:]$")
+ESCRITA_JAPONESA = re.compile(r"[぀-ヿ㐀-鿿ｦ-ﾟ]")
+MACRONS = str.maketrans({"ā": "aa", "ī": "ii", "ū": "uu", "ē": "ee", "ō": "ou"})
+
+# Sílabas Hepburn -> hiragana (as mais longas são tentadas primeiro)
+SILABAS = {
+    "a": "あ", "i": "い", "u": "う", "e": "え", "o": "お",
+    "ka": "か", "ki": "き", "ku": "く", "ke": "け", "ko": "こ",
+    "kya": "きゃ", "kyu": "きゅ", "kyo": "きょ",
+    "ga": "が", "gi": "ぎ", "gu": "ぐ", "ge": "げ", "go": "ご",
+    "gya": "ぎゃ", "gyu": "ぎゅ", "gyo": "ぎょ",
+    "sa": "さ", "shi": "し", "si": "し", "su": "す", "se": "せ", "so": "そ",
+    "sha": "しゃ", "shu": "しゅ", "sho": "しょ", "she": "しぇ",
+    "za": "ざ", "ji": "じ", "zi": "じ", "zu": "ず", "ze": "ぜ", "zo": "ぞ",
+    "ja": "じゃ", "ju": "じゅ", "jo": "じょ", "je": "じぇ",
+    "ta": "た", "chi": "ち", "ti": "ち", "tsu": "つ", "tu": "つ", "te": "て", "to": "と",
+    "cha": "ちゃ", "chu": "ちゅ", "cho": "ちょ", "che": "ちぇ",
+    "da": "だ", "di": "ぢ", "du": "づ", "de": "で", "do": "ど",
+    "na": "な", "ni": "に", "nu": "ぬ", "ne": "ね", "no": "の",
+    "nya": "にゃ", "nyu": "にゅ", "nyo": "にょ",
+    "ha": "は", "hi": "ひ", "fu": "ふ", "hu": "ふ", "he": "へ", "ho": "ほ",
+    "hya": "ひゃ", "hyu": "ひゅ", "hyo": "ひょ",
+    "ba": "ば", "bi": "び", "bu": "ぶ", "be": "べ", "bo": "ぼ",
+    "bya": "びゃ", "byu": "びゅ", "byo": "びょ",
+    "pa": "ぱ", "pi": "ぴ", "pu": "ぷ", "pe": "ぺ", "po": "ぽ",
+    "pya": "ぴゃ", "pyu": "ぴゅ", "pyo": "ぴょ",
+    "ma": "ま", "mi": "み", "mu": "む", "me": "め", "mo": "も",
+    "mya": "みゃ", "myu": "みゅ", "myo": "みょ",
+    "ya": "や", "yu": "ゆ", "yo": "よ",
+    "ra": "ら", "ri": "り", "ru": "る", "re": "れ", "ro": "ろ",
+    "rya": "りゃ", "ryu": "りゅ", "ryo": "りょ",
+    "wa": "わ", "wo": "を",
+}
+VOGAIS = "aiueo"
+
+
+def romaji_para_kana(palavra):
+    """
+    Japonês romanizado (Hepburn) -> hiragana
+
+    Returns:
+        str, ou None se a palavra não se decompõe em sílabas japonesas
+    """
+    texto = palavra.lower().translate(MACRONS).replace("'", "").replace("’", "")
+    kana = []
+    i = 0
+    n = len(texto)
+    while i < n:
+        c = texto[i]
+        # Consoante dobrada (kk, tt, tch...) vira o tsu pequeno
+        if i + 1 < n and c not in VOGAIS and c != "n" and (texto[i + 1] == c or texto[i:i + 3] == "tch"):
+            kana.append("っ")
+            i += 1
+            continue
+        for tamanho in (3, 2, 1):
+            silaba = SILABAS.get(texto[i:i + tamanho])
+            if silaba is not None:
+                kana.append(silaba)
+                i += tamanho
+                break
+        else:
+            # "n" sem vogal depois (fim da palavra, consoante, "nn") e "m" antes de b/p/m
+            if (c == "n" and (i + 1 == n or texto[i + 1] not in VOGAIS + "y")) or \
+                    (c == "m" and i + 1 < n and texto[i + 1] in "bpm"):
+                kana.append("ん")
+                i += 1
+                continue
+            return None
+    return "".join(kana)
+
+
+def romaji_em_kana(texto):
+    """Converte as palavras romanizadas de um trecho (o resto fica como está)"""
+    def _converter(match):
+        return romaji_para_kana(match.group(0)) or match.group(0)
+    return NUCLEO.sub(_converter, texto)
+
+
+def _palavras(texto):
+    return NUCLEO.findall(texto.lower())
+
+
+class _Perfil:
+    def __init__(self, texto):
+        """Contagens de n-gramas de caracteres (1 a 3) de um idioma"""
+        self.vocabulario = set(_palavras(texto))
+        gramas = Counter()
+        for palavra in _palavras(texto):
+            w = f" {palavra} "
+            for n in (1, 2, 3):
+                for i in range(len(w) - n + 1):
+                    gramas[w[i:i + n]] += 1
+        self.gramas = gramas
+        self.total = sum(c for g, c in gramas.items() if len(g) == 1)
+        self.letras = len([g for g in gramas if len(g) == 1]) + 1
+
+    def log_prob(self, palavra):
+        """Log-probabilidade da palavra (trigramas interpolados com bi e unigramas)"""
+        w = f" {palavra} "
+        gramas = self.gramas
+        total = 0.0
+        for i in range(2, len(w)):
+            c1, c2, c3 = w[i], w[i - 1:i + 1], w[i - 2:i + 1]
+            p1 = (gramas.get(c1, 0) + 0.1) / (self.total + 0.1 * self.letras * 4)
+            ctx1 = gramas.get(w[i - 1], 0)
+            p2 = gramas.get(c2, 0) / ctx1 if ctx1 else 0.0
+            ctx2 = gramas.get(w[i - 2:i], 0)
+            p3 = gramas.get(c3, 0) / ctx2 if ctx2 else 0.0
+            total += math.log(0.6 * p3 + 0.3 * p2 + 0.1 * p1)
+        if palavra in self.vocabulario:
+            total += BONUS_CONHECIDA
+        return total
+
+
+class MiraiLanguageId:
+    def __init__(self, idiomas=IDIOMAS, principal="pt", referencias=REFERENCIAS, cache=4096):
+        """
+        Identificador de idioma por palavra com segmentação em trechos
+
+        Args:
+            idiomas: Idiomas considerados (precisam ter texto de referência)
+            principal: Idioma da voz principal (preferido em caso de dúvida)
+            cache: Palavras com pontuação guardada (as respostas repetem muito vocabulário)
+        """
+        self.idiomas = tuple(idiomas)
+        self.principal = principal
+        self._perfis = {idioma: _Perfil(referencias[idioma]) for idioma in self.idiomas}
+        self._cache = {}
+        self._cache_max = cache
+
+    def scores(self, palavra):
+        """
+        Log-verossimilhança da palavra em cada idioma (normalizada pelo melhor)
+
+        Returns:
+            tuple: Uma pontuação por idioma, na ordem de self.idiomas
+        """
+        palavra = palavra.lower()
+        cached = self._cache.get(palavra)
+        if cached is not None:
+            return cached
+
+        if ESCRITA_JAPONESA.search(palavra):
+            brutos = [0.0 if idioma == "ja" else IMPOSSIVEL for idioma in self.idiomas]
+        elif palavra in NEUTRAS or any(c.isdigit() for c in palavra):
+            brutos = [0.0] * len(self.idiomas)  # Nomes e números não dizem nada
+        else:
+            brutos = []
+            for idioma in self.idiomas:
+                if idioma == "ja" and romaji_para_kana(palavra) is None:
+                    brutos.append(IMPOSSIVEL)
+                else:
+                    brutos.append(self._perfis[idioma].log_prob(palavra))
+        melhor = max(brutos)
+        # Palavras de uma ou duas letras ("a", "I", "no") e fora das referências valem menos:
+        # sozinhas no meio de uma oração elas não bastam para trocar de idioma
+        peso = 0.5 if len(palavra) <= 2 else 1.0
+        if not any(palavra in perfil.vocabulario for perfil in self._perfis.values()):
+            peso *= 0.6
+        resultado = tuple(max(-EVIDENCIA_MAXIMA, b - melhor) * peso for b in brutos)
+
+        if len(self._cache) >= self._cache_max:
+            self._cache.clear()
+        self._cache[palavra] = resultado
+        return resultado
+
+    def segment(self, texto):
+        """
+        Divide o texto em trechos de um idioma só
+
+        Returns:
+            list: [(idioma, trecho)] na ordem do texto (trechos com a pontuação original)
+        """
+        tokens = [(m.start(), m.end(), NUCLEO.search(m.group(0))) for m in PALAVRA.finditer(texto)]
+        if not tokens:
+            return []
+
+        idiomas = self.idiomas
+        k = len(idiomas)
+        vies = [PREFERENCIA_PRINCIPAL if idioma == self.principal else 0.0 for idioma in idiomas]
+
+        # Viterbi: melhor[i] = pontuação terminando no idioma i; volta[t][i] = idioma anterior
+        melhor = None
+        volta = []
+        troca = CUSTO_TROCA
+        for start, end, nucleo in tokens:
+            emissao = self.scores(nucleo.group(0)) if nucleo else (0.0,) * k
+            if melhor is None:
+                melhor = [emissao[i] + vies[i] for i in range(k)]
+                volta.append(None)
+            else:
+                # Vir de outro idioma só compensa vindo do melhor deles
+                b = max(range(k), key=melhor.__getitem__)
+                trocando = melhor[b] - troca
+                novo = []
+                anteriores = []
+                for i in range(k):
+                    j = i if melhor[i] >= trocando else b
+                    novo.append(max(melhor[i], trocando) + emissao[i] + vies[i])
+                    anteriores.append(j)
+                melhor = novo
+                volta.append(anteriores)
+            palavra = texto[start:end]
+            if FIM_DE_FRASE.search(palavra):
+                troca = CUSTO_TROCA_PONTUACAO
+            elif VIRGULA.search(palavra):
+                troca = CUSTO_TROCA_VIRGULA
+            else:
+                troca = CUSTO_TROCA
+
+        atual = max(range(k), key=lambda i: melhor[i])
+        caminho = [atual]
+        for anteriores in reversed(volta[1:]):
+            atual = anteriores[atual]
+            caminho.append(atual)
+        caminho.reverse()
+
+        caminho = self._confirmar_trocas(tokens, caminho)
+
+        trechos = []
+        inicio = tokens[0][0]
+        for t in range(1, len(tokens) + 1):
+            if t == len(tokens) or caminho[t] != caminho[t - 1]:
+                trechos.append((idiomas[caminho[t - 1]], texto[inicio:tokens[t - 1][1]]))
+                if t < len(tokens):
+                    inicio = tokens[t][0]
+        return trechos
+
+    def _confirmar_trocas(self, tokens, caminho):
+        """Devolve ao idioma principal os trechos sem confiança suficiente (ver MARGEM_TRECHO)"""
+        principal = self.idiomas.index(self.principal)
+        caminho = list(caminho)
+        t = 0
+        while t < len(caminho):
+            fim = t
+            while fim + 1 < len(caminho) and caminho[fim + 1] == caminho[t]:
+                fim += 1
+            idioma = caminho[t]
+            if idioma != principal:
+                margens = []
+                for _, _, nucleo in tokens[t:fim + 1]:
+                    if nucleo:
+                        emissao = self.scores(nucleo.group(0))
+                        margens.append(emissao[idioma] - emissao[principal])
+                fortes = sum(1 for m in margens if m >= MARGEM_PALAVRA)
+                if fortes < 2 and sum(margens) < MARGEM_TRECHO:
+                    caminho[t:fim + 1] = [principal] * (fim + 1 - t)
+            t = fim + 1
+        return caminho
+
+
+def unir_trechos(trechos):
+    """Junta trechos vizinhos do mesmo idioma (ex: depois de trocar idiomas sem voz pelo principal)"""
+    unidos = []
+    for idioma, trecho in trechos:
+        if unidos and unidos[-1][0] == idioma:
+            unidos[-1] = (idioma, unidos[-1][1] + " " + trecho)
+        else:
+            unidos.append((idioma, trecho))
+    return unidos
+
+
+# Frases de exemplo com os idiomas esperados de cada trecho
+EXEMPLOS = [
+    ("Hai! Claro, eu posso te ajudar com isso.", ["ja", "pt"]),
+    ("Arigatō por perguntar!", ["ja", "pt"]),
+    ("Sugoi! Você conseguiu o personagem cinco estrelas.", ["ja", "pt"]),
+    ("Daijōbu? Você parece cansado hoje.", ["ja", "pt"]),
+    ("Eu acho que o game novo está ótimo.", ["pt"]),
+    ("Oh, I see. Então vamos lá!", ["en", "pt"]),
+    ("That's awesome, good luck with the boss fight! Gambatte!", ["en", "ja"]),
+    ("Wakarimashita, vou abrir o navegador agora.", ["ja", "pt"]),
+    ("Você quer que eu toque a música de novo?", ["pt"]),
+    ("Yappari, você escolheu o Pokémon de fogo.", ["ja", "pt"]),
+    ("Can you help me with my homework?", ["en"]),
+    ("Konnichiwa! Tudo bem com você?", ["ja", "pt"]),
+    ("Ele disse see you later e foi embora.", ["pt", "en", "pt"]),
+    ("Mirai, qual é a previsão do tempo para amanhã?", ["pt"]),
+    ("A Mirai tomou sake.", ["pt"]),
+    ("Vamos, time!", ["pt"]),
+]
+
+
+def benchmark(repeticoes=2000):
+    """Acerto nos exemplos e custo por frase (com e sem o cache de palavras)"""
+    lid = MiraiLanguageId()
+    print("\n📊 Identificação de idioma")
+    print("="*60)
+    acertos = 0
+    for frase, esperado in EXEMPLOS:
+        trechos = lid.segment(frase)
+        obtido = [idioma for idioma, _ in trechos]
+        ok = obtido == esperado
+        acertos += ok
+        marca = "✅" if ok else "❌"
+        print(f"  {marca} " + " | ".join(f"[{idioma}] {trecho}" for idioma, trecho in trechos))
+    print(f"  {acertos}/{len(EXEMPLOS)} frases segmentadas como esperado")
+
+    frases = [frase for frase, _ in EXEMPLOS]
+    start = time.perf_counter()
+    for frase in frases:
+        lid._cache.clear()
+        lid.segment(frase)
+    frio = (time.perf_counter() - start) / len(frases) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeticoes):
+        for frase in frases:
+            lid.segment(frase)
+    quente = (time.perf_counter() - start) / (repeticoes * len(frases)) * 1e6
+    print(f"⏱️  {frio:.0f} µs por frase (palavras novas), {quente:.0f} µs com o cache de palavras")
+    print("="*60)
+
+
+# Teste direto
+if __name__ == "__main__":
+    benchmark()
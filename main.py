@@ -6,32 +6,101 @@ Sistema completo com seleção de dispositivo de áudio
 
 from ouvir_sr import ouvir, MiraiListener
 from ia import responder, MiraiAI
+from cliente_ollama import build_pool, build_hedged
+from memoria import MiraiMemoryStore
+from dispositivos import get_registry, ENTRADA
+from metricas import metrics, stage_timer
+from sessao import MiraiSessionRecorder, nova_sessao
 from falar import MiraiTTS, get_tts_engine
+from normalizar import MiraiTextNormalizer, normalizar_texto
+from avatar import MiraiTagParser
+import threading
+import queue
 import time
 import sys
 import signal
 import json
 import os
-import speech_recognition as sr  # Adicione esta linha se não existir
+import re
+
+# Perguntas que precisam olhar a tela do usuário
+PERGUNTA_DE_TELA = re.compile(r'\b(tela|monitor|screenshot|print)\b', re.IGNORECASE)
+ABRIR_APLICATIVO = re.compile(
+    r'^(?:abr[ae]|abrir|inici[ae]|iniciar|execut[ae]|executar|roda|rodar)\s+'
+    r'(?:(?:o|a|os|as|um|uma)\s+)?(?:(?:aplicativo|programa|app)\s+)?(?:do\s+|da\s+)?(.+)$',
+    re.IGNORECASE
+)
+# Respostas que confirmam abrir um aplicativo incerto
+CONFIRMACAO = re.compile(r'\b(?:sim|pode|abre|abra|isso|claro|hai)\b', re.IGNORECASE)
+NEGACAO = re.compile(r'\b(?:n[aã]o|nem|deixa)\b', re.IGNORECASE)
 
 class MiraiAssistant:
-    def __init__(self, config_file="mirai_config.json"):
-        """Inicializa todos os componentes do MIRAI"""
+    def __init__(self, config_file="mirai_config.json", overrides=None):
+        """
+        Inicializa todos os componentes do MIRAI
+        
+        Args:
+            overrides: Valores que substituem a configuração carregada (ex: replay de sessão)
+        """
         print("🤖 Inicializando M.I.R.A.I...")
         print("="*50)
         
         # Carrega configuração
         self.config_file = config_file
         self.config = self.load_config()
+        self.config.update(overrides or {})
+        
+        # Endpoint /metrics para Prometheus/Grafana (None desativa)
+        if self.config.get("metrics_port"):
+            try:
+                metrics.serve(self.config["metrics_port"])
+            except OSError as e:
+                print(f"⚠️  Não foi possível abrir o endpoint de métricas: {e}")
+        
+        # Enumeração de dispositivos em segundo plano (não trava a inicialização)
+        self.devices = get_registry()
+        
+        # Gravação da sessão para replay offline (opt-in, ver sessao.py)
+        self.recorder = None
+        if self.config.get("session_dir"):
+            self.recorder = MiraiSessionRecorder(nova_sessao(self.config["session_dir"]))
         
         # Inicializa componentes
-        self.listener = MiraiListener()
-        self.ai = MiraiAI(model=self.config.get("model", "mistral"))
-        self.tts = get_tts_engine()
+        self.listener = MiraiListener(
+            backend=self.config.get("asr_backend", "vosk"),
+            fallback=self.config.get("asr_fallback", "google"),
+            noise_suppression=self.config.get("noise_suppression", True)
+        )
+        self.listener.recorder = self.recorder
+        self.memory = MiraiMemoryStore(self.config["memory_db"]) if self.config.get("memory_db") else None
+        self.knowledge = self.load_knowledge()
+        self.screen = self.load_screen()
+        self.apps = self.load_apps()
+        self.app_replay = None  # Desfechos gravados de "abre o ..." (ver sessao.replay)
+        self.ai = MiraiAI(
+            model=self.config.get("model", "mistral"),
+            client=self.record_client(self.build_llm_client()),
+            memory=self.memory,
+            knowledge=self.knowledge
+        )
+        self.tts = get_tts_engine(
+            backend=self.config.get("tts_backend", "torch"),
+            onnx_int8=self.config.get("tts_onnx_int8", False)
+        )
+        self.tts.recorder = self.recorder
+        self.expressions = None  # Expressões do avatar (ver apply_config)
         
         # Aplica configurações salvas
         self.apply_config()
         
+        # Confirmações curtas enquanto o LLM pensa (sintetizadas em segundo plano)
+        self.acks = self.load_acknowledgments()
+        if self.acks is not None:
+            self.listener.on_endpoint = self.acks.on_endpoint
+        
+        # Modo de pouca memória: modelos ociosos saem da memória
+        self.models = self.load_lifecycle()
+        
         # Estado
         self.active = True
         self.conversation_mode = False
@@ -46,13 +115,48 @@ class MiraiAssistant:
         """Carrega configuração do arquivo"""
         default_config = {
             "audio_device": None,
+            "audio_device_key": None,
             "mic_device": None,
+            "mic_device_key": None,
             "volume": 1.0,
             "speed": 1.1,
             "model": "mistral",
+            "ollama_host": "http://localhost:11434",
+            "fallback_model": None,
+            "fallback_host": None,
+            "hedge_backend": "openai",
+            "hedge_url": None,
+            "hedge_model": None,
             "temperature": 1.1,
             "wake_words": ["mirai", "mirá", "miray"],
-            "auto_listen": False
+            "auto_listen": False,
+            "memory_db": "mirai_memoria.db",
+            "knowledge_dir": "conhecimento/indice",
+            "embed_model": "nomic-embed-text",
+            "screen_enabled": False,
+            "vision_model": "llava",
+            "metrics_port": 9464,
+            "session_dir": None,
+            "ack_enabled": True,
+            "ack_threshold": 0.8,
+            "apps_enabled": True,
+            "asr_backend": "vosk",
+            "asr_fallback": "google",
+            "noise_suppression": True,
+            "tts_workers": 0,
+            "tts_backend": "torch",
+            "tts_onnx_int8": False,
+            "tts_streaming": False,
+            "language_routing": False,
+            "voices": {
+                "en": "tts_models/en/ljspeech/vits",
+                "ja": "tts_models/ja/kokoro/tacotron2-DDC"
+            },
+            "low_memory": False,
+            "model_idle_ttl": 600,
+            "avatar_enabled": False,
+            "vmc_host": "127.0.0.1",
+            "vmc_port": 39539
         }
         
         if os.path.exists(self.config_file):
@@ -69,6 +173,100 @@ class MiraiAssistant:
         
         return default_config
     
+    def load_knowledge(self):
+        """Abre a base de conhecimento se o índice já foi gerado (python conhecimento.py build)"""
+        index_dir = self.config.get("knowledge_dir")
+        if not index_dir or not os.path.exists(os.path.join(index_dir, "meta.json")):
+            return None
+        try:
+            from conhecimento import MiraiKnowledgeIndex, OllamaEmbedder
+            embedder = OllamaEmbedder(
+                self.config.get("embed_model", "nomic-embed-text"),
+                self.config.get("ollama_host", "http://localhost:11434")
+            )
+            index = MiraiKnowledgeIndex(index_dir, embedder=embedder)
+            print(f"📚 Base de conhecimento: {len(index)} trechos")
+            return index
+        except Exception as e:
+            print(f"⚠️  Erro ao abrir base de conhecimento: {e}")
+            return None
+    
+    def load_screen(self):
+        """Contexto de tela com modelo multimodal, se ativado na configuração"""
+        if not self.config.get("screen_enabled"):
+            return None
+        try:
+            from tela import MiraiScreenContext
+            return MiraiScreenContext(self.record_client(build_pool(
+                model=self.config.get("vision_model", "llava"),
+                host=self.config.get("ollama_host", "http://localhost:11434")
+            )))
+        except Exception as e:
+            print(f"⚠️  Captura de tela indisponível: {e}")
+            return None
+    
+    def load_apps(self):
+        """Índice dos aplicativos instalados para "abre o ..." (montado em segundo plano)"""
+        if not self.config.get("apps_enabled"):
+            return None
+        from aplicativos import MiraiAppLauncher
+        launcher = MiraiAppLauncher()
+        threading.Thread(target=launcher.build, daemon=True).start()
+        return launcher
+    
+    def build_llm_client(self):
+        """Pool do Ollama local, com hedging para um backend secundário se configurado"""
+        client = build_pool(
+            model=self.config.get("model", "mistral"),
+            host=self.config.get("ollama_host", "http://localhost:11434"),
+            fallback_model=self.config.get("fallback_model"),
+            fallback_host=self.config.get("fallback_host")
+        )
+        if self.config.get("hedge_url"):
+            client = build_hedged(
+                client,
+                url=self.config["hedge_url"],
+                model=self.config.get("hedge_model") or self.config.get("model", "mistral"),
+                kind=self.config.get("hedge_backend", "openai")
+            )
+        return client
+    
+    def load_acknowledgments(self):
+        """Banco de confirmações ("Hai!", "Hmm...") para mascarar a latência do LLM"""
+        if not self.config.get("ack_enabled") or self.tts.tts is None:
+            return None
+        from confirmacao import MiraiAcknowledgments
+        return MiraiAcknowledgments(
+            self.tts, threshold=self.config.get("ack_threshold", 0.8)
+        ).prepare()
+    
+    def load_lifecycle(self):
+        """Descarrega voz e ASR ociosos (low_memory); a palavra de ativação já recarrega a voz"""
+        if not self.config.get("low_memory"):
+            return None
+        from modelos import MiraiModelLifecycle
+        lifecycle = MiraiModelLifecycle(ttl=self.config.get("model_idle_ttl", 600))
+        if self.tts.tts is not None:
+            self.tts.attach_lifecycle(lifecycle)
+        self.listener.attach_lifecycle(lifecycle)
+        self.listener.on_wake = lambda: lifecycle.prewarm("tts")
+        print(f"💤 Modo de pouca memória: modelos descarregados após {lifecycle.ttl:.0f}s sem uso")
+        return lifecycle.start()
+    
+    def close(self):
+        """Grava o que ainda está na fila e encerra o ciclo de vida dos modelos"""
+        if self.memory is not None:
+            self.memory.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.models is not None:
+            self.models.stop()
+            self.models.report()
+    
+    def record_client(self, client):
+        """Cliente do Ollama que também grava a sessão, se a gravação estiver ativa"""
+        return self.recorder.wrap_client(client) if self.recorder is not None else client
+    
     def save_config(self):
         """Salva configuração no arquivo"""
         try:
@@ -81,16 +279,38 @@ class MiraiAssistant:
     def apply_config(self):
         """Aplica configurações carregadas"""
         # Configura áudio de saída (fone)
-        if self.config.get("audio_device") is not None:
-            self.tts.select_audio_device(self.config["audio_device"])
+        if self.config.get("audio_device_key") or self.config.get("audio_device") is not None:
+            if self.tts.select_device_by_key(self.config.get("audio_device_key"), self.config.get("audio_device")):
+                self.config["audio_device"] = self.tts.selected_device
         
         self.tts.set_voice_settings(
             volume=self.config.get("volume", 1.0),
             rate=self.config.get("speed", 1.1)
         )
         
+        # Síntese em blocos (reprodução começa antes da frase terminar)
+        self.tts.streaming = self.config.get("tts_streaming", False)
+        
+        # Uma voz por idioma nos trechos em inglês/japonês (vozes pré-carregadas em segundo plano)
+        if self.config.get("language_routing") and self.tts.tts is not None:
+            self.tts.load_voices(self.config.get("voices") or {})
+        
+        # Pool de processos para síntese (0 = síntese no próprio processo)
+        if self.config.get("tts_workers", 0):
+            self.tts.enable_worker_pool(self.config["tts_workers"])
+        
+        # Avatar (VMagicMirror / Live2D) via protocolo VMC
+        if self.config.get("avatar_enabled"):
+            from avatar import MiraiVisemeEngine, MiraiExpressionDispatcher, VMCSender
+            sender = VMCSender(self.config.get("vmc_host", "127.0.0.1"), self.config.get("vmc_port", 39539))
+            self.tts.attach_viseme_engine(MiraiVisemeEngine(sender, sample_rate=self.tts.sample_rate))
+            self.expressions = MiraiExpressionDispatcher(sender)
+        
         # Aplica temperatura no modelo AI
         self.ai.config["temperature"] = self.config.get("temperature", 1.1)
+        
+        # Velocidade da fala define o tamanho das respostas
+        self.ai.config["speech_rate"] = self.tts.speech_rate
     
     
 
@@ -98,6 +318,7 @@ class MiraiAssistant:
         """Lida com Ctrl+C"""
         print("\n\n🛑 Interrupção recebida...")
         self.active = False
+        self.close()
         sys.exit(0)
     
     def greeting(self):
@@ -118,21 +339,189 @@ class MiraiAssistant:
         
         # Obtém resposta da IA
         print("🧠 Pensando...")
-        response = self.ai.responder(command)
+        
+        if self.recorder is not None:
+            self.recorder.begin_turn(command)
+        start = time.perf_counter()
+        
+        with stage_timer("turn"):
+            app = self.open_app(command, text_only)
+            if app is not None:
+                response = app
+            elif self.screen is not None and PERGUNTA_DE_TELA.search(command):
+                response = self.ask_screen(command, text_only)
+            elif text_only:
+                response = self.ai.responder(command)
+            else:
+                response = self.respond_and_speak(command)
+        
+        if self.recorder is not None:
+            self.recorder.end_turn(response, time.perf_counter() - start)
         
         if response:
             # Mostra a resposta
             print(f"🤖 Mirai: {response}")
-            
-            # Se não for modo texto apenas, fala a resposta
-            if not text_only:
-                print("🎤 Falando...")
-                self.tts.speak(response)
         else:
             error_msg = "Desculpe, não consegui processar isso."
             print(f"⚠️  {error_msg}")
             if not text_only:
-                self.tts.speak(error_msg)
+                self.tts.speak(normalizar_texto(error_msg, self.tts.lexicon))
+    
+    def open_app(self, command, text_only=False):
+        """
+        Abre um aplicativo sem passar pelo LLM ("abre o spotify")
+        
+        Returns:
+            Texto da resposta, ou None se o comando não for para abrir um aplicativo conhecido
+        """
+        if self.app_replay is not None:
+            return self.replay_app(command, text_only)
+        if self.apps is None:
+            return None
+        match = ABRIR_APLICATIVO.match(command.strip())
+        if not match:
+            return None
+        
+        spoken = match.group(1)
+        app, score = self.apps.resolve(spoken)
+        if app is None:
+            print(f"🔍 Nenhum aplicativo parecido com '{spoken}' (melhor: {score:.2f})")
+            return None
+        
+        # Casamento incerto ("inicia o stream" -> Steam): pergunta antes de abrir
+        question = None
+        if self.apps.needs_confirmation(score):
+            question = f"Quer que eu abra o {app['name']}?"
+            print(f"🤔 {question} (similaridade {score:.2f})")
+            if text_only:
+                answer = input("Sim/não: ")
+            else:
+                self.tts.speak(normalizar_texto(question, self.tts.lexicon))
+                answer = self.listener.listen_single_command(device_index=self.mic_index())
+            if not answer or NEGACAO.search(answer) or not CONFIRMACAO.search(answer):
+                response = "Tudo bem, não vou abrir."
+                self.record_app(command, app, question, response)
+                if not text_only:
+                    self.tts.speak(normalizar_texto(response, self.tts.lexicon))
+                return response
+        
+        print(f"🚀 Abrindo {app['name']} (similaridade {score:.2f})")
+        try:
+            self.apps.launch(app)
+        except Exception as e:
+            print(f"❌ Erro ao abrir aplicativo: {e}")
+            self.record_app(command, app, question, None)
+            return None
+        
+        response = f"Hai! Abrindo {app['name']}."
+        self.record_app(command, app, question, response)
+        if not text_only:
+            self.tts.speak(normalizar_texto(response, self.tts.lexicon))
+        return response
+    
+    def record_app(self, command, app, question, response):
+        """Grava o desfecho de "abre o ..." (o replay não abre nada nem pergunta de novo)"""
+        if self.recorder is not None:
+            self.recorder.record_app(command, app["name"], question, response)
+    
+    def replay_app(self, command, text_only=False):
+        """Desfecho gravado de "abre o ...", falado como na sessão original (None: segue para o LLM)"""
+        outcome = self.app_replay.take(command)
+        if outcome is None:
+            return None
+        self.record_app(command, {"name": outcome["app"]}, outcome["question"], outcome["response"])
+        if not text_only:
+            for text in (outcome["question"], outcome["response"]):
+                if text:
+                    self.tts.speak(normalizar_texto(text, self.tts.lexicon))
+        return outcome["response"]
+    
+    def ask_screen(self, command, text_only=False):
+        """Responde perguntas sobre a tela com o modelo de visão (ver tela.py)"""
+        print("🖥️  Olhando a tela...")
+        try:
+            response = self.screen.ask(command)
+        except Exception as e:
+            print(f"❌ Erro ao analisar a tela: {e}")
+            return None
+        
+        if not text_only:
+            self.tts.speak(normalizar_texto(response, self.tts.lexicon))
+        return response
+    
+    def respond_and_speak(self, command):
+        """
+        Gera a resposta em streaming e fala cada frase assim que fica completa
+        
+        Returns:
+            Texto da resposta (para exibição)
+        """
+        frases = queue.Queue()
+        normalizer = MiraiTextNormalizer(self.tts.lexicon)
+        tag_parser = MiraiTagParser()
+        
+        # Tags de expressão ficam presas à próxima frase que for completada
+        sentence_tags = {}
+        pending_tags = []
+        sentence_count = 0
+        
+        def enqueue(frase):
+            nonlocal sentence_count
+            if pending_tags:
+                sentence_tags[sentence_count] = list(pending_tags)
+                pending_tags.clear()
+            frases.put(frase)
+            sentence_count += 1
+        
+        def on_chunk(piece):
+            for kind, value in tag_parser.feed(piece):
+                if kind == "tag":
+                    pending_tags.append(value)
+                else:
+                    for frase in normalizer.feed(value):
+                        enqueue(frase)
+        
+        def on_sentence_start(index, dac_offset):
+            if index == 0 and self.acks is not None:
+                self.acks.on_reply_start(dac_offset)
+            # Troca a expressão exatamente quando a frase começa a tocar
+            if self.expressions is not None:
+                for tag in sentence_tags.get(index, []):
+                    self.expressions.dispatch(tag, dac_offset)
+        
+        fala = threading.Thread(
+            target=self.tts.speak_sentences,
+            args=(iter(frases.get, None),),
+            kwargs={"on_start": on_sentence_start},
+            daemon=True
+        )
+        fala.start()
+        
+        response = None
+        try:
+            response = self.ai.responder(command, on_chunk=on_chunk)
+            stats = self.ai.last_turn_stats
+            
+            if stats is None:
+                # Respostas fixas (erro, entrada vazia) não passam pelo stream
+                normalizer.reset()
+                if response:
+                    enqueue(normalizar_texto(response, self.tts.lexicon))
+            elif stats.get("trimmed"):
+                # Resposta cortada: o resto do buffer não será falado
+                normalizer.reset()
+            else:
+                for _, value in tag_parser.flush():
+                    for frase in normalizer.feed(value):
+                        enqueue(frase)
+                for frase in normalizer.flush():
+                    enqueue(frase)
+        finally:
+            frases.put(None)
+        
+        print("🎤 Falando...")
+        fala.join()
+        return response
     
     def audio_setup_wizard(self):
         """Assistente de configuração de áudio de saída"""
@@ -164,6 +553,7 @@ class MiraiAssistant:
                     if heard == 'S':
                         self.tts.select_audio_device(device['id'])
                         self.config["audio_device"] = device['id']
+                        self.config["audio_device_key"] = self.tts.selected_device_key
                         self.save_config()
                         print("✅ Dispositivo selecionado e salvo!")
                         return
@@ -210,7 +600,7 @@ class MiraiAssistant:
             try:
                 # Escuta um único comando
                 command = self.listener.listen_single_command(
-                    device_index=self.config.get("mic_device")
+                    device_index=self.mic_index()
                 )
                 
                 if command and self.active:
@@ -237,7 +627,7 @@ class MiraiAssistant:
             try:
                 # Aguarda wake word
                 command = self.listener.listen_for_wake_word(
-                    device_index=self.config.get("mic_device"),
+                    device_index=self.mic_index(),
                     timeout=30
                 )
                 
@@ -277,6 +667,7 @@ class MiraiAssistant:
             elif choice == "2":
                 if self.tts.select_audio_device():
                     self.config["audio_device"] = self.tts.selected_device
+                    self.config["audio_device_key"] = self.tts.selected_device_key
                     self.save_config()
             
             elif choice == "3":
@@ -284,6 +675,7 @@ class MiraiAssistant:
                     vol = float(input("Volume (0.0-2.0, padrão=1.0): ") or "1.0")
                     speed = float(input("Velocidade (0.5-2.0, padrão=1.1): ") or "1.1")
                     self.tts.set_voice_settings(vol, speed)
+                    self.ai.config["speech_rate"] = self.tts.speech_rate
                     self.config["volume"] = vol
                     self.config["speed"] = speed
                     self.save_config()
@@ -336,7 +728,7 @@ class MiraiAssistant:
         print("Fale algo por 3 segundos...")
         
         try:
-            with sr.Microphone(device_index=self.config.get("mic_device")) as source:
+            with self.listener.microphone(self.mic_index()) as source:
                 self.listener.adjust_for_noise(source, duration=1)
                 
                 print("🎤 Gravando...")
@@ -352,31 +744,41 @@ class MiraiAssistant:
         except Exception as e:
             print(f"❌ Erro ao testar microfone: {e}")
     
+    def mic_index(self):
+        """Índice atual do microfone salvo (None = padrão, inclusive se foi desconectado)"""
+        return self.devices.resolve(
+            self.config.get("mic_device_key"), self.config.get("mic_device"), kind=ENTRADA
+        )
+    
     def select_microphone(self):
         """Seleciona o microfone"""
         print("\n🎤 Seleção de microfone")
         
         try:
-            mics = sr.Microphone.list_microphone_names()
+            mics = self.devices.inputs()
             
             if not mics:
                 print("❌ Nenhum microfone encontrado!")
                 return
             
+            default = self.devices.default_index(ENTRADA)
             print("\n📋 Microfones disponíveis:")
-            for i, name in enumerate(mics):
-                default_mark = " (PADRÃO)" if i == 0 else ""
-                print(f"[{i}] {name}{default_mark}")
+            for mic in mics:
+                default_mark = " (PADRÃO)" if mic['index'] == default else ""
+                print(f"[{mic['index']}] {mic['name']} ({mic['hostapi']}){default_mark}")
             
             try:
                 choice = input("\nSelecione o número do microfone (Enter para padrão): ").strip()
                 
                 if choice == "":
                     self.config["mic_device"] = None
+                    self.config["mic_device_key"] = None
                     print("✅ Usando microfone padrão")
-                elif choice.isdigit() and 0 <= int(choice) < len(mics):
-                    self.config["mic_device"] = int(choice)
-                    print(f"✅ Microfone selecionado: {mics[int(choice)]}")
+                elif choice.isdigit() and any(mic['index'] == int(choice) for mic in mics):
+                    mic = next(mic for mic in mics if mic['index'] == int(choice))
+                    self.config["mic_device"] = mic['index']
+                    self.config["mic_device_key"] = mic['key']
+                    print(f"✅ Microfone selecionado: {mic['name']}")
                 else:
                     print("❌ Opção inválida")
                     return
@@ -481,7 +883,7 @@ class MiraiAssistant:
         """Executa a assistente"""
         # Verificação inicial de áudio
         print("🔊 Verificando sistema de áudio...")
-        if not self.tts.audio_devices:
+        if self.tts.registry.ready and not self.tts.audio_devices:
             print("⚠️  Nenhum dispositivo de áudio encontrado!")
             print("💡 A funcionalidade de voz pode não funcionar corretamente.")
         
@@ -516,6 +918,9 @@ class MiraiAssistant:
                 continue
             except Exception as e:
                 print(f"❌ Erro: {e}")
+        
+        # Grava o que ainda está na fila da memória
+        self.close()
 
 # Função principal simplificada
 def main():
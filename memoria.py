@@ -0,0 +1,382 @@
+"""
+Memória de longo prazo da Mirai
+Guarda todas as mensagens em SQLite (modo WAL) com índice FTS5, para que
+conversas antigas relevantes possam voltar ao prompt. As escritas são feitas
+em lotes por uma thread própria, fora do caminho da resposta.
+"""
+import os
+import re
+import math
+import time
+import queue
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+BANCO_PADRAO = "mirai_memoria.db"
+
+# Palavras curtas demais ou comuns demais para buscar
+PALAVRAS_VAZIAS = {
+    "que", "com", "para", "por", "uma", "uns", "umas", "dos", "das", "nos", "nas",
+    "mas", "mais", "como", "qual", "quais", "isso", "esse", "essa", "este", "esta",
+    "você", "voce", "meu", "minha", "seu", "sua", "ela", "ele", "eles", "elas",
+    "tem", "ter", "foi", "ser", "está", "esta", "são", "sao", "não", "nao", "sim",
+    "mirai", "aqui", "agora", "quando", "onde", "muito", "também", "tambem", "lembra",
+}
+TERMO = re.compile(r'\w{3,}')
+# Atalho para os acentos do português (o resto passa pelo unicodedata)
+ACENTOS = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüçñ", "aaaaaeeeeiiiiooooouuuucn")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content='messages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+def _conectar(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # WAL + NORMAL: sem fsync por transação
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+def _sem_acentos(texto):
+    """Mesma normalização do tokenizer unicode61 remove_diacritics"""
+    texto = texto.lower().translate(ACENTOS)
+    if texto.isascii():
+        return texto
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def termos_de_busca(texto, max_terms=8):
+    """
+    Extrai os termos úteis da fala do usuário para a busca FTS5
+
+    Returns:
+        list: Termos sem acento, sem repetição e sem palavras vazias
+    """
+    termos = []
+    for termo in TERMO.findall(texto.lower()):
+        if termo in PALAVRAS_VAZIAS:
+            continue
+        termo = _sem_acentos(termo)
+        if termo not in termos:
+            termos.append(termo)
+    return termos[:max_terms]
+
+
+def _bm25(content, idf, k1=1.2, b=0.75, avg_len=20.0):
+    """
+    Pontuação BM25 de uma mensagem para os termos buscados
+
+    Conta palavras inteiras, como o FTS5 ("ana" não casa com "banana").
+    """
+    palavras = re.findall(r'\w+', _sem_acentos(content))
+    frequencias = Counter(palavras)
+    norm = k1 * (1.0 - b + b * len(palavras) / avg_len)
+    score = 0.0
+    for termo, peso in idf.items():
+        tf = frequencias.get(termo, 0)
+        if tf:
+            score += peso * tf * (k1 + 1.0) / (tf + norm)
+    return score
+
+
+class MiraiMemoryStore:
+    def __init__(self, path=BANCO_PADRAO, batch_size=64, flush_interval=0.5, candidates=32,
+                 df_ttl=300.0):
+        """
+        Armazena a conversa em disco e busca trechos antigos relevantes
+
+        Args:
+            path: Arquivo SQLite (":memory:" não é suportado, o WAL precisa de arquivo)
+            batch_size: Mensagens por transação de escrita
+            flush_interval: Segundos máximos que uma mensagem espera na fila
+            candidates: Mensagens por termo que entram no ranking (todas, para termos raros)
+            df_ttl: Segundos que a frequência de cada termo fica em cache
+        """
+        self.path = path
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._writer = _conectar(path)
+        self._writer.executescript(ESQUEMA)
+        # Mescla segmentos do FTS aos poucos: custo de escrita limitado conforme o índice cresce
+        self._writer.execute("INSERT INTO messages_fts(messages_fts, rank) VALUES('automerge', 8)")
+        self._writer.commit()
+
+        self._reader = _conectar(path)
+        self._reader.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS temp.messages_vocab USING fts5vocab(main, 'messages_fts', 'row')"
+        )
+        self._read_lock = threading.Lock()
+        self.df_ttl = df_ttl
+        self._df = {}
+
+        self._pending = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+        self.metrics = {"writes": 0, "batches": 0, "searches": 0, "search_time": 0.0}
+
+    def append(self, role, content, created=None):
+        """Enfileira uma mensagem (não bloqueia)"""
+        if content:
+            self._pending.put((role, content, created or time.time()))
+
+    def _writer_loop(self):
+        while self._running or not self._pending.empty():
+            try:
+                first = self._pending.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            markers = [item for item in batch if isinstance(item, threading.Event)]
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                try:
+                    with self._writer:
+                        self._writer.executemany(
+                            "INSERT INTO messages(role, content, created) VALUES (?, ?, ?)", rows
+                        )
+                    self.metrics["writes"] += len(rows)
+                    self.metrics["batches"] += 1
+                except sqlite3.Error as e:
+                    print(f"❌ Erro ao gravar memória: {e}")
+            for marker in markers:
+                marker.set()
+
+    def flush(self, timeout=5.0):
+        """Espera as mensagens enfileiradas serem gravadas"""
+        marker = threading.Event()
+        self._pending.put(marker)
+        return marker.wait(timeout)
+
+    def recent(self, limit=16):
+        """
+        Últimas mensagens em ordem cronológica (para restaurar o histórico)
+
+        Returns:
+            list: [{"role": ..., "content": ...}]
+        """
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT role, content FROM messages ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def search(self, texto, limit=3, exclude_recent=0):
+        """
+        Busca mensagens antigas relacionadas ao texto (FTS5 + BM25)
+
+        Args:
+            texto: Fala atual do usuário
+            limit: Máximo de resultados
+            exclude_recent: Ignora as N mensagens mais novas (já estão no histórico)
+
+        Returns:
+            list: [{"id", "role", "content", "created"}] do mais relevante ao menos
+        """
+        termos = termos_de_busca(texto)
+        if not termos:
+            return []
+
+        start = time.perf_counter()
+        with self._read_lock:
+            try:
+                total = self._reader.execute("SELECT coalesce(max(id), 0) FROM messages").fetchone()[0]
+                idf = {termo: self._idf(termo, total) for termo in termos}
+                # Candidatos por termo, do mais raro ao mais comum: a lista de um termo raro
+                # cabe inteira (um fato antigo e específico sempre entra); termos comuns
+                # contribuem só com as mensagens mais novas. O custo fica limitado a
+                # termos x candidatos, sem percorrer as listas longas como o bm25() do FTS5
+                ids = set()
+                for termo in sorted(termos, key=idf.get, reverse=True):
+                    ids.update(row[0] for row in self._reader.execute(
+                        """
+                        SELECT rowid FROM messages_fts
+                        WHERE messages_fts MATCH ? AND rowid <= ?
+                        ORDER BY rowid DESC
+                        LIMIT ?
+                        """,
+                        (f'"{termo}"', total - exclude_recent, self.candidates)
+                    ))
+                rows = self._reader.execute(
+                    f"SELECT id, role, content, created FROM messages WHERE id IN ({','.join('?' * len(ids))})",
+                    tuple(ids)
+                ).fetchall() if ids else []
+            except sqlite3.Error as e:
+                print(f"⚠️  Erro na busca de memória: {e}")
+                rows = []
+                idf = {}
+
+        resultados = sorted(rows, key=lambda r: _bm25(r[2], idf), reverse=True)[:limit]
+
+        self.metrics["searches"] += 1
+        self.metrics["search_time"] += time.perf_counter() - start
+        return [{"id": r[0], "role": r[1], "content": r[2], "created": r[3]} for r in resultados]
+
+    def _idf(self, termo, total):
+        """IDF do termo, com a frequência de documentos em cache (muda devagar)"""
+        agora = time.monotonic()
+        cached = self._df.get(termo)
+        if cached is None or agora - cached[1] > self.df_ttl:
+            row = self._reader.execute(
+                "SELECT doc FROM temp.messages_vocab WHERE term = ?", (termo,)
+            ).fetchone()
+            cached = (row[0] if row else 0, agora)
+            self._df[termo] = cached
+        df = cached[0]
+        return math.log(1.0 + (total - df + 0.5) / (df + 0.5))
+
+    def count(self):
+        """Total de mensagens gravadas"""
+        with self._read_lock:
+            return self._reader.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    def optimize(self):
+        """Compacta o índice FTS e faz checkpoint do WAL (rodar em momentos ociosos)"""
+        self.flush()
+        with self._writer:
+            self._writer.execute("INSERT INTO messages_fts(messages_fts) VALUES('optimize')")
+        self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_metrics(self):
+        """Métricas de escrita e busca"""
+        buscas = self.metrics["searches"]
+        return dict(
+            self.metrics,
+            pending=self._pending.qsize(),
+            avg_search_ms=(self.metrics["search_time"] / buscas * 1000) if buscas else 0.0
+        )
+
+    def close(self):
+        """Grava o que falta e fecha o banco"""
+        if not self._running:
+            return
+        self.flush()
+        self._running = False
+        self._thread.join(timeout=5.0)
+        self._writer.close()
+        self._reader.close()
+
+
+def _tamanho_em_disco(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def benchmark(total=1_000_000, checkpoints=(10_000, 100_000, 1_000_000), path="benchmark_memoria.db"):
+    """Cresce o banco até `total` mensagens medindo escrita, tamanho e latência de busca"""
+    import random
+
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+    random.seed(42)
+    vocab = [f"palavra{i}" for i in range(20000)]
+    temas = ["genshin", "raiden", "furina", "nahida", "pokemon", "pikachu", "starrail", "kafka",
+             "trabalho", "faculdade", "pizza", "chuva", "música", "anime", "viagem"]
+    consultas = ["Qual meu personagem favorito do Genshin?", "Lembra da Furina?",
+                 "Quero jogar Pokemon hoje", "O que eu falei sobre a faculdade?",
+                 "Vamos pedir pizza de novo?"]
+
+    store = MiraiMemoryStore(path, batch_size=512)
+
+    print("\n📊 Benchmark da memória (SQLite WAL + FTS5)")
+    print("="*60)
+    inseridas = 0
+    bytes_texto = 0
+    start = time.perf_counter()
+    for alvo in checkpoints:
+        if alvo > total:
+            break
+        while inseridas < alvo:
+            palavras = random.choices(vocab, k=random.randint(6, 20)) + [random.choice(temas)]
+            random.shuffle(palavras)
+            texto = " ".join(palavras)
+            bytes_texto += len(texto.encode())
+            store.append("user" if inseridas % 2 == 0 else "assistant", texto)
+            inseridas += 1
+        store.flush(timeout=600)
+        elapsed = time.perf_counter() - start
+
+        latencias = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            store.search(random.choice(consultas), limit=3, exclude_recent=16)
+            latencias.append((time.perf_counter() - t0) * 1000)
+        latencias.sort()
+
+        disco = _tamanho_em_disco(path)
+        print(f"  {inseridas:>9,} msgs | {inseridas / elapsed:8.0f} msgs/s | "
+              f"{disco / bytes_texto:4.1f}x bytes em disco/texto | "
+              f"busca p50 {latencias[len(latencias) // 2]:.3f} ms p99 {latencias[int(len(latencias) * 0.99)]:.3f} ms")
+
+    store.optimize()
+    print(f"  Após optimize: {_tamanho_em_disco(path) / bytes_texto:.1f}x bytes em disco/texto")
+    metrics = store.get_metrics()
+    print(f"  {metrics['writes']:,} mensagens em {metrics['batches']:,} transações")
+    store.close()
+    print("="*60)
+
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def teste_relevancia(path="teste_memoria.db", genericas=500):
+    """Um fato antigo e específico precisa vencer muitas mensagens recentes genéricas"""
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+    store = MiraiMemoryStore(path, candidates=32)
+    store.append("user", "Meu personagem favorito do Genshin é a Furina, ela é incrível")
+    for i in range(genericas):
+        store.append("user", f"Hoje joguei Genshin de novo, o personagem {i} é legal")
+    store.flush()
+    resultados = store.search("Qual é meu personagem favorito do Genshin?", limit=3)
+    store.close()
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+    assert resultados and "Furina" in resultados[0]["content"], resultados
+    assert _bm25("banana", {"ana": 1.0}) == 0.0
+    print(f"✅ Fato antigo encontrado entre {genericas} mensagens recentes: {resultados[0]['content']}")
+
+
+# Teste direto
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "teste":
+        teste_relevancia()
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
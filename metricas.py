@@ -0,0 +1,358 @@
+"""
+Métricas no formato do Prometheus, compartilhadas por todos os módulos da MIRAI
+
+- Contadores e histogramas sem lock no caminho quente: cada thread escreve
+  só na sua fatia (shard); a leitura soma as fatias na hora da coleta
+- Histogramas com buckets fixos definidos na criação
+- Gauges calculados na coleta (RSS, threads do torch, profundidade de filas)
+- Endpoint HTTP /metrics servido por uma thread em segundo plano
+
+Uso:
+    from metricas import metrics, WAKE_HITS, stage_timer
+    WAKE_HITS.inc()
+    with stage_timer("asr"):
+        ...
+"""
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORTA_PADRAO = 9464
+
+# Buckets em segundos: de 5 ms (callback de áudio) a 30 s (resposta longa do LLM)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _formatar_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class _Shards:
+    """
+    Uma lista de valores por thread; só a própria thread escreve nela
+
+    A fatia de uma thread que terminou é somada à base e descartada (na coleta
+    ou quando outra thread chega), então threads de vida curta (síntese, corridas
+    do hedging) não acumulam fatias para sempre.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._all = []  # (thread, fatia)
+        self._base = [0] * size  # Soma das fatias de threads encerradas
+        self._lock = threading.Lock()  # Só no primeiro uso de cada thread
+
+    def mine(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0] * self.size
+            with self._lock:
+                self._fold()
+                self._all.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    def _fold(self):
+        """Soma à base as fatias de threads encerradas (chamar com o lock)"""
+        alive = []
+        for thread, shard in self._all:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for i in range(self.size):
+                    self._base[i] += shard[i]
+        self._all = alive
+
+    def total(self):
+        with self._lock:
+            self._fold()
+            totals = list(self._base)
+            shards = [shard for _, shard in self._all]
+        return [totals[i] + sum(shard[i] for shard in shards) for i in range(self.size)]
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_pairs = tuple(labels)
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.mine()[0] += amount
+
+    def value(self):
+        return self._shards.total()[0]
+
+    def collect(self):
+        yield f"{self.name}{_formatar_labels(self.label_pairs)} {self.value()}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=BUCKETS_SEGUNDOS, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_pairs = tuple(labels)
+        # [contagem por bucket..., +Inf, soma]
+        self._shards = _Shards(len(self.buckets) + 2)
+
+    def observe(self, value):
+        shard = self._shards.mine()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """Contagens acumuladas por bucket, total e soma"""
+        totals = self._shards.total()
+        counts = totals[:-1]
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+    def collect(self):
+        cumulative, count, total = self.snapshot()
+        for bound, value in zip(self.buckets + (float("inf"),), cumulative):
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{self.name}_bucket{_formatar_labels(self.label_pairs + (('le', le),))} {value}"
+        yield f"{self.name}_sum{_formatar_labels(self.label_pairs)} {total}"
+        yield f"{self.name}_count{_formatar_labels(self.label_pairs)} {count}"
+
+
+class Gauge:
+    def __init__(self, name, help_text, fn=None, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_pairs = tuple(labels)
+        self.fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def collect(self):
+        yield f"{self.name}{_formatar_labels(self.label_pairs)} {self.value()}"
+
+
+class _Familia:
+    """Métricas com o mesmo nome e labels diferentes (ex: stage="asr")"""
+
+    def __init__(self, kind, factory, name, help_text):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._factory(key)
+                    self._children[key] = child
+        return child
+
+    def collect(self):
+        for child in list(self._children.values()):
+            yield from child.collect()
+
+
+class MiraiMetrics:
+    def __init__(self):
+        """Registro central de métricas"""
+        self._families = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _register(self, kind, name, help_text, factory):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = _Familia(kind, factory, name, help_text)
+                self._families[name] = family
+        return family
+
+    def counter(self, name, help_text, **labels):
+        family = self._register("counter", name, help_text, lambda key: Counter(name, help_text, key))
+        return family.labels(**labels)
+
+    def histogram(self, name, help_text, buckets=BUCKETS_SEGUNDOS, **labels):
+        family = self._register("histogram", name, help_text,
+                                lambda key: Histogram(name, help_text, buckets, key))
+        return family.labels(**labels)
+
+    def histogram_family(self, name, help_text, buckets=BUCKETS_SEGUNDOS):
+        """Família de histogramas para usar com .labels(...)"""
+        return self._register("histogram", name, help_text,
+                              lambda key: Histogram(name, help_text, buckets, key))
+
+    def gauge(self, name, help_text, fn=None, **labels):
+        """Gauge com valor fixo (set) ou calculado na coleta (fn)"""
+        family = self._register("gauge", name, help_text, lambda key: Gauge(name, help_text, fn, key))
+        gauge = family.labels(**labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus"""
+        linhas = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            linhas.append(f"# HELP {family.name} {family.help}")
+            linhas.append(f"# TYPE {family.name} {family.kind}")
+            linhas.extend(family.collect())
+        return "\n".join(linhas) + "\n"
+
+    def serve(self, port=PORTA_PADRAO, host="127.0.0.1"):
+        """Sobe o endpoint /metrics numa thread em segundo plano"""
+        if self._server is not None:
+            return self._server
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Métricas em http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def rss_bytes():
+    """Memória residente do processo"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Pico de memória (ru_maxrss em KB no Linux, bytes no macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def torch_threads():
+    """Threads intra-op do torch (0 se o torch não foi carregado neste processo)"""
+    torch = sys.modules.get("torch")
+    return torch.get_num_threads() if torch is not None else 0
+
+
+# Registro global
+metrics = MiraiMetrics()
+
+# Escuta
+WAKE_HITS = metrics.counter("mirai_wake_word_hits_total", "Palavras de ativação detectadas")
+WAKE_MISSES = metrics.counter("mirai_wake_word_misses_total", "Frases ouvidas sem palavra de ativação")
+ASR_ERRORS = metrics.counter("mirai_asr_errors_total", "Falhas de reconhecimento de fala")
+
+# LLM
+OLLAMA_FAILURES = metrics.counter("mirai_ollama_failures_total", "Requisições ao Ollama que falharam")
+OLLAMA_FAILOVERS = metrics.counter("mirai_ollama_failovers_total", "Requisições atendidas por um backend reserva")
+
+# Fala
+TTS_UNDERRUNS = metrics.counter("mirai_tts_underruns_total", "Blocos de silêncio tocados no meio de uma fala")
+
+# Duração de cada etapa do pipeline (stage="asr", "llm", "tts", "turn", ...)
+STAGE_SECONDS = metrics.histogram_family("mirai_stage_seconds", "Duração de cada etapa do pipeline")
+
+metrics.gauge("mirai_process_rss_bytes", "Memória residente do processo", fn=rss_bytes)
+metrics.gauge("mirai_torch_threads", "Threads intra-op do torch", fn=torch_threads)
+metrics.gauge("mirai_python_threads", "Threads Python ativas", fn=threading.active_count)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Mede um bloco e registra em mirai_stage_seconds{stage=...}"""
+    histogram = STAGE_SECONDS.labels(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+def benchmark(n=1_000_000):
+    """Custo por incremento/observação no caminho quente"""
+    counter = metrics.counter("mirai_benchmark_total", "Contador de benchmark")
+    histogram = metrics.histogram("mirai_benchmark_seconds", "Histograma de benchmark")
+
+    start = time.perf_counter()
+    for _ in range(n):
+        counter.inc()
+    inc_ns = (time.perf_counter() - start) / n * 1e9
+
+    start = time.perf_counter()
+    for i in range(n):
+        histogram.observe((i % 1000) / 1000.0)
+    observe_ns = (time.perf_counter() - start) / n * 1e9
+
+    start = time.perf_counter()
+    body = metrics.render()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    print(f"⏱️  inc(): {inc_ns:.0f} ns, observe(): {observe_ns:.0f} ns, coleta: {render_ms:.2f} ms "
+          f"({len(body)} bytes)")
+
+
+# Teste direto
+if __name__ == "__main__":
+    benchmark()
+    metrics.serve()
+    print("Ctrl+C para sair")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,394 @@
+"""
+Ciclo de vida dos modelos em memória (modo de pouca memória)
+
+Cada modelo registrado (TTS, ASR...) guarda o horário do último uso; uma
+thread em segundo plano descarrega os que passaram do TTL sem uso. O próximo
+uso recarrega (ou a palavra de ativação já dispara o recarregamento antes).
+
+Pesos torch são descarregados para um arquivo safetensors em cache e voltam
+mapeados em memória (mmap): recarregar é abrir o arquivo, sem reconstruir o
+modelo nem ler o checkpoint original de novo.
+
+Uso:
+    python modelos.py [--ttl 5]   # RSS e latência de recarga da voz
+"""
+import os
+import gc
+import re
+import sys
+import glob
+import hashlib
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from metricas import metrics, rss_bytes
+
+CACHE_DIR = "models/cache"
+
+RELOAD_SECONDS = metrics.histogram_family("mirai_model_reload_seconds", "Tempo para recarregar um modelo descarregado")
+
+
+def liberar_memoria():
+    """Coleta o lixo e devolve ao sistema a memória livre do heap (glibc)"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def arquivo_cache(name, sources=(), cache_dir=CACHE_DIR):
+    """
+    Caminho do cache de pesos de um modelo (ex: tts_models/pt/cv/vits)
+
+    Args:
+        sources: Checkpoints de origem; caminho, tamanho e mtime entram no nome,
+            então um modelo baixado de novo não reaproveita o cache antigo
+    """
+    digest = hashlib.sha1()
+    for source in sources:
+        if source and os.path.exists(source):
+            st = os.stat(source)
+            digest.update(f"{os.path.abspath(source)}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    base = re.sub(r"[^\w.-]+", "_", name)
+    return os.path.join(cache_dir, f"{base}-{digest.hexdigest()[:12]}.safetensors")
+
+
+def _remover_caches_antigos(path):
+    """Apaga os caches do mesmo modelo gerados de checkpoints anteriores"""
+    prefix = path[:-len("-000000000000.safetensors")]
+    padrao = re.compile(re.escape(prefix) + r"-[0-9a-f]{12}\.safetensors")
+    for antigo in glob.glob(glob.escape(prefix) + "-*.safetensors"):
+        if antigo != path and padrao.fullmatch(antigo):
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+
+class MiraiOffloadedWeights:
+    def __init__(self, modules, path):
+        """
+        Pesos torch que podem sair da memória e voltar mapeados de um arquivo
+
+        O esqueleto dos módulos continua vivo; só os tensores são trocados.
+
+        Args:
+            modules: {"prefixo": torch.nn.Module}
+            path: Arquivo de cache (ver arquivo_cache)
+        """
+        self.path = path
+        # (submódulo, atributo, chave no arquivo); pesos compartilhados repetem a chave.
+        # Guardado agora: depois de descarregar, os tensores vazios não distinguem mais quem é quem
+        self._entries = []
+        self._shapes = {}  # chave -> (formato, dtype) esperados no arquivo
+        seen = {}
+        for prefix, module in modules.items():
+            for name, sub in module.named_modules():
+                for attr, tensor in list(sub._parameters.items()) + list(sub._buffers.items()):
+                    if tensor is None:
+                        continue
+                    key = seen.setdefault((tensor.data_ptr(), tuple(tensor.shape), tensor.dtype),
+                                          ".".join(part for part in (prefix, name, attr) if part))
+                    self._entries.append((sub, attr, key))
+                    self._shapes[key] = (tuple(tensor.shape), tensor.dtype)
+
+    def _cached_shapes(self):
+        """Formato de cada tensor do arquivo, sem ler os pesos (None se não existe ou não abre)"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            try:
+                from safetensors import safe_open
+            except ImportError:
+                import torch
+                state = torch.load(self.path, mmap=True, weights_only=True)
+                return {key: tuple(tensor.shape) for key, tensor in state.items()}
+            with safe_open(self.path, framework="pt") as f:
+                return {key: tuple(f.get_slice(key).get_shape()) for key in f.keys()}
+        except Exception:
+            return None
+
+    def _check(self, shapes):
+        """Erro se o arquivo não tiver exatamente os tensores do modelo vivo"""
+        if shapes is None:
+            raise ValueError(f"Cache de pesos ilegível: {self.path}")
+        for key, (shape, _) in self._shapes.items():
+            if shapes.get(key) != shape:
+                raise ValueError(f"Cache de pesos {self.path} não corresponde ao modelo: "
+                                 f"{key} {shapes.get(key)} != {shape}")
+
+    def unload(self):
+        """
+        Grava os pesos (safetensors, ou torch.save sem ele) e libera os tensores
+
+        Um arquivo já existente só é reaproveitado se tiver os mesmos formatos.
+        """
+        import torch
+
+        try:
+            self._check(self._cached_shapes())
+            current = True
+        except ValueError:
+            current = False
+
+        if not current:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            state = {}
+            for sub, attr, key in self._entries:
+                state.setdefault(key, getattr(sub, attr).detach().to("cpu").contiguous())
+            tmp = self.path + ".tmp"
+            try:
+                from safetensors.torch import save_file
+                save_file(state, tmp)
+            except ImportError:
+                torch.save(state, tmp)
+            os.replace(tmp, self.path)
+            _remover_caches_antigos(self.path)
+
+        for sub, attr, _ in self._entries:
+            tensor = getattr(sub, attr)
+            tensor.data = torch.empty(0, dtype=tensor.dtype, device=tensor.device)
+
+    def load(self, device="cpu"):
+        """
+        Devolve os pesos a partir do arquivo mapeado em memória
+
+        Raises:
+            ValueError: se o arquivo não corresponde ao modelo (nada é trocado)
+        """
+        import torch
+
+        try:
+            from safetensors.torch import load_file
+            state = load_file(self.path, device="cpu")
+        except ImportError:
+            state = torch.load(self.path, mmap=True, weights_only=True)
+
+        self._check({key: tuple(tensor.shape) for key, tensor in state.items()})
+        for key, (_, dtype) in self._shapes.items():
+            if state[key].dtype != dtype:
+                raise ValueError(f"Cache de pesos {self.path} não corresponde ao modelo: "
+                                 f"{key} {state[key].dtype} != {dtype}")
+
+        for sub, attr, key in self._entries:
+            tensor = state[key]
+            getattr(sub, attr).data = tensor.to(device) if device != "cpu" else tensor
+
+
+class _Modelo:
+    def __init__(self, name, load, unload, ttl):
+        self.name = name
+        self.load = load
+        self.unload = unload
+        self.ttl = ttl
+        self.loaded = True  # Registrado depois de carregado
+        self.busy = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.RLock()
+        self.stats = {"unloads": 0, "reloads": 0, "reload_ms": [], "freed_mb": []}
+
+
+class MiraiModelLifecycle:
+    def __init__(self, ttl=600.0, check_interval=10.0, history=8640):
+        """
+        Descarrega modelos ociosos e recarrega sob demanda
+
+        Args:
+            ttl: Segundos sem uso até descarregar (padrão de cada modelo)
+            check_interval: Intervalo da verificação (também a amostragem de RSS)
+            history: Amostras de RSS guardadas (8640 x 10 s = 24 h)
+        """
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._models = {}
+        self._rss = deque(maxlen=history)  # (time.time(), rss, modelos carregados)
+        self._running = False
+        self._thread = None
+
+    def register(self, name, load, unload, ttl=None):
+        """
+        Registra um modelo já carregado
+
+        Args:
+            load: Função que recarrega o modelo
+            unload: Função que libera a memória do modelo
+            ttl: Segundos sem uso até descarregar (None = padrão do gerenciador, 0 = nunca)
+        """
+        model = _Modelo(name, load, unload, self.ttl if ttl is None else ttl)
+        self._models[name] = model
+        metrics.gauge("mirai_model_loaded", "Modelo residente na memória (1) ou descarregado (0)",
+                      fn=lambda: 1.0 if model.loaded else 0.0, model=name)
+        return model
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while self._running:
+            self.sample()
+            self.unload_idle()
+            time.sleep(self.check_interval)
+
+    def sample(self):
+        self._rss.append((time.time(), rss_bytes(), tuple(m.name for m in self._models.values() if m.loaded)))
+
+    def _ensure(self, model):
+        """Recarrega se preciso (chamado com o lock do modelo)"""
+        if model.loaded:
+            return
+        start = time.perf_counter()
+        model.load()
+        seconds = time.perf_counter() - start
+        model.loaded = True
+        model.stats["reloads"] += 1
+        model.stats["reload_ms"].append(seconds * 1000)
+        RELOAD_SECONDS.labels(model=model.name).observe(seconds)
+        print(f"♻️  {model.name} recarregado em {seconds * 1000:.0f} ms")
+
+    @contextmanager
+    def use(self, name):
+        """Garante o modelo carregado durante o bloco (não é descarregado no meio do uso)"""
+        model = self._models.get(name)
+        if model is None:
+            yield
+            return
+        with model.lock:
+            self._ensure(model)
+            model.busy += 1
+        try:
+            yield
+        finally:
+            with model.lock:
+                model.busy -= 1
+                model.last_used = time.monotonic()
+
+    def prewarm(self, *names):
+        """Recarrega em segundo plano (ex: logo depois da palavra de ativação)"""
+        for name in names or list(self._models):
+            model = self._models.get(name)
+            if model is not None and not model.loaded:
+                threading.Thread(target=self._prewarm, args=(model,), daemon=True).start()
+
+    def _prewarm(self, model):
+        try:
+            with model.lock:
+                self._ensure(model)
+                model.last_used = time.monotonic()
+        except Exception as e:
+            print(f"⚠️  Erro ao recarregar {model.name}: {e}")
+
+    def unload_idle(self, force=False):
+        """
+        Descarrega os modelos ociosos há mais que o TTL
+
+        Returns:
+            list: Nomes descarregados
+        """
+        unloaded = []
+        now = time.monotonic()
+        for model in list(self._models.values()):
+            if not model.loaded or model.busy or not (force or model.ttl):
+                continue
+            if not force and now - model.last_used < model.ttl:
+                continue
+            # Não espera: se alguém está usando, tenta na próxima verificação
+            if not model.lock.acquire(blocking=False):
+                continue
+            try:
+                if model.busy or not model.loaded:
+                    continue
+                before = rss_bytes()
+                model.unload()
+                liberar_memoria()
+                model.loaded = False
+                freed = (before - rss_bytes()) / 2**20
+                model.stats["unloads"] += 1
+                model.stats["freed_mb"].append(freed)
+                unloaded.append(model.name)
+                print(f"💤 {model.name} descarregado após {now - model.last_used:.0f}s sem uso "
+                      f"({freed:.0f} MB liberados)")
+            except Exception as e:
+                print(f"⚠️  Erro ao descarregar {model.name}: {e}")
+            finally:
+                model.lock.release()
+        if unloaded:
+            self.sample()
+        return unloaded
+
+    def report(self):
+        """RSS ao longo do tempo e custo de recarga de cada modelo"""
+        print("\n📊 Ciclo de vida dos modelos")
+        print("="*50)
+        if self._rss:
+            values = [rss for _, rss, _ in self._rss]
+            span = (self._rss[-1][0] - self._rss[0][0]) / 60
+            print(f"  RSS em {span:.0f} min: mín {min(values) / 2**20:.0f} MB, "
+                  f"máx {max(values) / 2**20:.0f} MB, atual {values[-1] / 2**20:.0f} MB")
+        for model in self._models.values():
+            stats = model.stats
+            reload_ms = stats["reload_ms"]
+            media = f"{sum(reload_ms) / len(reload_ms):.0f} ms" if reload_ms else "-"
+            liberado = f"{sum(stats['freed_mb']) / len(stats['freed_mb']):.0f} MB" if stats["freed_mb"] else "-"
+            estado = "carregado" if model.loaded else "descarregado"
+            print(f"  {model.name:<6} {estado:<13} TTL {model.ttl:.0f}s  descargas {stats['unloads']}  "
+                  f"recargas {stats['reloads']} (média {media})  liberado/descarga {liberado}")
+        print("="*50)
+
+    def stop(self):
+        self._running = False
+
+
+def benchmark(ttl=5.0, frase="Olá, eu sou a Mirai."):
+    """RSS com a voz carregada e descarregada, e o custo da primeira fala depois da recarga"""
+    from falar import MiraiTTS
+
+    def rss_mb():
+        return rss_bytes() / 2**20
+
+    print("\n📊 Benchmark do ciclo de vida da voz")
+    print("="*50)
+    base = rss_mb()
+    tts = MiraiTTS()
+    lifecycle = MiraiModelLifecycle(ttl=ttl, check_interval=1.0)
+    tts.attach_lifecycle(lifecycle)
+    lifecycle.start()
+
+    start = time.perf_counter()
+    tts.generate_speech(frase)
+    warm_ms = (time.perf_counter() - start) * 1000
+    loaded = rss_mb()
+
+    print(f"⏳ Esperando {ttl:.0f}s sem uso...")
+    while lifecycle._models["tts"].loaded:
+        time.sleep(0.5)
+    unloaded = rss_mb()
+
+    start = time.perf_counter()
+    tts.generate_speech(frase)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    print(f"  RSS: antes {base:.0f} MB, voz carregada {loaded:.0f} MB, descarregada {unloaded:.0f} MB")
+    print(f"  Fala com o modelo na memória: {warm_ms:.0f} ms; depois da recarga: {cold_ms:.0f} ms")
+    lifecycle.report()
+    lifecycle.stop()
+
+
+# Teste direto
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ciclo de vida dos modelos da Mirai")
+    parser.add_argument("--ttl", type=float, default=5.0)
+    args = parser.parse_args()
+    benchmark(args.ttl)
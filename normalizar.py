@@ -0,0 +1,317 @@
+"""
+Normalização de texto para o TTS
+Converte a resposta da IA em português fácil de pronunciar pela voz VITS:
+números, horários, abreviações e palavras japonesas romanizadas.
+Funciona em streaming: recebe pedaços de tokens e devolve frases completas.
+"""
+import re
+import time
+
+# Padrões pré-compilados (compilados uma única vez no import)
+ACOES = re.compile(r'\*[^*]*\*')
+TAGS = re.compile(r'\[[a-zà-ú_\- ]{1,20}\]', re.IGNORECASE)
+MARKDOWN = re.compile(r'[#_*`]')
+ESPACOS = re.compile(r'\s+')
+FIM_DE_FRASE = re.compile(r'[.!?…]+(?=\s|$)')
+FRASE_COMPLETA = re.compile(r'[.!?…]+\s')
+
+ABREVIACOES = {
+    "sr": "senhor", "sra": "senhora", "srta": "senhorita",
+    "dr": "doutor", "dra": "doutora", "prof": "professor",
+    "etc": "etcétera", "ex": "exemplo", "obs": "observação",
+    "aprox": "aproximadamente", "núm": "número", "pág": "página",
+}
+ABREVIACAO = re.compile(r'\b(' + '|'.join(ABREVIACOES) + r')\.', re.IGNORECASE)
+
+# Léxico: grafia que a voz em português pronuncia corretamente
+# Japonês romanizado da persona (fica na grafia original quando há voz japonesa, ver lexico_para)
+LEXICO_JAPONES = {
+    "hai": "rai",
+    "arigatō": "arigatô", "arigato": "arigatô",
+    "daijōbu": "daijôbu", "daijobu": "daijôbu",
+    "sugoi": "sugói",
+    "yappari": "iapári",
+    "wakarimashita": "uakarimáshita",
+    "gambatte": "gambáte", "ganbatte": "gambáte",
+    "konnichiwa": "konnitchiuá",
+    "gomen": "gomên", "nasai": "nassái",
+    "baka": "báka",
+    "kawaii": "kauái",
+    "ohayō": "oraiô", "ohayo": "oraiô",
+    "sayōnara": "saionára", "sayonara": "saionára",
+}
+LEXICO = {
+    **LEXICO_JAPONES,
+    # Abreviações de internet
+    "vc": "você", "vcs": "vocês",
+    "pq": "porque", "tb": "também", "tbm": "também",
+    "blz": "beleza", "vlw": "valeu", "msg": "mensagem",
+    # Nomes de jogos
+    "genshin": "guenshin",
+    "pokemon": "pokémon",
+}
+PALAVRA = re.compile(r'\b\w+\b')
+
+HORARIO = re.compile(r'\b([01]?\d|2[0-3])(?::|h)([0-5]\d)\b')
+HORA_CHEIA = re.compile(r'\b([01]?\d|2[0-3])h\b')
+PORCENTAGEM = re.compile(r'(\d+)\s?%')
+MOEDA = re.compile(r'R\$\s?(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d{2}))?')
+MILHAR = re.compile(r'\b\d{1,3}(?:\.\d{3})+\b')
+DECIMAL = re.compile(r'\b(\d+),(\d+)\b')
+ORDINAL = re.compile(r'\b(\d{1,2})([ºª])')
+NUMERO = re.compile(r'\d+')
+
+UNIDADES = [
+    "zero", "um", "dois", "três", "quatro", "cinco", "seis", "sete", "oito", "nove",
+    "dez", "onze", "doze", "treze", "quatorze", "quinze", "dezesseis", "dezessete",
+    "dezoito", "dezenove",
+]
+DEZENAS = ["", "", "vinte", "trinta", "quarenta", "cinquenta", "sessenta", "setenta", "oitenta", "noventa"]
+CENTENAS = ["", "cento", "duzentos", "trezentos", "quatrocentos", "quinhentos",
+            "seiscentos", "setecentos", "oitocentos", "novecentos"]
+ORDINAIS = ["", "primeir", "segund", "terceir", "quart", "quint", "sext", "sétim", "oitav", "non", "décim"]
+ESCALAS = [(10 ** 9, "bilhão", "bilhões"), (10 ** 6, "milhão", "milhões"), (1000, "mil", "mil")]
+
+
+def _ate_mil(n):
+    """Número entre 1 e 999 por extenso"""
+    if n == 100:
+        return "cem"
+    centena, resto = divmod(n, 100)
+    partes = []
+    if centena:
+        partes.append(CENTENAS[centena])
+    if resto:
+        if resto < 20:
+            partes.append(UNIDADES[resto])
+        else:
+            dezena, unidade = divmod(resto, 10)
+            partes.append(DEZENAS[dezena] + (f" e {UNIDADES[unidade]}" if unidade else ""))
+    return " e ".join(partes)
+
+
+def numero_por_extenso(n):
+    """
+    Escreve um inteiro por extenso em português
+
+    Exemplo: 1530 -> "mil quinhentos e trinta"
+    """
+    if n == 0:
+        return "zero"
+
+    partes = []
+    for valor, singular, plural in ESCALAS:
+        grupo, n = divmod(n, valor)
+        if grupo:
+            if valor == 1000 and grupo == 1:
+                partes.append("mil")
+            else:
+                partes.append(f"{numero_por_extenso(grupo)} {singular if grupo == 1 else plural}")
+
+    if n:
+        # "mil e vinte", "mil e quinhentos", mas "mil duzentos e trinta"
+        if partes and (n < 100 or n % 100 == 0):
+            return " ".join(partes) + " e " + _ate_mil(n)
+        partes.append(_ate_mil(n))
+
+    return " ".join(partes)
+
+
+def _feminino(extenso):
+    """Flexiona o final do número para o feminino (horas)"""
+    if extenso.endswith("um"):
+        return extenso[:-2] + "uma"
+    if extenso.endswith("dois"):
+        return extenso[:-4] + "duas"
+    return extenso
+
+
+def _horario(match):
+    horas = int(match.group(1))
+    minutos = int(match.group(2))
+    falado = _feminino(numero_por_extenso(horas))
+    if minutos == 0:
+        return f"{falado} {'hora' if horas == 1 else 'horas'}"
+    return f"{falado} e {numero_por_extenso(minutos)}"
+
+
+def _hora_cheia(match):
+    horas = int(match.group(1))
+    return f"{_feminino(numero_por_extenso(horas))} {'hora' if horas == 1 else 'horas'}"
+
+
+def _ordinal(match):
+    n = int(match.group(1))
+    final = "o" if match.group(2) == "º" else "a"
+    if 1 <= n <= 10:
+        return ORDINAIS[n] + final
+    return numero_por_extenso(n)
+
+
+def _numero(match):
+    digitos = match.group(0)
+    # Sequências longas (telefones, códigos) são lidas dígito a dígito
+    if len(digitos) > 12:
+        return " ".join(UNIDADES[int(d)] for d in digitos)
+    return numero_por_extenso(int(digitos))
+
+
+def _moeda(match):
+    reais = int(match.group(1).replace('.', ''))
+    text = f"{match.group(1)} {'real' if reais == 1 else 'reais'}"
+    centavos = int(match.group(2) or 0)
+    if centavos:
+        text += f" e {centavos} {'centavo' if centavos == 1 else 'centavos'}"
+    return text
+
+
+def _abreviacao(match):
+    return ABREVIACOES[match.group(1).lower()]
+
+
+def lexico_para(idiomas):
+    """
+    Léxico da voz principal conforme as vozes carregadas
+
+    Args:
+        idiomas: Idiomas com voz própria (ver MiraiTTS.languages)
+    """
+    if "ja" in idiomas:
+        return {k: v for k, v in LEXICO.items() if k not in LEXICO_JAPONES}
+    return LEXICO
+
+
+def _lexico(match, lexico=LEXICO):
+    palavra = match.group(0)
+    substituto = lexico.get(palavra.lower())
+    if substituto is None:
+        return palavra
+    # Preserva a maiúscula inicial
+    return substituto.capitalize() if palavra[0].isupper() else substituto
+
+
+def limpar_marcacoes(text):
+    """Remove ações entre asteriscos, tags de expressão, markdown e espaços extras"""
+    text = ACOES.sub('', text)
+    text = TAGS.sub('', text)
+    text = MARKDOWN.sub('', text)
+    text = ESPACOS.sub(' ', text)
+    return text.strip()
+
+
+def expandir_abreviacoes(text):
+    """Expande abreviações com ponto (antes de procurar fim de frase)"""
+    return ABREVIACAO.sub(_abreviacao, text)
+
+
+def numeros_por_extenso(text):
+    """Valores em reais, horários, porcentagens, ordinais e números por extenso"""
+    text = MOEDA.sub(_moeda, text)
+    text = HORARIO.sub(_horario, text)
+    text = HORA_CHEIA.sub(_hora_cheia, text)
+    text = MILHAR.sub(lambda m: m.group(0).replace('.', ''), text)
+    text = PORCENTAGEM.sub(lambda m: f"{m.group(1)} por cento", text)
+    text = DECIMAL.sub(lambda m: f"{m.group(1)} vírgula {m.group(2)}", text)
+    text = ORDINAL.sub(_ordinal, text)
+    return NUMERO.sub(_numero, text)
+
+
+def normalizar_frase(text, lexico=LEXICO):
+    """Normaliza uma frase completa para a voz em português"""
+    text = limpar_marcacoes(text)
+    text = expandir_abreviacoes(text)
+    text = numeros_por_extenso(text)
+    text = PALAVRA.sub(lambda m: _lexico(m, lexico), text)
+    return ESPACOS.sub(' ', text).strip()
+
+
+class MiraiTextNormalizer:
+    def __init__(self, lexico=LEXICO):
+        """
+        Normalizador incremental: recebe pedaços do stream do LLM
+        e devolve frases completas já normalizadas
+
+        Args:
+            lexico: Grafias de pronúncia (ver lexico_para)
+        """
+        self.buffer = ""
+        self.lexico = lexico
+
+    def feed(self, chunk):
+        """
+        Adiciona um pedaço de texto
+
+        Returns:
+            list: Frases completas e normalizadas prontas para o TTS
+        """
+        self.buffer = expandir_abreviacoes(self.buffer + chunk)
+
+        # Ações *...* ainda abertas seguram o texto até fecharem
+        limit = len(self.buffer)
+        fechado = ACOES.sub(lambda m: ' ' * len(m.group(0)), self.buffer)
+        aberto = fechado.find('*')
+        if aberto != -1:
+            limit = aberto
+
+        frases = []
+        inicio = 0
+        for match in FRASE_COMPLETA.finditer(self.buffer, 0, limit):
+            frase = normalizar_frase(self.buffer[inicio:match.end()], self.lexico)
+            if frase:
+                frases.append(frase)
+            inicio = match.end()
+
+        self.buffer = self.buffer[inicio:]
+        return frases
+
+    def flush(self):
+        """Devolve o texto restante como última frase"""
+        frase = normalizar_frase(self.buffer, self.lexico)
+        self.buffer = ""
+        return [frase] if frase else []
+
+    def reset(self):
+        """Descarta o texto pendente (ex: resposta cortada)"""
+        self.buffer = ""
+
+
+def normalizar_texto(text, lexico=LEXICO):
+    """Normaliza um texto inteiro (atalho para respostas não-streaming)"""
+    normalizer = MiraiTextNormalizer(lexico)
+    return " ".join(normalizer.feed(text) + normalizer.flush())
+
+
+def benchmark(repeticoes=2000):
+    """Mede a latência por pedaço de token do normalizador"""
+    resposta = (
+        "Hai! Agora são 15:30 e o Sr. Silva marcou às 16h. *sorri* Arigatō por perguntar! "
+        "Você já tem 1.250 primogemas, isso é 75% do que precisa para o 10º desejo. "
+        "Daijōbu? Gambatte, vc consegue!"
+    )
+    # Simula tokens de ~4 caracteres como no stream do Ollama
+    chunks = [resposta[i:i + 4] for i in range(0, len(resposta), 4)]
+
+    start = time.perf_counter()
+    for _ in range(repeticoes):
+        normalizer = MiraiTextNormalizer()
+        for chunk in chunks:
+            normalizer.feed(chunk)
+        normalizer.flush()
+    elapsed = time.perf_counter() - start
+
+    por_chunk = elapsed / (repeticoes * len(chunks)) * 1e6
+    print(f"⏱️  {por_chunk:.1f} µs por pedaço ({len(chunks)} pedaços por resposta)")
+    print(f"⏱️  {elapsed / repeticoes * 1e3:.3f} ms por resposta completa")
+
+
+# Teste direto
+if __name__ == "__main__":
+    print("🧪 Teste do normalizador de texto")
+    print("="*50)
+
+    exemplo = "Hai! Agora são 15:30. O Dr. Tanaka chega às 9h. Arigatō! Temos 2,5% de chance e 1.000 pessoas na fila."
+    print(f"📝 Original: {exemplo}")
+    print(f"🗣️  Normalizado: {normalizar_texto(exemplo)}")
+
+    print("\n📊 Microbenchmark")
+    benchmark()
@@ -1,13 +1,22 @@
 """
 Módulo de escuta usando SpeechRecognition com VAD embutido
 Não precisa do webrtcvad - SpeechRecognition já tem detecção de voz
+
+O áudio do microfone passa por um supressor de ruído espectral antes do VAD
+(ventilador, jogo e teclado deixam de disparar a escuta); o ASR recebe o
+mesmo trecho sem o filtro.
+Benchmark do supressor: python ouvir_sr.py --bench
 """
 import speech_recognition as sr
-import json
 import os
+import time
+import numpy as np
+from collections import deque
+from dispositivos import get_registry
+from metricas import WAKE_HITS, WAKE_MISSES, ASR_ERRORS, stage_timer
+from reconhecimento import MODEL_PATH, audio_para_pcm, get_asr_backend
 
 # Configurações
-MODEL_PATH = "models/vosk-model-small-pt-0.3"
 WAKE_VARIATIONS = [
     "mirai", "mira", "mirá", "mírai", "miray", "mirrai", 
     "mira e", "mirai assistente", "ei mirai", "olá mirai",
@@ -16,10 +25,244 @@ WAKE_VARIATIONS = [
     "mir ai"
  ]
 
+
+class MiraiNoiseSuppressor:
+    def __init__(self, sample_rate, frame_ms=20, reduction_db=15.0, noise_alpha=0.95, dd_alpha=0.98,
+                 speech_ratio=2.5, speech_band=(150, 4000), speech_ms=30, init_ms=250, drift_db=1.0):
+        """
+        Supressor de ruído espectral em streaming (antes do VAD e do ASR)
+
+        STFT com janela raiz de Hann e 50% de sobreposição (reconstrução
+        perfeita no overlap-add). O perfil de ruído é a média das potências dos
+        quadros sem fala; a máscara é um Wiener com SNR a priori
+        "decision-directed" e ganho mínimo (evita o ruído musical).
+
+        Args:
+            sample_rate: Taxa do microfone
+            frame_ms: Janela da STFT (o passo é metade: 10 ms com o padrão)
+            reduction_db: Atenuação máxima do ruído
+            noise_alpha: Memória da média do perfil de ruído (por quadro)
+            dd_alpha: Peso do quadro anterior no SNR a priori
+            speech_ratio: SNR médio (potência / ruído) acima do qual o quadro é fala
+            speech_band: Faixa (Hz) usada nessa decisão (fora dela a voz quase não tem energia)
+            speech_ms: Duração mínima acima do limiar para ser fala (cliques de teclado são mais curtos)
+            init_ms: Início do stream usado sempre como ruído (perfil inicial)
+            drift_db: Quanto o perfil pode subir por segundo durante "fala"
+                (recupera quando o ruído de fundo aumenta de vez)
+        """
+        self.sample_rate = sample_rate
+        self.hop = max(16, int(sample_rate * frame_ms / 2000))
+        self.size = 2 * self.hop
+        self.window = np.sqrt(np.hanning(self.size + 1)[:-1]).astype(np.float32)
+        self.floor = 10 ** (-reduction_db / 20)
+        self.noise_alpha = noise_alpha
+        self.dd_alpha = dd_alpha
+        self.speech_ratio = speech_ratio
+        bins = np.fft.rfftfreq(self.size, 1 / sample_rate)
+        self.band = slice(int(np.searchsorted(bins, speech_band[0])), int(np.searchsorted(bins, speech_band[1])))
+        self.init_frames = max(1, int(init_ms / (frame_ms / 2)))
+        self.speech_frames = max(1, int(round(speech_ms / (frame_ms / 2))))
+        self.drift = 10 ** (drift_db * self.hop / sample_rate / 10)
+
+        self.noise = None
+        self.frames = 0
+        self.speech = False
+        self._run = 0  # Quadros seguidos acima do limiar
+        self.stats = {"frames": 0, "noise_frames": 0, "cpu_s": 0.0}
+        self.reset()
+
+    def reset(self):
+        """Zera os buffers da STFT (o perfil de ruído é mantido)"""
+        self._input = np.zeros(self.size, dtype=np.float32)
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._gain = np.ones(self.size // 2 + 1, dtype=np.float32)
+        self._post = np.ones(self.size // 2 + 1, dtype=np.float32)
+
+    def _frame(self):
+        spectrum = np.fft.rfft(self._input * self.window)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+
+        if self.noise is None:
+            self.noise = power + 1e-10
+        post = power / self.noise
+
+        # Atualiza o perfil só nos quadros sem fala
+        loud = self.frames >= self.init_frames and np.mean(post[self.band]) > self.speech_ratio
+        self._run = self._run + 1 if loud else 0
+        self.speech = self._run >= self.speech_frames
+        if loud:
+            np.minimum(self.noise * self.drift, np.maximum(self.noise, power), out=self.noise)
+        else:
+            self.noise *= self.noise_alpha
+            self.noise += (1 - self.noise_alpha) * power + 1e-10 * (1 - self.noise_alpha)
+            self.stats["noise_frames"] += 1
+        self.frames += 1
+
+        # Wiener com SNR a priori "decision-directed"
+        prior = self.dd_alpha * self._gain ** 2 * self._post + (1 - self.dd_alpha) * np.maximum(post - 1, 0)
+        gain = np.maximum(prior / (1 + prior), self.floor)
+        self._gain, self._post = gain, post
+        if not self.speech:
+            # Sem fala, o resíduo fica no máximo no nível do perfil atenuado: picos do
+            # ruído não passam e o limiar de energia do VAD não é cruzado à toa
+            gain = np.minimum(gain, self.floor * np.sqrt(1 / np.maximum(post, 1e-10)))
+
+        frame = np.fft.irfft(spectrum * gain, self.size).astype(np.float32) * self.window
+        out = self._overlap + frame[:self.hop]
+        self._overlap = frame[self.hop:]
+        return out
+
+    def process(self, samples):
+        """
+        Filtra um bloco float32
+
+        Returns:
+            np.ndarray float32 com os quadros completos (atraso de um passo, ~10 ms)
+        """
+        start = time.perf_counter()
+        samples = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        count = len(samples) // self.hop
+        out = np.empty(count * self.hop, dtype=np.float32)
+        for i in range(count):
+            self._input[:self.hop] = self._input[self.hop:]
+            self._input[self.hop:] = samples[i * self.hop:(i + 1) * self.hop]
+            out[i * self.hop:(i + 1) * self.hop] = self._frame()
+        self._pending = samples[count * self.hop:]
+        self.stats["frames"] += count
+        self.stats["cpu_s"] += time.perf_counter() - start
+        return out
+
+
+class _StreamFiltrado:
+    """
+    Stream do microfone que entrega o áudio já sem ruído (mesmo formato int16)
+
+    O filtrado serve ao VAD; o original, atrasado do mesmo tanto, fica guardado
+    por alguns segundos para o ASR (ver original), que erra mais com o ruído
+    residual "musical" e com o portão aplicado fora da fala.
+    """
+
+    def __init__(self, stream, suppressor, history=40.0, sample_rate=16000):
+        self.stream = stream
+        self.suppressor = suppressor
+        # Um passo de silêncio na frente garante que read(n) sempre tenha n amostras
+        self._ready = np.zeros(suppressor.hop, dtype=np.float32)
+        # O filtrado sai dois passos atrás da entrada (o passo acima + o overlap-add)
+        self._raw = np.zeros(2 * suppressor.hop, dtype="<i2")
+        # Original num buffer circular indexado pela posição absoluta (amostras desde a abertura)
+        self._ring = np.zeros(int(history * sample_rate), dtype="<i2")
+        self._offset = 0
+        self._reads = deque()  # (posição, filtrado) de cada read ainda no buffer
+
+    def read(self, size):
+        raw = self.stream.read(size)
+        if not raw:
+            return raw
+        pcm = np.frombuffer(raw, dtype="<i2")
+        samples = pcm.astype(np.float32) / 32768.0
+        self._ready = np.concatenate((self._ready, self.suppressor.process(samples)))
+        out, self._ready = self._ready[:len(samples)], self._ready[len(samples):]
+        self._raw = np.concatenate((self._raw, pcm))
+        original, self._raw = self._raw[:len(pcm)], self._raw[len(pcm):]
+
+        filtered = (np.clip(out, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        size = len(self._ring)
+        self._ring[np.arange(self._offset, self._offset + len(original)) % size] = original
+        self._reads.append((self._offset, filtered))
+        self._offset += len(original)
+        while self._reads and self._reads[0][0] < self._offset - size:
+            self._reads.popleft()
+        return filtered
+
+    def original(self, frame_data):
+        """
+        Áudio sem filtro correspondente a um trecho devolvido por read
+
+        O listen do SpeechRecognition junta reads inteiros: o trecho começa no
+        início de um read, e a posição desse read indexa o buffer do original.
+
+        Returns:
+            bytes int16 ou None se o trecho já saiu do histórico
+        """
+        samples = len(frame_data) // 2
+        reads = list(self._reads)
+        for i in range(len(reads) - 1, -1, -1):
+            start, first = reads[i]
+            if start + samples > self._offset or not frame_data.startswith(first):
+                continue
+            # Confere o trecho inteiro (reads de silêncio podem se repetir)
+            joined, length = [], 0
+            for _, chunk in reads[i:]:
+                if length >= len(frame_data):
+                    break
+                joined.append(chunk)
+                length += len(chunk)
+            if b"".join(joined)[:len(frame_data)] == frame_data:
+                return self._ring[np.arange(start, start + samples) % len(self._ring)].tobytes()
+        return None
+
+    def close(self):
+        self.stream.close()
+
+
+class MicrofoneFiltrado(sr.Microphone):
+    """sr.Microphone com supressão de ruído antes do VAD do SpeechRecognition"""
+
+    def __init__(self, suppressor_for=None, **kwargs):
+        """
+        Args:
+            suppressor_for: Função (taxa do microfone) -> MiraiNoiseSuppressor ou None
+        """
+        super().__init__(**kwargs)
+        self.suppressor_for = suppressor_for
+
+    def __enter__(self):
+        # Com o PyAudio aberto o PortAudio não pode ser reinicializado (ver dispositivos.py)
+        self._hold = get_registry().hold()
+        self._hold.__enter__()
+        try:
+            source = super().__enter__()
+        except Exception as e:
+            self._hold.__exit__(None, None, None)
+            get_registry().report_error(e)
+            raise
+        suppressor = self.suppressor_for(self.SAMPLE_RATE) if self.suppressor_for else None
+        if suppressor is not None and self.SAMPLE_WIDTH == 2:
+            suppressor.reset()
+            self.stream = _StreamFiltrado(self.stream, suppressor, sample_rate=self.SAMPLE_RATE)
+        return source
+
+    def original(self, audio):
+        """
+        Mesmo trecho de um sr.AudioData do listen, mas sem a supressão de ruído
+
+        O VAD decide com o áudio filtrado; o ASR reconhece melhor o original.
+        """
+        if not isinstance(self.stream, _StreamFiltrado):
+            return audio
+        raw = self.stream.original(audio.frame_data)
+        if raw is None:
+            return audio
+        return sr.AudioData(raw, audio.sample_rate, audio.sample_width)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._hold.__exit__(None, None, None)
+
+
 class MiraiListener:
-    def __init__(self, model_path=MODEL_PATH):
+    def __init__(self, model_path=MODEL_PATH, backend="vosk", fallback="google", noise_suppression=True):
         """
         Inicializa o listener com SpeechRecognition
+        
+        Args:
+            model_path: Modelo Vosk (usado quando backend="vosk")
+            backend: Backend de ASR residente (ver reconhecimento.py), ex: "vosk", "whisper:small"
+            fallback: Backend usado se o principal falhar ou não carregar (None = nenhum)
+            noise_suppression: Filtra ventilador/jogo/teclado antes do VAD (o ASR recebe o original)
         """
         print("🎧 Inicializando sistema de escuta...")
         
@@ -33,26 +276,132 @@ class MiraiListener:
         
         # Configura o modelo Vosk
         self.model_path = model_path
-        if not os.path.exists(model_path):
+        if backend == "vosk" and not os.path.exists(model_path):
             print(f"⚠️  Modelo Vosk não encontrado em: {model_path}")
             print("📥 Baixe modelos em: https://alphacephei.com/vosk/models")
             print("📁 Coloque na pasta 'models/'")
         
-        # Lista dispositivos de áudio
-        self.list_audio_devices()
+        # Backend de ASR carregado uma vez (recebe PCM direto, sem WAV)
+        self.asr = None
+        self.asr_spec = f"vosk:{model_path}" if backend == "vosk" else backend
+        self.fallback_spec = fallback
+        self._fallback = None
+        self.lifecycle = None
+        try:
+            start = time.perf_counter()
+            self.asr = get_asr_backend(self.asr_spec)
+            print(f"✅ ASR {self.asr.name} carregado em {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"⚠️  ASR '{backend}' indisponível ({e}), usando {fallback}")
+        
+        # Supressor de ruído por taxa do microfone (o perfil de ruído sobrevive entre aberturas)
+        self.noise_suppression = noise_suppression
+        self._suppressors = {}
+        
+        # Gravação de sessão (ver sessao.py); definida pela MiraiAssistant
+        self.recorder = None
+        
+        # Chamado quando o usuário termina um comando (ex: tocar uma confirmação)
+        self.on_endpoint = None
+        
+        # Chamado na palavra de ativação (ex: recarregar a voz antes da resposta)
+        self.on_wake = None
+        
+        # Lista os microfones quando a enumeração terminar (a inicialização não espera)
+        get_registry().when_ready(self.list_audio_devices)
     
     def list_audio_devices(self):
         """Lista dispositivos de áudio disponíveis"""
         print("\n🎤 Dispositivos de microfone disponíveis:")
         try:
-            mics = sr.Microphone.list_microphone_names()
-            for i, name in enumerate(mics):
-                print(f"  [{i}] {name}")
+            # Registro em cache: evita inicializar o PyAudio só para listar nomes
+            for mic in get_registry().inputs():
+                print(f"  [{mic['index']}] {mic['name']} ({mic['hostapi']})")
         except:
             print("  Não foi possível listar dispositivos")
         
         print("\n📢 Para usar um dispositivo específico, ajuste no código.")
     
+    def suppressor(self, sample_rate):
+        if not self.noise_suppression:
+            return None
+        suppressor = self._suppressors.get(sample_rate)
+        if suppressor is None:
+            suppressor = MiraiNoiseSuppressor(sample_rate)
+            self._suppressors[sample_rate] = suppressor
+        return suppressor
+    
+    def microphone(self, device_index=None):
+        """Microfone com a supressão de ruído configurada (usar com `with`)"""
+        return MicrofoneFiltrado(suppressor_for=self.suppressor, device_index=device_index)
+    
+    def attach_lifecycle(self, lifecycle, ttl=None):
+        """Registra o ASR residente no gerenciador de ciclo de vida (modelos.py)"""
+        if self.asr is None:
+            return
+        self.lifecycle = lifecycle
+        lifecycle.register("asr", self._reload_asr, self._unload_asr, ttl)
+    
+    def _unload_asr(self):
+        self.asr = None
+    
+    def _reload_asr(self):
+        self.asr = get_asr_backend(self.asr_spec)
+    
+    def fallback(self):
+        """Backend reserva, criado no primeiro uso"""
+        if self._fallback is None and self.fallback_spec:
+            self._fallback = get_asr_backend(self.fallback_spec)
+        return self._fallback
+    
+    def transcribe(self, audio):
+        """
+        Reconhece um sr.AudioData com o backend residente (ou o reserva se ele falhar)
+        
+        Returns:
+            Texto em minúsculas ("" se não houve fala)
+        
+        Raises:
+            Exception: se nenhum backend conseguiu reconhecer
+        """
+        pcm = audio_para_pcm(audio)
+        if self.lifecycle is None:
+            return self._transcribe(pcm)
+        with self.lifecycle.use("asr"):
+            return self._transcribe(pcm)
+    
+    def _transcribe(self, pcm):
+        backends = [b for b in (self.asr,) if b is not None]
+        if self.fallback_spec:
+            backends.append(None)  # Reserva carregada só se for preciso
+        
+        error = None
+        for backend in backends:
+            if backend is None:
+                backend = self.fallback()
+                print(f"⚠️  Usando {backend.name} como fallback...")
+            asr_start = time.perf_counter()
+            try:
+                with stage_timer("asr"):
+                    text = backend.transcribe(pcm).lower()
+            except Exception as e:
+                error = e
+                ASR_ERRORS.inc()
+                if self.recorder is not None:
+                    self.recorder.record_asr(None, time.perf_counter() - asr_start, backend.name, error=str(e))
+                continue
+            if self.recorder is not None:
+                self.recorder.record_asr(text, time.perf_counter() - asr_start, backend.name)
+            return text
+        raise error or RuntimeError("Nenhum backend de ASR disponível")
+    
+    def listen(self, source, **kwargs):
+        """recognizer.listen com o VAD no áudio filtrado; devolve o trecho original para o ASR"""
+        audio = self.recognizer.listen(source, **kwargs)
+        if isinstance(source, MicrofoneFiltrado):
+            audio = source.original(audio)
+        return audio
+    
     def adjust_for_noise(self, source, duration=1):
         """Ajusta para ruído ambiente"""
         print("🔊 Ajustando para ruído ambiente...")
@@ -75,7 +424,7 @@ class MiraiListener:
         print("🎯 Diga: 'Mirai' seguido do seu comando")
         print(f"{'='*50}")
         
-        with sr.Microphone(device_index=device_index) as source:
+        with self.microphone(device_index) as source:
             # Ajusta para ruído ambiente
             self.adjust_for_noise(source)
             
@@ -85,43 +434,21 @@ class MiraiListener:
                     
                     # Escuta áudio com timeout
                     # O VAD do SpeechRecognition já filtra silêncio automaticamente
-                    audio = self.recognizer.listen(
+                    audio = self.listen(
                         source, 
                         timeout=timeout,
                         phrase_time_limit=10  # Máximo 5 segundos por frase
                     )
                     
                     print("🎧 Áudio capturado, processando...")
+                    if self.recorder is not None:
+                        self.recorder.record_audio(audio)
                     
-                    """ # Reconhece usando Vosk
-                    try:
-                        # Método 1: Usando recognize_vosk
-                        text = self.recognizer.recognize_vosk(
-                            audio, 
-                            language="pt"
-                        )
-                        
-                        # Parse do resultado JSON
-                        result = json.loads(text)
-                        text_lower = result.get("text", "").lower()
-                        
-                    except:
-                        # Método 2: Fallback para recognize_google (menos preciso)
-                        print("⚠️  Vosk falhou, usando Google como fallback...")
-                        text_lower = self.recognizer.recognize_google(
-                            audio, 
-                            language="pt-BR"
-                        ).lower() """
-                    
+                    text_lower = None
                     try:
-                        # Método 2: Fallback para recognize_google (menos preciso)
-                        print("⚠️  Vosk falhou, usando Google como fallback...")
-                        text_lower = self.recognizer.recognize_google(
-                            audio, 
-                            language="pt-BR"
-                        ).lower() 
-                    except:
-                        print("Não foi possível iniciar o reconhecimento d voz :'(")
+                        text_lower = self.transcribe(audio)
+                    except Exception as e:
+                        print(f"Não foi possível iniciar o reconhecimento d voz :'( ({e})")
 
                     if text_lower:
                         #print(f"🎧 Ouvido: '{text_lower}'")
@@ -130,6 +457,11 @@ class MiraiListener:
                         for wake_word in WAKE_VARIATIONS:
                             if wake_word in text_lower:
                                 print(f"🔔 Palavra de ativação detectada: '{wake_word}'")
+                                WAKE_HITS.inc()
+                                if self.on_wake is not None:
+                                    self.on_wake()
+                                if self.on_endpoint is not None:
+                                    self.on_endpoint()
                                 
                                 # Extrai o comando (remove a wake word)
                                 command = self.extract_command(text_lower, wake_word)
@@ -142,6 +474,7 @@ class MiraiListener:
                                 
                                 return command
                     
+                    WAKE_MISSES.inc()
                     print("⏭️  Nenhuma palavra de ativação detectada, continuando...")
                     
                 except sr.WaitTimeoutError:
@@ -150,10 +483,12 @@ class MiraiListener:
                     continue
                     
                 except sr.UnknownValueError:
+                    ASR_ERRORS.inc()
                     print("❓ Não foi possível entender o áudio")
                     continue
                     
                 except sr.RequestError as e:
+                    ASR_ERRORS.inc()
                     print(f"⚠️  Erro no serviço de reconhecimento: {e}")
                     continue
                     
@@ -200,18 +535,20 @@ class MiraiListener:
         """
         print("\n🎤 O que deseja...")
         
-        with sr.Microphone(device_index=device_index) as source:
+        with self.microphone(device_index) as source:
             try:
-                audio = self.recognizer.listen(
+                audio = self.listen(
                     source, 
                     timeout=10,
                     phrase_time_limit=10
                 )
                 
-                # Reconhece com Vosk
-                text = self.recognizer.recognize_vosk(audio, language="pt")
-                result = json.loads(text)
-                return result.get("text", "")
+                if self.on_endpoint is not None:
+                    self.on_endpoint()
+                if self.recorder is not None:
+                    self.recorder.record_audio(audio)
+                
+                return self.transcribe(audio)
                 
             except sr.WaitTimeoutError:
                 print("⏰ Timeout ao esperar comando")
@@ -229,8 +566,177 @@ def ouvir(device_index=None):
     listener = MiraiListener()
     return listener.listen_for_wake_word(device_index=device_index)
 
+class _Leitor:
+    """Stream de leitura sobre um array int16 (benchmark sem microfone)"""
+
+    def __init__(self, pcm):
+        self.data = pcm.astype("<i2").tobytes()
+        self.position = 0
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position + size * 2]
+        self.position += len(chunk)
+        return chunk
+
+    def done(self):
+        return self.position >= len(self.data)
+
+    def close(self):
+        pass
+
+
+class _FonteMemoria(sr.AudioSource):
+    """AudioSource em memória que anota a posição de cada bloco entregue ao VAD"""
+
+    def __init__(self, pcm, sample_rate, suppressor=None):
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = 1024
+        self.reader = _Leitor(pcm)
+        self._inner = _StreamFiltrado(self.reader, suppressor) if suppressor is not None else self.reader
+        self.stream = self
+        self.delivered = 0
+        self.offsets = {}  # bytes do bloco -> amostra inicial
+
+    def read(self, size):
+        chunk = self._inner.read(size)
+        self.offsets[chunk] = self.delivered
+        self.delivered += len(chunk) // 2
+        return chunk
+
+    def close(self):
+        pass
+
+
+def _fixtures(sample_rate, seconds=30.0, snr_db=5.0, seed=0):
+    """
+    Fala sintética (harmônicos com sílabas e pausas) misturada a ruídos típicos
+
+    Returns:
+        dict: nome -> (mistura float32, máscara de fala por amostra)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    # Frases de 1-2 s separadas por 2-4 s de silêncio (começa com 3 s sem fala)
+    mask = np.zeros(n, dtype=bool)
+    position = int(3 * sample_rate)
+    while position < n:
+        length = int(rng.uniform(1.0, 2.0) * sample_rate)
+        mask[position:position + length] = True
+        position += length + int(rng.uniform(2.0, 4.0) * sample_rate)
+    f0 = 150 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 20) if k * 180 < sample_rate / 2)
+    syllables = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    speech = (voice * syllables * mask).astype(np.float32)
+
+    # Ventilador: ruído marrom (-6 dB/oitava) + zumbido da rede elétrica
+    white = rng.standard_normal(n).astype(np.float32)
+    spectrum = np.fft.rfft(white) / np.maximum(np.fft.rfftfreq(n, 1 / sample_rate), 50.0)
+    fan = np.fft.irfft(spectrum, n).astype(np.float32)
+    fan = fan / np.std(fan) + 0.3 * np.sin(2 * np.pi * 120 * t)
+
+    # Teclado: cliques curtos (~6 por segundo)
+    keys = np.zeros(n, dtype=np.float32)
+    click = (rng.standard_normal(int(0.008 * sample_rate)) *
+             np.exp(-np.arange(int(0.008 * sample_rate)) / (0.0015 * sample_rate))).astype(np.float32)
+    for start in rng.integers(0, n - len(click), int(seconds * 6)):
+        keys[start:start + len(click)] += click * rng.uniform(0.5, 1.5)
+    keys += 0.05 * white
+
+    # Jogo: melodia mudando a cada 0.5 s sobre ruído de fundo
+    notes = 220 * 2 ** (rng.integers(0, 12, int(seconds * 2)) / 12)
+    game = np.sin(2 * np.pi * np.cumsum(np.repeat(notes, int(sample_rate / 2))[:n]) / sample_rate)
+    game = 0.3 * game + 0.3 * fan
+
+    fixtures = {}
+    speech_power = np.mean(speech[mask] ** 2)
+    for nome, noise in (("ventilador", fan), ("teclado", keys), ("jogo", game),
+                        ("misto", fan + keys + 0.5 * game)):
+        noise = noise.astype(np.float32)
+        noise *= np.sqrt(speech_power / np.mean(noise ** 2) / 10 ** (snr_db / 10))
+        mixed = speech + noise
+        fixtures[nome] = ((mixed / np.max(np.abs(mixed)) * 0.5).astype(np.float32), mask)
+    return fixtures
+
+
+def _frases(pcm, sample_rate, suppressor=None):
+    """
+    Roda o Recognizer.listen real (limiar dinâmico, calibrado com
+    adjust_for_ambient_noise) sobre o áudio inteiro
+
+    Returns:
+        list: [(início do disparo em amostras, duração em amostras)]
+    """
+    source = _FonteMemoria(pcm, sample_rate, suppressor)
+    recognizer = sr.Recognizer()
+    recognizer.energy_threshold = 300
+    recognizer.dynamic_energy_threshold = True
+    recognizer.pause_threshold = 1.0
+    recognizer.adjust_for_ambient_noise(source, duration=1)
+
+    # O listen devolve alguns blocos de antes do disparo (non_speaking_duration)
+    preroll = (int(np.ceil(recognizer.non_speaking_duration * sample_rate / source.CHUNK)) - 1) * source.CHUNK
+    frases = []
+    while not source.reader.done():
+        audio = recognizer.listen(source, phrase_time_limit=10)
+        if source.reader.done():
+            break  # Cortada pelo fim do arquivo
+        start = source.offsets.get(audio.frame_data[:source.CHUNK * 2], 0)
+        frases.append((start + preroll, len(audio.frame_data) // 2))
+    return frases
+
+
+def benchmark(sample_rate=48000, seconds=30.0):
+    """
+    Supressor de ruído: CPU por quadro de 10 ms e o efeito no VAD do SpeechRecognition
+
+    - falsos: disparos que começam fora da fala (chamadas de ASR desperdiçadas)
+    - perdidas: frases sintéticas sem nenhum disparo
+    - ASR: segundos de áudio entregues ao reconhecimento (fala real = referência)
+    """
+    print("\n📊 Benchmark do supressor de ruído")
+    print("="*72)
+    print(f"  {'ruído':<11} {'falsos':>9} {'perdidas':>9} {'ASR (s)':>14} {'ruído nas pausas':>17} {'CPU/10ms':>8}")
+
+    for nome, (mixed, mask) in _fixtures(sample_rate, seconds).items():
+        pcm = (mixed * 32767).astype(np.int16)
+        edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+        segmentos = list(zip(edges[::2] + 1, edges[1::2] + 1))
+        tolerancia = int(0.3 * sample_rate)
+
+        resultados = []
+        for suppressor in (None, MiraiNoiseSuppressor(sample_rate)):
+            frases = _frases(pcm, sample_rate, suppressor)
+            falsos = sum(1 for start, _ in frases if not mask[max(0, start - tolerancia):start + tolerancia].any())
+            perdidas = sum(1 for a, b in segmentos
+                           if not any(start < b and start + n > a for start, n in frases))
+            asr_s = sum(n for _, n in frases) / sample_rate
+            resultados.append((falsos, perdidas, asr_s))
+
+        # Nível do ruído nas pausas e custo por quadro, com o áudio inteiro de uma vez
+        suppressor = MiraiNoiseSuppressor(sample_rate)
+        out = suppressor.process(mixed)
+        pausas = ~mask[:len(out)]
+        reducao = 10 * np.log10(np.mean(out[pausas] ** 2) / np.mean(mixed[:len(out)][pausas] ** 2))
+        cpu_us = suppressor.stats["cpu_s"] / suppressor.stats["frames"] * 1e6
+
+        (f0, p0, s0), (f1, p1, s1) = resultados
+        print(f"  {nome:<11} {f0:>3} -> {f1:<3} {p0:>3} -> {p1:<3} {s0:>5.1f} -> {s1:<5.1f} "
+              f"{reducao:>+14.1f} dB {cpu_us:>6.0f}µs")
+    print(f"  (fala real: {mask.sum() / sample_rate:.1f}s em {len(segmentos)} frases)")
+    print("="*72)
+
+
 # Teste direto
 if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
+
     print("🔧 Teste do sistema de escuta")
     print("="*50)
     
@@ -0,0 +1,309 @@
+"""
+Backends de reconhecimento de fala (ASR) residentes na memória
+
+Todos recebem PCM mono 16 kHz como array numpy (int16 ou float32), sem passar
+por WAV: o áudio do SpeechRecognition é convertido uma vez (audio_para_pcm) e
+o modelo fica carregado entre as chamadas.
+
+- vosk: Kaldi, leve, modelo em models/ (ver MODEL_PATH)
+- whisper: faster-whisper (CTranslate2) quantizado em int8 na CPU
+- google: API web do SpeechRecognition (precisa de internet)
+
+Uso:
+    python reconhecimento.py bench clips/ [--backends vosk whisper:small google]
+
+A pasta de clipes tem arquivos .wav com a transcrição de referência ao lado
+(mesmo nome, .txt) ou um transcricoes.tsv ("arquivo<TAB>texto" por linha).
+"""
+import os
+import re
+import json
+import time
+import wave
+import argparse
+import threading
+import numpy as np
+
+from audio_utils import PolyphaseResampler
+from normalizar import expandir_abreviacoes, numeros_por_extenso
+
+TAXA_ASR = 16000
+MODEL_PATH = "models/vosk-model-small-pt-0.3"
+WHISPER_PADRAO = "small"
+BACKENDS = ("vosk", "whisper", "google")
+
+
+def audio_para_pcm(audio, sample_rate=TAXA_ASR):
+    """
+    sr.AudioData -> int16 mono na taxa do ASR (sem gerar WAV)
+
+    Returns:
+        np.ndarray int16
+    """
+    raw = audio.get_raw_data(convert_rate=sample_rate, convert_width=2)
+    return np.frombuffer(raw, dtype="<i2")
+
+
+def _int16(pcm):
+    pcm = np.asarray(pcm)
+    if pcm.dtype == np.int16:
+        return pcm
+    return (np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def _float32(pcm):
+    pcm = np.asarray(pcm)
+    if pcm.dtype == np.int16:
+        return pcm.astype(np.float32) / 32768.0
+    return pcm.astype(np.float32, copy=False)
+
+
+class VoskBackend:
+    name = "vosk"
+
+    def __init__(self, model_path=MODEL_PATH, sample_rate=TAXA_ASR):
+        """
+        Vosk com o modelo carregado uma única vez
+
+        Args:
+            model_path: Pasta do modelo (https://alphacephei.com/vosk/models)
+            sample_rate: Taxa do PCM recebido
+        """
+        import vosk
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modelo Vosk não encontrado em: {model_path}")
+        vosk.SetLogLevel(-1)
+        self.sample_rate = sample_rate
+        self.model = vosk.Model(model_path)
+        self._recognizer = vosk.KaldiRecognizer(self.model, sample_rate)
+        self._lock = threading.Lock()
+
+    def transcribe(self, pcm):
+        """Texto reconhecido ("" se não houve fala)"""
+        data = _int16(pcm).tobytes()
+        parts = []
+        with self._lock:
+            # Pausas no meio do áudio fecham um trecho (Result); FinalResult fecha
+            # o último e também zera o reconhecedor para a próxima frase
+            for i in range(0, len(data), 16000):
+                if self._recognizer.AcceptWaveform(data[i:i + 16000]):
+                    parts.append(json.loads(self._recognizer.Result()).get("text", ""))
+            parts.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        return " ".join(part for part in parts if part)
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model=WHISPER_PADRAO, compute_type="int8", cpu_threads=0, language="pt",
+                 beam_size=1):
+        """
+        faster-whisper na CPU
+
+        Args:
+            model: Tamanho ("tiny", "base", "small"...) ou pasta de um modelo CTranslate2
+            compute_type: "int8" (padrão), "int8_float32", "float32"
+            cpu_threads: Threads do CTranslate2 (0 = padrão da biblioteca)
+            language: Idioma fixo (pula a detecção de idioma)
+            beam_size: 1 = busca gulosa, bem mais rápida na CPU
+        """
+        from faster_whisper import WhisperModel
+
+        self.sample_rate = TAXA_ASR
+        self.language = language
+        self.beam_size = beam_size
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        self._lock = threading.Lock()
+
+    def transcribe(self, pcm):
+        with self._lock:
+            segments, _ = self.model.transcribe(
+                _float32(pcm), language=self.language, beam_size=self.beam_size,
+                condition_on_previous_text=False, without_timestamps=True
+            )
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class GoogleBackend:
+    name = "google"
+
+    def __init__(self, language="pt-BR"):
+        """API web do SpeechRecognition (o único backend que converte para FLAC e usa a rede)"""
+        import speech_recognition as sr
+
+        self._sr = sr
+        self.sample_rate = TAXA_ASR
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, pcm):
+        audio = self._sr.AudioData(_int16(pcm).tobytes(), self.sample_rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except self._sr.UnknownValueError:
+            return ""
+
+
+def get_asr_backend(spec="vosk", **kwargs):
+    """
+    Cria um backend a partir de "nome" ou "nome:modelo"
+
+    Exemplos: "vosk", "vosk:models/vosk-model-pt-fb-v0.1.1", "whisper:small", "google"
+    """
+    name, _, model = spec.partition(":")
+    if name == "vosk":
+        return VoskBackend(model or MODEL_PATH, **kwargs)
+    if name == "whisper":
+        return WhisperBackend(model or WHISPER_PADRAO, **kwargs)
+    if name == "google":
+        return GoogleBackend(**kwargs)
+    raise ValueError(f"Backend de ASR desconhecido: {spec} (opções: {', '.join(BACKENDS)})")
+
+
+# ----------------------------------------------------------------------
+# Benchmark (WER e RTF num conjunto local de clipes)
+# ----------------------------------------------------------------------
+
+def palavras(text):
+    """
+    Palavras para o WER: minúsculas, sem pontuação (acentos mantidos)
+
+    Números, "%", "R$" e abreviações vão por extenso dos dois lados: o Whisper
+    escreve "15%" e o Vosk "quinze por cento", e isso não é erro de reconhecimento.
+    """
+    text = numeros_por_extenso(expandir_abreviacoes(text))
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def distancia(ref, hyp):
+    """Distância de edição entre duas listas de palavras"""
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1]
+
+
+def ler_wav(path, sample_rate=TAXA_ASR):
+    """WAV PCM 16 bits -> float32 mono na taxa do ASR"""
+    with wave.open(path, "rb") as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width != 2:
+        raise ValueError(f"{path}: só WAV PCM 16 bits é suportado")
+    wav = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        wav = wav.reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate:
+        resampler = PolyphaseResampler(rate, sample_rate)
+        wav = np.concatenate([resampler.process(wav), resampler.flush()])
+    return wav
+
+
+def ler_clipes(clips_dir):
+    """
+    Clipes e transcrições de referência
+
+    Returns:
+        list: [(caminho do wav, texto de referência)]
+    """
+    referencias = {}
+    tsv = os.path.join(clips_dir, "transcricoes.tsv")
+    if os.path.exists(tsv):
+        with open(tsv, encoding="utf-8") as f:
+            for line in f:
+                if "\t" in line:
+                    nome, texto = line.rstrip("\n").split("\t", 1)
+                    referencias[nome] = texto
+
+    clipes = []
+    for nome in sorted(os.listdir(clips_dir)):
+        if not nome.lower().endswith(".wav"):
+            continue
+        texto = referencias.get(nome)
+        txt = os.path.join(clips_dir, os.path.splitext(nome)[0] + ".txt")
+        if texto is None and os.path.exists(txt):
+            with open(txt, encoding="utf-8") as f:
+                texto = f.read().strip()
+        if texto is None:
+            print(f"⚠️  {nome} sem transcrição de referência, ignorado")
+            continue
+        clipes.append((os.path.join(clips_dir, nome), texto))
+    return clipes
+
+
+def benchmark(clips_dir, specs=("vosk", "whisper:" + WHISPER_PADRAO), verbose=False):
+    """
+    Compara backends no mesmo conjunto de clipes
+
+    WER = (substituições + inserções + remoções) / palavras de referência
+    RTF = tempo de reconhecimento / duração do áudio (< 1 = mais rápido que tempo real)
+
+    Returns:
+        dict: backend -> {"wer", "rtf", "load_s", "first_ms"}
+    """
+    clipes = [(path, texto, ler_wav(path)) for path, texto in ler_clipes(clips_dir)]
+    if not clipes:
+        print(f"❌ Nenhum clipe com transcrição em {clips_dir}")
+        return {}
+    audio_seconds = sum(len(wav) for _, _, wav in clipes) / TAXA_ASR
+    print(f"\n📊 Benchmark de ASR: {len(clipes)} clipes, {audio_seconds:.1f}s de áudio")
+    print("="*60)
+
+    resultados = {}
+    for spec in specs:
+        start = time.perf_counter()
+        try:
+            backend = get_asr_backend(spec)
+        except Exception as e:
+            print(f"⚠️  {spec}: indisponível ({e})")
+            continue
+        load_s = time.perf_counter() - start
+
+        erros = referencia = 0
+        elapsed = 0.0
+        first_ms = None
+        for path, texto, wav in clipes:
+            start = time.perf_counter()
+            hyp = backend.transcribe(wav)
+            seconds = time.perf_counter() - start
+            elapsed += seconds
+            if first_ms is None:
+                first_ms = seconds * 1000
+            ref_words = palavras(texto)
+            errors = distancia(ref_words, palavras(hyp))
+            erros += errors
+            referencia += len(ref_words)
+            if verbose:
+                print(f"  [{spec}] {os.path.basename(path)}: {errors} erros -> '{hyp}'")
+
+        resultados[spec] = {
+            "wer": erros / max(1, referencia),
+            "rtf": elapsed / audio_seconds,
+            "load_s": load_s,
+            "first_ms": first_ms,
+        }
+
+    print(f"  {'backend':<28} {'WER':>7} {'RTF':>7} {'carga':>8} {'1º clipe':>9}")
+    for spec, r in resultados.items():
+        print(f"  {spec:<28} {r['wer'] * 100:>6.1f}% {r['rtf']:>7.3f} {r['load_s']:>7.1f}s "
+              f"{r['first_ms']:>7.0f}ms")
+    print("="*60)
+    return resultados
+
+
+# Teste direto
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backends de reconhecimento de fala da Mirai")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_bench = sub.add_parser("bench", help="WER e RTF de cada backend num conjunto de clipes")
+    p_bench.add_argument("clipes", help="Pasta com .wav e transcrições (.txt ou transcricoes.tsv)")
+    p_bench.add_argument("--backends", nargs="+", default=["vosk", "whisper:" + WHISPER_PADRAO])
+    p_bench.add_argument("-v", "--verbose", action="store_true", help="Mostra cada transcrição")
+    args = parser.parse_args()
+
+    if args.comando == "bench":
+        benchmark(args.clipes, args.backends, verbose=args.verbose)
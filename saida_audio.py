@@ -0,0 +1,372 @@
+"""
+Saída de áudio persistente na taxa nativa do dispositivo
+O stream é aberto uma vez (taxa, formato e bloco negociados com o dispositivo)
+e cada fala é reamostrada e normalizada (loudness + limitador) em streaming
+antes de entrar no buffer de saída.
+"""
+import time
+import queue
+import threading
+import numpy as np
+import sounddevice as sd
+
+from audio_utils import PolyphaseResampler, LoudnessNormalizer
+from dispositivos import get_registry
+from metricas import TTS_UNDERRUNS
+
+# Formatos tentados em ordem de preferência
+FORMATOS = ("float32", "int16")
+
+# Duração do crossfade entre uma confirmação curta e o começo da resposta
+CROSSFADE_MS = 60
+
+
+class _Marca:
+    """Marcador na fila de saída (início ou fim de uma fala)"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.event = threading.Event()
+        self.offset = 0.0  # Segundos até a marca sair no alto-falante
+
+
+class _Confirmacao:
+    """Áudio curto tocado por cima da fila (ex: "Hmm..." enquanto o LLM pensa)"""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.position = 0
+        self.fade = 0  # Amostras do crossfade já aplicadas
+        self.event = threading.Event()
+        self.offset = 0.0  # Segundos até o primeiro sample sair no alto-falante
+
+
+class MiraiAudioOutput:
+    def __init__(self, device=None, block_ms=10, latency="low"):
+        """
+        Abre o stream de saída uma única vez no formato do dispositivo
+
+        Args:
+            device: ID do dispositivo (None = padrão do sistema)
+            block_ms: Tamanho do bloco do callback em milissegundos
+            latency: Latência pedida ao PortAudio ("low", "high" ou segundos)
+        """
+        self.device = device
+        info = sd.query_devices(device, 'output')
+        self.name = info['name']
+        self.sample_rate = int(info['default_samplerate'])
+        self.dtype = self._negotiate_dtype()
+        self.blocksize = max(64, int(self.sample_rate * block_ms / 1000))
+        # A normalização avança em passos fixos de 10 ms: uma frase inteira num bloco só
+        # receberia um único ganho, medido antes de a fala começar
+        self.loudness_step = max(1, self.sample_rate // 100)
+
+        # Um reamostrador por taxa de entrada (o filtro é calculado uma vez)
+        self._resamplers = {}
+
+        # Loudness contínua entre as falas (o volume é aplicado aqui também)
+        self.volume = 1.0
+        try:
+            self.loudness = LoudnessNormalizer(self.sample_rate)
+        except ImportError:
+            print("⚠️  scipy não instalado, saída sem normalização de loudness")
+            self.loudness = None
+
+        self._queue = queue.Queue()
+        self._current = np.zeros(0, dtype=np.float32)
+        self._position = 0
+        self._speaking = False
+        self._mix = np.zeros(self.blocksize, dtype=np.float32)
+        self._play_lock = threading.Lock()
+        self._closed = False
+        
+        # Confirmação em andamento e rampa do crossfade para a fala
+        self._cue = None
+        self._ramp = np.linspace(1.0, 0.0, max(1, int(self.sample_rate * CROSSFADE_MS / 1000)),
+                                 dtype=np.float32)
+
+        self.engine = None
+        self.underruns = 0
+
+        start = time.perf_counter()
+        self.stream = sd.OutputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype=self.dtype,
+            blocksize=self.blocksize,
+            latency=latency,
+            device=device,
+            callback=self._callback
+        )
+        self.stream.start()
+        open_ms = (time.perf_counter() - start) * 1000
+
+        self.stats = {
+            "device": self.name,
+            "sample_rate": self.sample_rate,
+            "dtype": self.dtype,
+            "blocksize": self.blocksize,
+            "open_ms": open_ms,
+            "latency_ms": self.stream.latency * 1000,
+        }
+        print(f"🔈 Saída aberta: {self.name} ({self.sample_rate} Hz, {self.dtype}, "
+              f"bloco {self.blocksize}) em {open_ms:.0f} ms, latência {self.stats['latency_ms']:.1f} ms")
+
+    def _negotiate_dtype(self):
+        """Escolhe o primeiro formato aceito pelo dispositivo na taxa nativa"""
+        for dtype in FORMATOS:
+            try:
+                sd.check_output_settings(device=self.device, channels=1, dtype=dtype,
+                                         samplerate=self.sample_rate)
+                return dtype
+            except Exception:
+                continue
+        return FORMATOS[0]
+
+    def resampler(self, sample_rate):
+        """Reamostrador (em cache) da taxa informada para a do dispositivo"""
+        resampler = self._resamplers.get(sample_rate)
+        if resampler is None:
+            resampler = PolyphaseResampler(sample_rate, self.sample_rate)
+            self._resamplers[sample_rate] = resampler
+        return resampler
+
+    def set_volume(self, volume):
+        """Volume aplicado depois da normalização (0.0 a 2.0)"""
+        self.volume = volume
+        if self.loudness is not None:
+            self.loudness.volume = volume
+
+    def _normalize(self, block):
+        if self.loudness is not None:
+            return self.loudness.process(block)
+        if self.volume != 1.0:
+            return block * self.volume
+        return block
+
+    def _normalized_steps(self, samples):
+        """Normaliza em passos de 10 ms, um bloco de saída por passo"""
+        step = self.loudness_step
+        for i in range(0, len(samples), step):
+            out = self._normalize(samples[i:i + step])
+            if len(out):
+                yield out
+
+    def attach_viseme_engine(self, engine):
+        """O motor de visemas recebe o áudio já na taxa do dispositivo"""
+        if engine is not None and engine.sample_rate != self.sample_rate:
+            engine.set_sample_rate(self.sample_rate)
+        self.engine = engine
+
+    def _callback(self, outdata, frames, time_info, status):
+        # Quanto falta para este buffer sair no alto-falante
+        offset = max(0.0, time_info.outputBufferDacTime - time_info.currentTime)
+
+        if frames > len(self._mix):
+            self._mix = np.zeros(frames, dtype=np.float32)
+        mix = self._mix[:frames]
+        active = self._speaking
+
+        written = 0
+        while written < frames:
+            if self._position >= len(self._current):
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _Marca):
+                    item.offset = offset + written / self.sample_rate
+                    self._speaking = item.kind == "start"
+                    active = active or self._speaking
+                    item.event.set()
+                    continue
+                self._current, self._position = item, 0
+                continue
+
+            n = min(frames - written, len(self._current) - self._position)
+            mix[written:written + n] = self._current[self._position:self._position + n]
+            written += n
+            self._position += n
+
+        mix[written:] = 0.0
+        if written < frames and self._speaking:
+            self.underruns += 1
+            TTS_UNDERRUNS.inc()
+        
+        if self._cue is not None:
+            self._mix_cue(mix, frames, offset)
+
+        engine = self.engine
+        if engine is not None and active:
+            engine.process(mix, offset)
+
+        if self.dtype == "float32":
+            outdata[:, 0] = mix
+        else:
+            outdata[:, 0] = np.clip(mix * 32767.0, -32768, 32767).astype(np.int16)
+
+    def _mix_cue(self, mix, frames, offset):
+        """Soma a confirmação ao bloco; some em crossfade quando a fala começa"""
+        cue = self._cue
+        if cue.position == 0:
+            cue.offset = offset
+            cue.event.set()
+        
+        n = min(frames, len(cue.samples) - cue.position)
+        segment = cue.samples[cue.position:cue.position + n]
+        if self._speaking:
+            ramp = self._ramp[cue.fade:cue.fade + n]
+            n = len(ramp)
+            mix[:n] += segment[:n] * ramp
+            np.clip(mix[:n], -1.0, 1.0, out=mix[:n])
+            cue.fade += n
+            if cue.fade >= len(self._ramp):
+                self._cue = None
+                return
+        else:
+            mix[:n] += segment
+        
+        cue.position += n
+        if cue.position >= len(cue.samples):
+            self._cue = None
+    
+    def cue(self, samples):
+        """
+        Toca um áudio curto imediatamente, sem esperar a fila (não bloqueia)
+        
+        Se uma fala começar antes de ele terminar, os dois se cruzam em
+        CROSSFADE_MS. Ignorado se já houver fala tocando.
+        
+        Args:
+            samples: float32 já na taxa do dispositivo
+        
+        Returns:
+            _Confirmacao (event/offset do primeiro sample) ou None
+        """
+        if self._speaking or self._closed:
+            return None
+        cue = _Confirmacao(samples)
+        self._cue = cue
+        return cue
+    
+    def play(self, blocks, sample_rate, on_start=None):
+        """
+        Toca uma fala (bloqueia até o último sample sair no alto-falante)
+
+        Args:
+            blocks: Iterável de blocos float32 (pode ser um gerador de síntese)
+            sample_rate: Taxa dos blocos (reamostrada para a do dispositivo)
+            on_start: Callback com os segundos até o primeiro sample sair no alto-falante
+        """
+        with self._play_lock:
+            resampler = self.resampler(sample_rate)
+            resampler.reset()
+            engine = self.engine
+            if engine is not None:
+                engine.reset()
+
+            start = _Marca("start")
+            end = _Marca("end")
+
+            def _alimentar():
+                started = False
+                try:
+                    for block in blocks:
+                        for out in self._normalized_steps(resampler.process(block)):
+                            if not started:
+                                self._queue.put(start)
+                                started = True
+                            self._queue.put(out)
+                except Exception as e:
+                    print(f"❌ Erro ao gerar blocos de áudio: {e}")
+                finally:
+                    if started:
+                        for out in self._normalized_steps(resampler.flush()):
+                            self._queue.put(out)
+                        if self.loudness is not None:
+                            self._queue.put(self.loudness.flush())
+                    if self.loudness is not None:
+                        self.loudness.reset()
+                    self._queue.put(end)
+
+            threading.Thread(target=_alimentar, daemon=True).start()
+
+            # O callback de áudio não pode bloquear: o aviso de início sai desta thread
+            if on_start is not None:
+                while not start.event.wait(0.05):
+                    if end.event.is_set() or self._closed:
+                        break
+                if start.event.is_set():
+                    on_start(start.offset)
+
+            # Se o stream for fechado ou parar (ex: dispositivo removido) a fala é abandonada
+            while not end.event.wait(0.1):
+                if self._closed:
+                    break
+                if not self.stream.active:
+                    get_registry().report_error("stream de saída parou")
+                    break
+            if end.event.is_set():
+                time.sleep(end.offset)
+
+            if engine is not None:
+                engine.close_mouth()
+
+    def close(self):
+        """Fecha o stream (quem estiver esperando em play() é liberado)"""
+        self._closed = True
+        try:
+            self.stream.stop()
+            self.stream.close()
+        except Exception:
+            pass
+
+
+def benchmark(device=None, seconds=5.0, source_rate=22050):
+    """Mede o reamostrador e a abertura/latência do dispositivo"""
+    print("\n📊 Benchmark da saída de áudio")
+    print("="*50)
+
+    t = np.arange(int(seconds * source_rate)) / source_rate
+    wav = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    for dst in (44100, 48000):
+        resampler = PolyphaseResampler(source_rate, dst)
+        block = 1024
+        start = time.perf_counter()
+        for i in range(0, len(wav), block):
+            resampler.process(wav[i:i + block])
+        resampler.flush()
+        elapsed = time.perf_counter() - start
+        print(f"  {source_rate} -> {dst} Hz: {seconds / elapsed:.0f}x tempo real "
+              f"(L/M = {resampler.up}/{resampler.down})")
+
+    # Loudness + limitador em blocos de 10 ms na taxa do dispositivo
+    loudness = LoudnessNormalizer(48000)
+    wav48 = (0.3 * np.sin(2 * np.pi * 440 * np.arange(int(seconds * 48000)) / 48000)).astype(np.float32)
+    start = time.perf_counter()
+    for i in range(0, len(wav48), 480):
+        loudness.process(wav48[i:i + 480])
+    loudness.flush()
+    elapsed = time.perf_counter() - start
+    print(f"  Loudness 48000 Hz: {elapsed / seconds * 100:.1f}% do tempo real "
+          f"(medida {loudness.loudness():.1f} LUFS, ganho {loudness.gain_db:+.1f} dB)")
+
+    output = MiraiAudioOutput(device)
+    latencies = []
+    output.play([wav[:source_rate]], source_rate,
+                on_start=lambda offset: latencies.append(offset * 1000))
+    output.close()
+
+    print(f"  Abertura do dispositivo: {output.stats['open_ms']:.0f} ms")
+    print(f"  Latência do stream: {output.stats['latency_ms']:.1f} ms")
+    if latencies:
+        print(f"  Primeiro sample no alto-falante: {latencies[0]:.1f} ms")
+    print(f"  Underruns: {output.underruns}")
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else None)
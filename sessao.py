@@ -0,0 +1,522 @@
+"""
+Gravação de sessões e replay determinístico para investigar turnos lentos
+
+Cada sessão é uma pasta compacta:
+- mic.pcm: áudio do microfone em int16 mono 16 kHz, uma fala depois da outra
+  (abre direto com np.memmap, sem carregar tudo na memória)
+- eventos.jsonl: um evento por linha (ASR, requisição/resposta do LLM com o
+  tempo de cada chunk, hash e semente do áudio sintetizado, início/fim de turno)
+- Textos repetidos (prompt de sistema, histórico) são gravados uma vez e
+  referenciados pelo hash
+
+O replay reconstrói a MiraiAssistant e troca o Ollama (conversa e tela) por
+um cliente que devolve os tokens gravados no mesmo ritmo em que chegaram.
+O VITS sorteia ruído na síntese: com a gravação ativa cada fala usa uma
+semente derivada de (turno, índice da fala), então o replay gravado em
+--saida reproduz o mesmo áudio e os hashes podem ser comparados.
+
+Uso:
+    python sessao.py resumo sessoes/20260101-120000
+    python sessao.py replay sessoes/20260101-120000 [--texto] [--velocidade 0] [--saida <pasta>]
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+TAXA_MIC = 16000
+VERSAO = 1
+
+
+def _hash(data):
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def semente(turn, index):
+    """Semente da fala 'index' do turno: a mesma na gravação e no replay"""
+    return int(hashlib.sha1(f"{turn}:{index}".encode()).hexdigest()[:8], 16) & 0x7FFFFFFF
+
+
+def nova_sessao(base_dir):
+    """Pasta nova (data e hora) para gravar uma sessão"""
+    return os.path.join(base_dir, time.strftime("%Y%m%d-%H%M%S"))
+
+
+class MiraiSessionRecorder:
+    def __init__(self, path):
+        """
+        Grava uma sessão (opt-in pela configuração 'session_dir')
+
+        Args:
+            path: Pasta da sessão (criada se não existir)
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._mic = open(os.path.join(path, "mic.pcm"), "ab")
+        self._mic_samples = self._mic.tell() // 2
+        self._events = open(os.path.join(path, "eventos.jsonl"), "a", encoding="utf-8")
+        self._texts = set()
+        self._start = time.perf_counter()
+        self.turn = 0
+        self._seeds = 0  # falas sintetizadas no turno
+        self._pending_seeds = []  # sementes sintetizadas e ainda não tocadas, em ordem
+        self._event("session", version=VERSAO, started_at=time.time(), mic_rate=TAXA_MIC)
+        print(f"⏺️  Gravando sessão em {path}")
+
+    def _now(self):
+        return round(time.perf_counter() - self._start, 4)
+
+    def _event(self, kind, **fields):
+        event = {"type": kind, "t": self._now(), "turn": self.turn}
+        event.update(fields)
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            if self._events.closed:
+                return
+            self._events.write(line + "\n")
+            self._events.flush()
+
+    def _text(self, content):
+        """Grava o texto uma única vez e devolve a referência"""
+        key = _hash(content.encode("utf-8"))
+        if key not in self._texts:
+            self._texts.add(key)
+            self._event("text", id=key, content=content)
+        return key
+
+    def record_audio(self, audio):
+        """
+        Anexa a fala capturada ao mic.pcm
+
+        Args:
+            audio: sr.AudioData do SpeechRecognition
+        """
+        raw = audio.get_raw_data(convert_rate=TAXA_MIC, convert_width=2)
+        with self._lock:
+            offset = self._mic_samples
+            self._mic.write(raw)
+            self._mic.flush()
+            self._mic_samples += len(raw) // 2
+        self._event("mic", offset=offset, samples=len(raw) // 2)
+
+    def record_asr(self, text, seconds, engine, error=None):
+        self._event("asr", text=text, ms=round(seconds * 1000, 1), engine=engine, error=error)
+
+    def begin_turn(self, command):
+        with self._lock:
+            self.turn += 1
+            self._seeds = 0
+            self._pending_seeds.clear()
+        self._event("turn_start", command=command)
+
+    def next_seed(self):
+        """Semente para a próxima síntese do turno (guardada no evento 'tts' ao tocar)"""
+        with self._lock:
+            seed = semente(self.turn, self._seeds)
+            self._seeds += 1
+            self._pending_seeds.append(seed)
+        return seed
+
+    def drop_seed(self, seed):
+        """A síntese falhou e não vai tocar: a semente não pertence a nenhum evento 'tts'"""
+        with self._lock:
+            if seed in self._pending_seeds:
+                self._pending_seeds.remove(seed)
+
+    def record_app(self, command, app, question, response):
+        """Desfecho de "abre o ..." (response None: a abertura falhou e o LLM respondeu)"""
+        self._event("app", command=command, app=app, question=question, response=response)
+
+    def end_turn(self, response, seconds):
+        self._event("turn_end", response=response, ms=round(seconds * 1000, 1))
+
+    def wrap_client(self, client):
+        """Cliente do Ollama que grava cada chat (mesma interface do original)"""
+        return _ClienteGravado(client, self)
+
+    def record_chat(self, request, chunks, started, error=None):
+        messages = [{"role": m["role"], "text": self._text(m["content"])} for m in request.get("messages", [])]
+        self._event(
+            "llm",
+            model=request.get("model"),
+            messages=messages,
+            options=request.get("options"),
+            stream=bool(request.get("stream")),
+            chunks=chunks,
+            ms=round((time.perf_counter() - started) * 1000, 1),
+            error=error,
+        )
+
+    def tts_blocks(self, blocks, sample_rate):
+        """
+        Repassa os blocos de áudio guardando o hash e o tempo da síntese
+
+        O hash permite conferir no replay se a voz saiu igual; a semente
+        usada na síntese vai junto no evento.
+        """
+        with self._lock:
+            seed = self._pending_seeds.pop(0) if self._pending_seeds else None
+        digest = hashlib.sha1()
+        samples = 0
+        first_ms = None
+        start = time.perf_counter()
+        try:
+            for block in blocks:
+                if first_ms is None:
+                    first_ms = (time.perf_counter() - start) * 1000
+                data = np.ascontiguousarray(block, dtype=np.float32)
+                digest.update(data.tobytes())
+                samples += len(data)
+                yield block
+        finally:
+            self._event(
+                "tts",
+                sha1=digest.hexdigest()[:16],
+                seed=seed,
+                samples=samples,
+                sample_rate=sample_rate,
+                first_block_ms=round(first_ms, 1) if first_ms is not None else None,
+                ms=round((time.perf_counter() - start) * 1000, 1),
+            )
+
+    def close(self):
+        with self._lock:
+            self._mic.close()
+            self._events.close()
+
+
+class _ClienteGravado:
+    """Repassa chamadas ao cliente real e grava request, chunks e tempos"""
+
+    def __init__(self, client, recorder):
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def chat(self, **kwargs):
+        started = time.perf_counter()
+        if not kwargs.get("stream"):
+            try:
+                response = self._client.chat(**kwargs)
+            except Exception as e:
+                self._recorder.record_chat(kwargs, [], started, error=str(e))
+                raise
+            chunk = _chunk_gravado(response, started)
+            self._recorder.record_chat(kwargs, [chunk], started)
+            return response
+        return self._stream(kwargs, started)
+
+    def _stream(self, kwargs, started):
+        chunks = []
+        error = None
+        try:
+            for chunk in self._client.chat(**kwargs):
+                chunks.append(_chunk_gravado(chunk, started))
+                yield chunk
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # Também grava quando o consumidor para no meio (parada antecipada)
+            self._recorder.record_chat(kwargs, chunks, started, error=error)
+
+
+def _chunk_gravado(chunk, started):
+    """[segundos desde o pedido, texto, done, done_reason, eval_count]"""
+    return [
+        round(time.perf_counter() - started, 4),
+        chunk["message"]["content"],
+        bool(chunk.get("done")),
+        chunk.get("done_reason"),
+        chunk.get("eval_count"),
+    ]
+
+
+class MiraiSessionArchive:
+    def __init__(self, path):
+        """
+        Leitura de uma sessão gravada
+
+        Args:
+            path: Pasta da sessão
+        """
+        self.path = path
+        self.texts = {}
+        self.events = []
+        with open(os.path.join(path, "eventos.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "text":
+                    self.texts[event["id"]] = event["content"]
+                else:
+                    self.events.append(event)
+
+        mic_path = os.path.join(path, "mic.pcm")
+        if os.path.exists(mic_path) and os.path.getsize(mic_path) > 0:
+            self.mic = np.memmap(mic_path, dtype=np.int16, mode="r")
+        else:
+            self.mic = np.zeros(0, dtype=np.int16)
+
+    def of_type(self, kind, turn=None):
+        return [e for e in self.events if e["type"] == kind and (turn is None or e["turn"] == turn)]
+
+    def turns(self):
+        """
+        Turnos gravados em ordem
+
+        Returns:
+            list: [{"turn", "command", "response", "ms", "mic", "asr", "llm", "tts", "app"}]
+
+        Áudio e ASR chegam antes do turn_start, então ficam com o turno seguinte.
+        """
+        turns = []
+        pending = {"mic": [], "asr": []}
+        current = None
+        for event in self.events:
+            kind = event["type"]
+            if kind in ("mic", "asr"):
+                pending[kind].append(event)
+            elif kind == "turn_start":
+                current = {"turn": event["turn"], "command": event["command"], "response": None,
+                           "ms": None, "llm": [], "tts": [], "app": [], **pending}
+                pending = {"mic": [], "asr": []}
+                turns.append(current)
+            elif current is not None and kind in ("llm", "tts", "app"):
+                current[kind].append(event)
+            elif current is not None and kind == "turn_end":
+                current["response"] = event["response"]
+                current["ms"] = event["ms"]
+        return turns
+
+    def audio(self, event):
+        """Fala gravada (int16 16 kHz) de um evento 'mic', sem copiar do disco"""
+        return self.mic[event["offset"]:event["offset"] + event["samples"]]
+
+    def audio_data(self, event):
+        """Fala gravada como sr.AudioData (para rodar o ASR de novo)"""
+        import speech_recognition as sr
+        return sr.AudioData(self.audio(event).tobytes(), TAXA_MIC, 2)
+
+    def messages(self, llm_event):
+        return [{"role": m["role"], "content": self.texts.get(m["text"], "")} for m in llm_event["messages"]]
+
+
+class MiraiReplayClient:
+    def __init__(self, archive, speed=1.0):
+        """
+        Cliente falso do Ollama que devolve as respostas gravadas
+
+        Args:
+            archive: MiraiSessionArchive
+            speed: 1.0 = ritmo gravado, 2.0 = duas vezes mais rápido, 0 = sem esperas
+        """
+        self.archive = archive
+        self.speed = speed
+        self._calls = list(archive.of_type("llm"))
+        self._next = 0
+        self._lock = threading.Lock()
+        self.divergences = 0
+
+    def _take(self, kwargs):
+        with self._lock:
+            if self._next >= len(self._calls):
+                raise RuntimeError("Sessão gravada não tem mais respostas do LLM")
+            call = self._calls[self._next]
+            self._next += 1
+
+        # Prompt diferente do gravado: o código mudou desde a gravação
+        recorded = [m["text"] for m in call["messages"]]
+        current = [_hash(m["content"].encode("utf-8")) for m in kwargs.get("messages", [])]
+        if recorded != current:
+            self.divergences += 1
+            print(f"⚠️  Replay: mensagens da chamada {self._next} diferem da gravação")
+        return call
+
+    def _wait_until(self, started, t):
+        if self.speed:
+            delay = t / self.speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def chat(self, **kwargs):
+        call = self._take(kwargs)
+        started = time.perf_counter()
+        if not kwargs.get("stream"):
+            t, content, done, reason, count = call["chunks"][-1] if call["chunks"] else (0, "", True, None, None)
+            self._wait_until(started, t)
+            if call["error"] and not call["chunks"]:
+                raise RuntimeError(call["error"])
+            return _chunk_replay(content, True, reason, count)
+        return self._stream(call, started)
+
+    def _stream(self, call, started):
+        for t, content, done, reason, count in call["chunks"]:
+            self._wait_until(started, t)
+            yield _chunk_replay(content, done, reason, count)
+        if call["error"]:
+            raise RuntimeError(call["error"])
+
+
+class MiraiReplayApps:
+    def __init__(self, archive):
+        """
+        Desfechos gravados de "abre o ..." para o replay
+
+        Nada é aberto e nada é perguntado (input/microfone): o comando recebe o
+        mesmo desfecho da gravação, e as chamadas do LLM seguem alinhadas.
+        """
+        self._outcomes = list(archive.of_type("app"))
+
+    def take(self, command):
+        """Próximo desfecho gravado, se for deste comando (None: não era abrir aplicativo)"""
+        if self._outcomes and self._outcomes[0]["command"] == command:
+            return self._outcomes.pop(0)
+        return None
+
+
+def _chunk_replay(content, done, reason, count):
+    return {"message": {"role": "assistant", "content": content}, "done": done,
+            "done_reason": reason, "eval_count": count}
+
+
+def replay(path, text_only=False, speed=1.0, reasr=False, output=None, config_file="mirai_config.json"):
+    """
+    Roda a MiraiAssistant sobre uma sessão gravada e compara os tempos
+
+    Args:
+        path: Pasta da sessão gravada
+        text_only: Não sintetiza/toca áudio (só LLM e pipeline de texto)
+        speed: Ritmo das respostas do LLM (ver MiraiReplayClient)
+        reasr: Roda o reconhecimento de fala de novo sobre o áudio gravado
+        output: Pasta base para gravar o próprio replay (permite comparar hashes de áudio)
+
+    Returns:
+        list: [{"turn", "recorded_ms", "replay_ms", "asr_ms"}]
+    """
+    from main import MiraiAssistant
+
+    archive = MiraiSessionArchive(path)
+    turns = archive.turns()
+    print(f"🔁 Replay de {path}: {len(turns)} turnos")
+
+    # Sem memória persistente nem endpoint: o replay não pode alterar o estado real.
+    # Aplicativos não são abertos de novo (o desfecho gravado é reaplicado) e sem voz
+    # não há confirmações para sintetizar
+    overrides = {"memory_db": None, "metrics_port": None, "session_dir": output, "apps_enabled": False}
+    if text_only:
+        overrides["ack_enabled"] = False
+    assistant = MiraiAssistant(config_file, overrides=overrides)
+    assistant.app_replay = MiraiReplayApps(archive)
+    client = MiraiReplayClient(archive, speed=speed)
+    recorder = assistant.recorder
+    assistant.ai.client = recorder.wrap_client(client) if recorder is not None else client
+    # Perguntas sobre a tela também foram gravadas: não podem chamar o Ollama real
+    if assistant.screen is not None:
+        assistant.screen.client = assistant.ai.client
+
+    results = []
+    for turn in turns:
+        asr_ms = None
+        if reasr and turn["mic"]:
+            backend = assistant.listener.asr or assistant.listener.fallback()
+            start = time.perf_counter()
+            for event in turn["mic"]:
+                try:
+                    # O mic.pcm já está em int16 16 kHz: vai direto para o backend
+                    backend.transcribe(archive.audio(event))
+                except Exception as e:
+                    print(f"⚠️  ASR falhou no replay: {e}")
+            asr_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        assistant.process_command(turn["command"], text_only=text_only)
+        replay_ms = (time.perf_counter() - start) * 1000
+        results.append({"turn": turn["turn"], "recorded_ms": turn["ms"], "replay_ms": replay_ms,
+                        "asr_ms": asr_ms})
+
+    if recorder is not None:
+        recorder.close()
+        output = recorder.path
+
+    print("\n📊 Turno   gravado    replay     Δ")
+    for r in results:
+        recorded = r["recorded_ms"] or 0.0
+        print(f"  {r['turn']:>4}  {recorded:>7.0f} ms {r['replay_ms']:>7.0f} ms {r['replay_ms'] - recorded:>+7.0f} ms")
+    if client.divergences:
+        print(f"⚠️  {client.divergences} chamadas do LLM com prompt diferente da gravação")
+
+    if output is not None and not text_only:
+        comparar_audio(archive, MiraiSessionArchive(output))
+    return results
+
+
+def comparar_audio(original, replayed):
+    """
+    Confere, turno a turno, se o áudio sintetizado no replay é idêntico ao gravado
+
+    Só faz sentido com a mesma semente por fala (ver MiraiSessionRecorder.next_seed);
+    sementes diferentes são reportadas à parte.
+    """
+    diferentes = 0
+    for a, b in zip(original.turns(), replayed.turns()):
+        seeds_a = [e.get("seed") for e in a["tts"]]
+        seeds_b = [e.get("seed") for e in b["tts"]]
+        hashes_a = [e["sha1"] for e in a["tts"]]
+        hashes_b = [e["sha1"] for e in b["tts"]]
+        if None in seeds_a or seeds_a != seeds_b:
+            diferentes += 1
+            print(f"⚠️  Turno {a['turn']}: sementes da síntese diferentes (áudio não comparável)")
+        elif hashes_a != hashes_b:
+            diferentes += 1
+            print(f"⚠️  Turno {a['turn']}: áudio sintetizado diferente da gravação")
+    if not diferentes:
+        print("✅ Áudio sintetizado idêntico à gravação")
+    return diferentes
+
+
+def resumo(path):
+    """Imprime os tempos de cada turno gravado"""
+    archive = MiraiSessionArchive(path)
+    print(f"📼 Sessão {path}: {len(archive.mic) / TAXA_MIC:.1f}s de microfone")
+    for turn in archive.turns():
+        asr = sum(e["ms"] for e in turn["asr"])
+        llm_first = next((c[0] * 1000 for e in turn["llm"] for c in e["chunks"] if c[1]), None)
+        llm = sum(e["ms"] for e in turn["llm"])
+        tts_first = next((e["first_block_ms"] for e in turn["tts"] if e["first_block_ms"] is not None), None)
+        print(f"  [{turn['turn']}] '{turn['command'][:40]}' turno {turn['ms'] or 0:.0f} ms | "
+              f"ASR {asr:.0f} ms | LLM 1º token {llm_first or 0:.0f} ms, total {llm:.0f} ms | "
+              f"TTS 1º bloco {tts_first or 0:.0f} ms")
+
+
+# Teste direto
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sessões gravadas da MIRAI")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_resumo = sub.add_parser("resumo", help="Tempos de cada turno gravado")
+    p_resumo.add_argument("sessao")
+
+    p_replay = sub.add_parser("replay", help="Reproduz a sessão na MiraiAssistant")
+    p_replay.add_argument("sessao")
+    p_replay.add_argument("--texto", action="store_true", help="Sem síntese de voz")
+    p_replay.add_argument("--velocidade", type=float, default=1.0, help="Ritmo do LLM (0 = sem esperas)")
+    p_replay.add_argument("--asr", action="store_true", help="Roda o reconhecimento de fala de novo")
+    p_replay.add_argument("--saida", default=None, help="Grava o replay para comparar o áudio")
+    p_replay.add_argument("--config", default="mirai_config.json")
+
+    args = parser.parse_args()
+    if args.cmd == "resumo":
+        resumo(args.sessao)
+    else:
+        replay(args.sessao, text_only=args.texto, speed=args.velocidade, reasr=args.asr,
+               output=args.saida, config_file=args.config)
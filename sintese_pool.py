@@ -0,0 +1,273 @@
+"""
+Pool de processos para síntese de voz em paralelo
+Cada worker carrega o modelo Coqui uma única vez e devolve o áudio
+por memória compartilhada (multiprocessing.shared_memory) em vez de pickle
+"""
+import os
+import sys
+import time
+import threading
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import numpy as np
+
+from audio_utils import para_float32
+
+# Estado de cada processo worker (carregado uma única vez no initializer)
+_worker_tts = None
+_worker_sample_rate = 22050
+
+
+def _init_worker(model_name, torch_threads):
+    """Carrega o modelo TTS dentro do processo worker"""
+    global _worker_tts, _worker_sample_rate
+
+    import torch
+    from TTS.api import TTS
+
+    # Evita que cada worker dispute todos os núcleos
+    torch.set_num_threads(torch_threads)
+
+    _worker_tts = TTS(model_name=model_name, progress_bar=False).to("cpu")
+
+    if hasattr(_worker_tts, 'sample_rate'):
+        _worker_sample_rate = _worker_tts.sample_rate
+    elif hasattr(_worker_tts, 'model') and hasattr(_worker_tts.model, 'sample_rate'):
+        _worker_sample_rate = _worker_tts.model.sample_rate
+
+
+def _synthesize_job(text, language, seed=None):
+    """
+    Sintetiza um texto no worker e escreve o resultado em memória compartilhada
+
+    Args:
+        seed: Semente do torch para esta frase (síntese reprodutível, ver sessao.py)
+
+    Returns:
+        tuple: (nome do bloco compartilhado, número de amostras, sample_rate)
+    """
+    kwargs = {"text": text}
+    if language and hasattr(_worker_tts, 'language'):
+        kwargs["language"] = language
+
+    if seed is not None:
+        import torch
+        torch.manual_seed(seed)
+
+    wav = para_float32(_worker_tts.tts(**kwargs))
+
+    # SharedMemory não aceita tamanho 0
+    shm = shared_memory.SharedMemory(create=True, size=max(wav.nbytes, 1))
+    try:
+        dest = np.ndarray(wav.shape, dtype=np.float32, buffer=shm.buf)
+        dest[:] = wav
+        return shm.name, len(wav), _worker_sample_rate
+    finally:
+        shm.close()
+
+
+def _read_shared_audio(name, length):
+    """Copia o áudio do bloco compartilhado e libera o bloco"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray((length,), dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def physical_cores():
+    """Estimativa do número de núcleos físicos (sem psutil)"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cores = set()
+            physical_id = core_id = None
+            for line in f:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    core_id = line.split(":")[1].strip()
+                    cores.add((physical_id, core_id))
+            if cores:
+                return len(cores)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+class MiraiSynthesisPool:
+    def __init__(self, model_name="tts_models/pt/cv/vits", workers=None, language="pt"):
+        """
+        Inicializa o pool de workers de síntese
+
+        Args:
+            model_name: Modelo Coqui carregado em cada worker
+            workers: Número de processos (padrão: núcleos físicos)
+            language: Idioma enviado para modelos multilíngues
+        """
+        self.model_name = model_name
+        self.workers = workers or physical_cores()
+        self.language = language
+
+        # Cada worker usa uma fatia dos núcleos para não haver oversubscription
+        torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        print(f"🏭 Iniciando {self.workers} workers de síntese ({torch_threads} threads cada)...")
+
+        # spawn evita herdar estado do torch do processo principal
+        ctx = mp.get_context("spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model_name, torch_threads)
+        )
+
+        # Filas por sessão para devolver as frases na ordem de envio
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._sequence = itertools.count()
+
+    def submit(self, text, session="default", language=None, seed=None):
+        """
+        Envia uma frase para síntese (FIFO global entre sessões)
+
+        Args:
+            language: Idioma desta frase (padrão: o do pool)
+            seed: Semente do torch para esta frase (None = aleatória)
+
+        Returns:
+            Future com (nome, tamanho, sample_rate)
+        """
+        future = self._submit(text, language, seed)
+        with self._lock:
+            self._sessions.setdefault(session, deque()).append((next(self._sequence), future))
+        return future
+
+    def _submit(self, text, language=None, seed=None):
+        return self.executor.submit(_synthesize_job, text, language or self.language, seed)
+
+    @staticmethod
+    def _result(future):
+        """Espera o future e lê o áudio da memória compartilhada"""
+        try:
+            name, length, sample_rate = future.result()
+            return _read_shared_audio(name, length), sample_rate
+        except Exception as e:
+            print(f"❌ Erro no worker de síntese: {e}")
+            return None, None
+
+    def next_result(self, session="default"):
+        """
+        Retorna o próximo áudio da sessão, na ordem de envio
+
+        Returns:
+            tuple: (audio_data, sample_rate) ou (None, None) se a sessão estiver vazia
+        """
+        with self._lock:
+            queue = self._sessions.get(session)
+            if not queue:
+                return None, None
+            _, future = queue.popleft()
+        return self._result(future)
+
+    def synthesize(self, text, language=None, seed=None):
+        """
+        Sintetiza uma frase e espera o resultado
+
+        Espera o próprio future: chamadas concorrentes (pipeline de frases,
+        confirmação falada, etc.) não pegam o áudio umas das outras.
+        """
+        return self._result(self._submit(text, language, seed))
+
+    def synthesize_many(self, texts, session=None):
+        """
+        Sintetiza várias frases em paralelo e devolve na ordem original
+
+        Mantém até 2x o número de workers em voo para não acumular memória.
+
+        Args:
+            session: Fila usada para a ordem (padrão: uma fila só desta chamada)
+        """
+        if session is None:
+            session = object()
+        pending = 0
+        for text in texts:
+            self.submit(text, session)
+            pending += 1
+            if pending >= self.workers * 2:
+                yield self.next_result(session)
+                pending -= 1
+
+        while pending:
+            yield self.next_result(session)
+            pending -= 1
+
+        with self._lock:
+            if not self._sessions.get(session):
+                self._sessions.pop(session, None)
+
+    def shutdown(self):
+        """Encerra os workers e libera blocos ainda não lidos"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+
+        for queue in sessions:
+            for _, future in queue:
+                try:
+                    name, length, _ = future.result()
+                    _read_shared_audio(name, length)
+                except Exception:
+                    pass
+
+        self.executor.shutdown(wait=True)
+        print("🏭 Workers de síntese encerrados")
+
+
+def benchmark(model_name="tts_models/pt/cv/vits", sentences=32, max_workers=None):
+    """
+    Mede a vazão (segundos de áudio por segundo de relógio) para 1..N workers
+    """
+    textos = [
+        f"Frase de teste número {i}. Hai! Eu sou a Mirai, sua assistente virtual."
+        for i in range(sentences)
+    ]
+    max_workers = max_workers or physical_cores()
+
+    print("\n📊 Benchmark do pool de síntese")
+    print("="*50)
+
+    # 1, 2, 4, ... até o número de núcleos físicos (inclusive)
+    counts = sorted({2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers} | {max_workers})
+
+    base = None
+    for workers in counts:
+        pool = MiraiSynthesisPool(model_name=model_name, workers=workers)
+
+        # Aquece todos os workers antes de medir
+        list(pool.synthesize_many(["Aquecendo."] * workers))
+
+        start = time.perf_counter()
+        audio_seconds = 0.0
+        for wav, sample_rate in pool.synthesize_many(textos):
+            if wav is not None:
+                audio_seconds += len(wav) / sample_rate
+        elapsed = time.perf_counter() - start
+        pool.shutdown()
+
+        throughput = audio_seconds / elapsed
+        base = base or throughput
+        print(f"👷 {workers} workers: {throughput:.2f}s áudio/s "
+              f"(speedup {throughput / base:.2f}x, eficiência {throughput / base / workers:.0%})")
+
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    benchmark(max_workers=max_workers)
@@ -0,0 +1,151 @@
+"""
+Síntese em streaming: o áudio sai em blocos enquanto a frase ainda está sendo gerada
+- VITS: o decoder HiFi-GAN roda em janelas sobrepostas do latente, com crossfade
+- XTTS: usa o inference_stream nativo do modelo
+"""
+import threading
+import numpy as np
+import torch
+
+
+class _CapturaLatente(torch.nn.Module):
+    """Substitui o decoder por um instante para capturar o latente z (e g)"""
+
+    def __init__(self, hop_length):
+        super().__init__()
+        self.hop_length = hop_length
+        self.z = None
+        self.g = None
+
+    def forward(self, z, g=None):
+        self.z = z
+        self.g = g
+        # Saída falsa barata; o áudio real é decodificado em janelas depois
+        return torch.zeros(z.shape[0], 1, z.shape[2] * self.hop_length, device=z.device)
+
+
+# Troca temporária do decoder não pode acontecer em duas threads ao mesmo tempo,
+# nem durante uma síntese comum do mesmo modelo (falar.py também segura esta trava)
+decoder_lock = threading.Lock()
+
+
+def _vits_hop_length(vits):
+    """Amostras por quadro do latente (produto dos fatores de upsampling)"""
+    rates = getattr(vits.args, "upsample_rates_decoder", None)
+    if rates:
+        return int(np.prod(rates))
+    return vits.config.audio.hop_length
+
+
+def vits_latent(vits, text, speaker_id=None, seed=None):
+    """
+    Roda encoder, duração e flow do VITS e devolve o latente antes do decoder
+
+    Args:
+        seed: Semente do torch (o ruído do flow e da duração é sorteado aqui)
+
+    Returns:
+        tuple: (z [1, C, T], g ou None, hop_length)
+    """
+    hop_length = _vits_hop_length(vits)
+    ids = vits.tokenizer.text_to_ids(text)
+    device = next(vits.parameters()).device
+    x = torch.LongTensor(ids).unsqueeze(0).to(device)
+
+    aux_input = {"x_lengths": torch.LongTensor([x.shape[1]]).to(device)}
+    if speaker_id is not None:
+        aux_input["speaker_ids"] = torch.LongTensor([speaker_id]).to(device)
+
+    captura = _CapturaLatente(hop_length)
+    with decoder_lock:
+        if seed is not None:
+            torch.manual_seed(seed)
+        decoder = vits.waveform_decoder
+        vits.waveform_decoder = captura
+        try:
+            with torch.no_grad():
+                vits.inference(x, aux_input=aux_input)
+        finally:
+            vits.waveform_decoder = decoder
+
+    return captura.z, captura.g, hop_length
+
+
+def stream_vits(vits, text, window=32, context=8, fade=2, speaker_id=None, seed=None):
+    """
+    Decodifica o VITS em janelas sobrepostas do latente
+
+    Args:
+        vits: Modelo Vits do Coqui (tts.synthesizer.tts_model)
+        window: Quadros do latente por bloco (bloco = window * hop amostras)
+        context: Quadros extras de cada lado para o campo receptivo do decoder
+        fade: Quadros de crossfade entre blocos consecutivos
+
+    Yields:
+        np.ndarray float32 com o próximo bloco de áudio
+    """
+    z, g, hop = vits_latent(vits, text, speaker_id, seed)
+    total = z.shape[2]
+
+    start = 0
+    tail = None
+    while start < total:
+        end = min(total, start + window)
+        fade_end = min(total, end + fade)
+        left = max(0, start - context)
+        right = min(total, fade_end + context)
+
+        with torch.no_grad():
+            audio = vits.waveform_decoder(z[:, :, left:right], g=g)
+        audio = audio.squeeze().float().cpu().numpy()
+
+        # Amostras correspondentes a [start, fade_end)
+        segment = audio[(start - left) * hop:(fade_end - left) * hop].copy()
+
+        # Crossfade com a cauda do bloco anterior
+        if tail is not None:
+            n = min(len(tail), len(segment))
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            segment[:n] = tail[:n] * (1.0 - ramp) + segment[:n] * ramp
+
+        overlap = (fade_end - end) * hop
+        if overlap and end < total:
+            tail = segment[-overlap:]
+            segment = segment[:-overlap]
+        else:
+            tail = None
+
+        yield segment
+        start = end
+
+
+def stream_xtts(xtts, text, language="pt", speaker=None, stream_chunk_size=20, seed=None):
+    """
+    Streaming nativo do XTTS
+
+    Args:
+        xtts: Modelo Xtts do Coqui (tts.synthesizer.tts_model)
+        speaker: Nome de um falante embutido (padrão: o primeiro)
+        seed: Semente do torch para a amostragem do GPT
+
+    Yields:
+        np.ndarray float32 com o próximo bloco de áudio
+    """
+    speakers = xtts.speaker_manager.speakers
+    if speaker not in speakers:
+        speaker = next(iter(speakers))
+    latents = speakers[speaker]
+
+    if seed is not None:
+        torch.manual_seed(seed)
+    with torch.no_grad():
+        for chunk in xtts.inference_stream(
+            text,
+            language,
+            latents["gpt_cond_latent"],
+            latents["speaker_embedding"],
+            stream_chunk_size=stream_chunk_size,
+            enable_text_splitting=False
+        ):
+            yield chunk.squeeze().float().cpu().numpy()
+
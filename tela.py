@@ -0,0 +1,347 @@
+"""
+Contexto de tela: captura a tela e responde perguntas sobre ela
+com um modelo multimodal do Ollama (llava, llama3.2-vision, ...)
+
+- A captura reutiliza o mesmo buffer a cada quadro
+- Hash perceptual + mapa de regiões sujas: tela igual nunca é recodificada
+- Quadros são reduzidos (e divididos em blocos se forem muito largos) antes do envio
+- A descrição de cada tela fica em cache e responde as perguntas seguintes
+"""
+import io
+import time
+from collections import OrderedDict
+import numpy as np
+
+MODELO_VISAO = "llava"
+
+# Miniatura em tons de cinza usada para hash e regiões sujas
+MINIATURA = 64
+GRADE = 8  # Grade de regiões (GRADE x GRADE), cada uma com 8x8 pixels da miniatura
+
+PROMPT_DESCRICAO = (
+    "Descreva esta captura de tela em português de forma objetiva: quais programas ou jogos "
+    "estão abertos, textos importantes visíveis, números, menus e o que o usuário parece estar fazendo."
+)
+PROMPT_ATUALIZACAO = (
+    "Esta é só a parte da tela que mudou. Descrição anterior da tela inteira:\n{descricao}\n\n"
+    "Reescreva a descrição completa da tela em português incorporando o que mudou nesta região."
+)
+
+
+class DisplaySource:
+    def __init__(self, monitor=1):
+        """
+        Captura do monitor real via mss
+
+        Args:
+            monitor: Índice do monitor no mss (0 = todos juntos, 1 = principal)
+        """
+        import mss
+
+        self._mss = mss.mss()
+        self.monitor = self._mss.monitors[monitor]
+        self._buffer = np.empty((self.monitor["height"], self.monitor["width"], 3), dtype=np.uint8)
+
+    def grab(self):
+        """Captura um quadro RGB no buffer reutilizado"""
+        shot = self._mss.grab(self.monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        if self._buffer.shape[:2] != bgra.shape[:2]:
+            self._buffer = np.empty((shot.height, shot.width, 3), dtype=np.uint8)
+        np.copyto(self._buffer, bgra[:, :, 2::-1])
+        return self._buffer
+
+
+class ImageSource:
+    def __init__(self, images):
+        """
+        Fonte de quadros a partir de imagens (testes e benchmarks sem monitor)
+
+        Args:
+            images: Caminhos de arquivo ou arrays HxWx3 uint8, devolvidos em ordem
+        """
+        self.images = list(images)
+        self.index = 0
+        self._buffer = None
+
+    def _load(self, image):
+        if isinstance(image, np.ndarray):
+            return image
+        from PIL import Image
+        with Image.open(image) as img:
+            return np.asarray(img.convert("RGB"))
+
+    def grab(self):
+        """Próxima imagem (a última se repete quando a lista acaba)"""
+        frame = self._load(self.images[min(self.index, len(self.images) - 1)])
+        self.index += 1
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty(frame.shape, dtype=np.uint8)
+        np.copyto(self._buffer, frame)
+        return self._buffer
+
+
+def miniatura(frame, size=MINIATURA):
+    """
+    Reduz o quadro para size x size em tons de cinza (média por bloco)
+
+    Amostra um pixel a cada `passo` antes da média: barato mesmo em 4K.
+    """
+    h, w = frame.shape[:2]
+    passo = max(1, min(h, w) // (size * 4))
+    sub = frame[::passo, ::passo]
+    gray = sub[:, :, 0] * 0.299 + sub[:, :, 1] * 0.587 + sub[:, :, 2] * 0.114
+
+    # Quadros menores que a miniatura (janelas pequenas): repete os pixels até caber
+    if gray.shape[0] < size:
+        gray = np.repeat(gray, -(-size // gray.shape[0]), axis=0)
+    if gray.shape[1] < size:
+        gray = np.repeat(gray, -(-size // gray.shape[1]), axis=1)
+
+    bh, bw = gray.shape[0] // size, gray.shape[1] // size
+    gray = gray[:bh * size, :bw * size]
+    return gray.reshape(size, bh, size, bw).mean(axis=(1, 3)).astype(np.float32)
+
+
+def hash_perceptual(thumb):
+    """aHash de 64 bits: cada bloco 8x8 da miniatura acima ou abaixo da mediana"""
+    n = thumb.shape[0] // 8
+    blocks = thumb.reshape(8, n, 8, n).mean(axis=(1, 3)).ravel()
+    bits = blocks > np.median(blocks)
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def distancia_hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def regioes_sujas(thumb, anterior, threshold=4.0, grade=GRADE):
+    """
+    Regiões da grade que mudaram desde o quadro anterior
+
+    Returns:
+        np.ndarray bool [grade, grade]
+    """
+    if anterior is None:
+        return np.ones((grade, grade), dtype=bool)
+    n = thumb.shape[0] // grade
+    diff = np.abs(thumb - anterior).reshape(grade, n, grade, n)
+    return diff.max(axis=(1, 3)) > threshold
+
+
+def codificar(frame, max_side=1024, quality=85, box=None):
+    """
+    Reduz e codifica em JPEG; quadros muito largos (vários monitores) viram blocos
+
+    Args:
+        box: Recorte (x0, y0, x1, y1) em pixels do quadro, ou None para tudo
+
+    Returns:
+        list[bytes]: Uma imagem JPEG por bloco
+    """
+    from PIL import Image
+
+    if box is not None:
+        x0, y0, x1, y1 = box
+        frame = frame[y0:y1, x0:x1]
+
+    h, w = frame.shape[:2]
+    # Mais de 2:1 de largura: divide em blocos aproximadamente quadrados
+    tiles = max(1, int(round(w / h / 1.5))) if w > 2 * h else 1
+    largura = w // tiles
+
+    imagens = []
+    for i in range(tiles):
+        img = Image.fromarray(np.ascontiguousarray(frame[:, i * largura:(i + 1) * largura]))
+        img.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+        saida = io.BytesIO()
+        img.save(saida, format="JPEG", quality=quality)
+        imagens.append(saida.getvalue())
+    return imagens
+
+
+class MiraiScreenContext:
+    def __init__(self, client, source=None, max_side=1024, cache_size=32, hash_tolerance=3,
+                 partial_limit=0.35):
+        """
+        Responde perguntas sobre a tela
+
+        Args:
+            client: Cliente com chat() no formato do Ollama (ex: build_pool(model="llava"))
+            source: Fonte de quadros com grab() (padrão: DisplaySource)
+            max_side: Maior lado da imagem enviada ao modelo
+            cache_size: Telas com descrição em cache
+            hash_tolerance: Bits de diferença para considerar a mesma tela
+            partial_limit: Fração máxima da tela suja para atualizar só a região
+        """
+        self.client = client
+        self.source = source or DisplaySource()
+        self.max_side = max_side
+        self.cache_size = cache_size
+        self.hash_tolerance = hash_tolerance
+        self.partial_limit = partial_limit
+
+        self._cache = OrderedDict()  # hash -> (miniatura, descrição)
+        self._last_thumb = None
+        self._last_hash = None
+        self._last_description = None
+
+        self.stats = {
+            "captures": 0, "cache_hits": 0, "unchanged": 0, "partial_updates": 0,
+            "full_descriptions": 0, "bytes_sent": 0, "capture_time": 0.0, "vision_time": 0.0,
+        }
+
+    def _cached(self, frame_hash, thumb):
+        """
+        Descrição de uma tela já vista (LRU)
+
+        O hash só escolhe os candidatos: o aHash 8x8 pela mediana quase não muda
+        com um diálogo ou um texto novo, então a miniatura também precisa bater
+        (mesmo teste de regiões sujas usado entre perguntas seguidas).
+        """
+        for key, (cached_thumb, description) in self._cache.items():
+            if (distancia_hamming(key, frame_hash) <= self.hash_tolerance
+                    and not regioes_sujas(thumb, cached_thumb).any()):
+                self._cache.move_to_end(key)
+                return description
+        return None
+
+    def _remember(self, frame_hash, thumb, description):
+        self._cache[frame_hash] = (thumb, description)
+        self._cache.move_to_end(frame_hash)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _vision(self, prompt, images):
+        start = time.perf_counter()
+        response = self.client.chat(
+            messages=[{"role": "user", "content": prompt, "images": images}],
+            options={"temperature": 0.2}
+        )
+        self.stats["vision_time"] += time.perf_counter() - start
+        self.stats["bytes_sent"] += sum(len(image) for image in images)
+        return response["message"]["content"].strip()
+
+    def describe(self):
+        """
+        Descrição da tela atual, reaproveitando o cache sempre que possível
+
+        Returns:
+            str: Descrição em português
+        """
+        start = time.perf_counter()
+        frame = self.source.grab()
+        thumb = miniatura(frame)
+        frame_hash = hash_perceptual(thumb)
+        dirty = regioes_sujas(thumb, self._last_thumb)
+        self.stats["captures"] += 1
+        self.stats["capture_time"] += time.perf_counter() - start
+
+        # Nada mudou desde a última pergunta
+        if self._last_description is not None and not dirty.any():
+            self.stats["unchanged"] += 1
+            return self._last_description
+
+        description = self._cached(frame_hash, thumb)
+        if description is not None:
+            self.stats["cache_hits"] += 1
+        elif self._last_description is not None and dirty.mean() <= self.partial_limit:
+            # Só parte da tela mudou: manda o recorte das regiões sujas
+            h, w = frame.shape[:2]
+            rows = np.flatnonzero(dirty.any(axis=1))
+            cols = np.flatnonzero(dirty.any(axis=0))
+            box = (
+                cols[0] * w // GRADE, rows[0] * h // GRADE,
+                (cols[-1] + 1) * w // GRADE, (rows[-1] + 1) * h // GRADE,
+            )
+            description = self._vision(
+                PROMPT_ATUALIZACAO.format(descricao=self._last_description),
+                codificar(frame, self.max_side, box=box)
+            )
+            self.stats["partial_updates"] += 1
+        else:
+            description = self._vision(PROMPT_DESCRICAO, codificar(frame, self.max_side))
+            self.stats["full_descriptions"] += 1
+
+        self._remember(frame_hash, thumb, description)
+        self._last_thumb = thumb
+        self._last_hash = frame_hash
+        self._last_description = description
+        return description
+
+    def ask(self, question):
+        """
+        Responde uma pergunta sobre a tela usando a descrição (sem reenviar a imagem)
+
+        Returns:
+            str: Resposta curta em português
+        """
+        description = self.describe()
+        response = self.client.chat(
+            messages=[
+                {"role": "system", "content": "Você é a Mirai. Responda em português, de forma curta, "
+                                              "usando só esta descrição da tela do usuário:\n" + description},
+                {"role": "user", "content": question},
+            ],
+            options={"temperature": 0.4}
+        )
+        return response["message"]["content"].strip()
+
+    def get_stats(self):
+        """Estatísticas de captura e uso do modelo"""
+        captures = self.stats["captures"]
+        return dict(
+            self.stats,
+            avg_capture_ms=(self.stats["capture_time"] / captures * 1000) if captures else 0.0,
+            vision_calls=self.stats["partial_updates"] + self.stats["full_descriptions"]
+        )
+
+
+def benchmark(width=2560, height=1440, questions=50):
+    """Quadros sintéticos: mede captura/hash e quantas chamadas ao modelo são evitadas"""
+
+    class _FakeVision:
+        def __init__(self):
+            self.calls = 0
+
+        def chat(self, messages, **kwargs):
+            self.calls += 1
+            return {"message": {"content": f"descrição {self.calls}"}}
+
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    janela = base.copy()
+    janela[100:500, 200:900] = 30  # Uma janela mudou num canto
+    outra = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    # Perguntas seguidas sobre a mesma tela, uma janela mudando, troca de tela e volta
+    quadros = [base] * (questions // 2) + [janela] * (questions // 4) + [outra] * 5 + [base] * 5
+    client = _FakeVision()
+    screen = MiraiScreenContext(client, source=ImageSource(quadros))
+
+    print(f"\n📊 Benchmark do contexto de tela ({width}x{height})")
+    print("="*50)
+    start = time.perf_counter()
+    for _ in quadros:
+        screen.describe()
+    elapsed = time.perf_counter() - start
+
+    stats = screen.get_stats()
+    print(f"  Captura + hash: {stats['avg_capture_ms']:.2f} ms por quadro")
+    print(f"  {len(quadros)} perguntas -> {stats['vision_calls']} chamadas ao modelo de visão "
+          f"({stats['full_descriptions']} completas, {stats['partial_updates']} parciais)")
+    print(f"  Sem mudança: {stats['unchanged']}, cache: {stats['cache_hits']}")
+    print(f"  {stats['bytes_sent'] / 1024:.0f} KB enviados, {elapsed * 1000 / len(quadros):.2f} ms por pergunta (sem o modelo)")
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark()
+    else:
+        from cliente_ollama import build_pool
+        screen = MiraiScreenContext(build_pool(model=sys.argv[2] if len(sys.argv) > 2 else MODELO_VISAO))
+        pergunta = " ".join(sys.argv[1:2]) or "O que está na minha tela?"
+        print(f"🖥️  {screen.ask(pergunta)}")
@@ -0,0 +1,223 @@
+"""
+Backend ONNX Runtime para a voz VITS em português
+Exporta tts_models/pt/cv/vits para ONNX (o frontend de texto continua em Python)
+e sintetiza com onnxruntime, sem importar torch no caminho de execução.
+
+Uso:
+    python tts_onnx.py export [--int8]   # gera models/onnx/
+    python tts_onnx.py bench             # compara torch x onnx na CPU
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from audio_utils import para_float32
+
+ONNX_DIR = "models/onnx"
+MODELO_PADRAO = "tts_models/pt/cv/vits"
+
+
+def _paths(output_dir, quantized=False):
+    nome = "vits_int8.onnx" if quantized else "vits.onnx"
+    return os.path.join(output_dir, nome), os.path.join(output_dir, "frontend.json")
+
+
+def export_onnx(model_name=MODELO_PADRAO, output_dir=ONNX_DIR, quantize=False):
+    """
+    Converte o modelo VITS do Coqui para ONNX
+
+    Args:
+        model_name: Modelo Coqui (precisa ser VITS)
+        output_dir: Pasta de saída
+        quantize: Também gera a versão int8 (quantização dinâmica)
+    """
+    from TTS.api import TTS
+
+    os.makedirs(output_dir, exist_ok=True)
+    onnx_path, frontend_path = _paths(output_dir)
+
+    print(f"🔄 Carregando {model_name} para exportação...")
+    tts = TTS(model_name=model_name, progress_bar=False).to("cpu")
+    vits = tts.synthesizer.tts_model
+    config = tts.synthesizer.tts_config
+
+    print(f"📦 Exportando grafo ONNX para {onnx_path}...")
+    vits.export_onnx(output_path=onnx_path, verbose=False)
+
+    # Frontend de texto: vocabulário e regras do tokenizer do Coqui
+    tokenizer = vits.tokenizer
+    characters = tokenizer.characters
+    model_args = config.model_args
+    frontend = {
+        "model_name": model_name,
+        "vocab": list(characters.vocab),
+        "add_blank": bool(tokenizer.add_blank),
+        "use_eos_bos": bool(tokenizer.use_eos_bos),
+        "blank_id": characters.blank_id,
+        "bos_id": characters.bos_id,
+        "eos_id": characters.eos_id,
+        "text_cleaner": tokenizer.text_cleaner.__name__ if tokenizer.text_cleaner else None,
+        "sample_rate": config.audio.sample_rate,
+        "scales": [
+            getattr(model_args, "inference_noise_scale", 0.667),
+            getattr(model_args, "length_scale", 1.0),
+            getattr(model_args, "inference_noise_scale_dp", 1.0),
+        ],
+    }
+    with open(frontend_path, "w", encoding="utf-8") as f:
+        json.dump(frontend, f, ensure_ascii=False, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        int8_path, _ = _paths(output_dir, quantized=True)
+        print(f"🗜️  Quantizando para int8: {int8_path}...")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+
+    print("✅ Exportação concluída")
+    return onnx_path
+
+
+class MiraiOnnxVoice:
+    def __init__(self, model_dir=ONNX_DIR, quantized=False, threads=None):
+        """
+        Voz VITS rodando no onnxruntime
+
+        Expõe tts() e sample_rate como o TTS.api.TTS, para que
+        MiraiTTS.generate_speech funcione sem mudanças.
+
+        Args:
+            model_dir: Pasta gerada por export_onnx
+            quantized: Usa o modelo int8
+            threads: Threads intra-op (padrão: núcleos disponíveis)
+        """
+        import onnxruntime as ort
+
+        onnx_path, frontend_path = _paths(model_dir, quantized)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"Modelo ONNX não encontrado: {onnx_path} (rode 'python tts_onnx.py export')")
+
+        with open(frontend_path, encoding="utf-8") as f:
+            self.frontend = json.load(f)
+
+        self.sample_rate = self.frontend["sample_rate"]
+        self.scales = np.array(self.frontend["scales"], dtype=np.float32)
+        self._char_to_id = {char: i for i, char in enumerate(self.frontend["vocab"])}
+        self._cleaner = self._load_cleaner(self.frontend["text_cleaner"])
+
+        # Opções de sessão ajustadas para inferência de baixa latência na CPU
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        options.enable_mem_pattern = True
+        options.enable_cpu_mem_arena = True
+
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _load_cleaner(self, name):
+        """Carrega o cleaner de texto do Coqui (módulo puro Python, sem torch)"""
+        if not name:
+            return None
+        try:
+            from TTS.tts.utils.text import cleaners
+            return getattr(cleaners, name)
+        except Exception as e:
+            print(f"⚠️  Cleaner '{name}' indisponível, usando texto cru: {e}")
+            return None
+
+    def text_to_ids(self, text):
+        """Mesmo processo do TTSTokenizer do Coqui: limpa, codifica e intercala blanks"""
+        if self._cleaner is not None:
+            text = self._cleaner(text)
+
+        ids = [self._char_to_id[char] for char in text if char in self._char_to_id]
+
+        if self.frontend["use_eos_bos"]:
+            ids = [self.frontend["bos_id"]] + ids + [self.frontend["eos_id"]]
+
+        if self.frontend["add_blank"]:
+            blank = self.frontend["blank_id"]
+            interleaved = [blank] * (len(ids) * 2 + 1)
+            interleaved[1::2] = ids
+            ids = interleaved
+
+        return np.array([ids], dtype=np.int64)
+
+    def tts(self, text, **kwargs):
+        """Sintetiza o texto e devolve o áudio float32"""
+        ids = self.text_to_ids(text)
+        inputs = {
+            "input": ids,
+            "input_lengths": np.array([ids.shape[1]], dtype=np.int64),
+            "scales": self.scales,
+        }
+        if "sid" in self._input_names:
+            inputs["sid"] = np.array([kwargs.get("speaker_id", 0)], dtype=np.int64)
+
+        audio = self.session.run(["output"], inputs)[0]
+        return para_float32(audio.reshape(-1))
+
+
+def benchmark(model_name=MODELO_PADRAO, model_dir=ONNX_DIR, runs=5):
+    """Compara tempo de inicialização e RTF do torch x onnxruntime na CPU"""
+    textos = [
+        "Rai! Eu sou a Mirai, sua assistente virtual.",
+        "Agora são quinze e trinta. Tem algum compromisso importante?",
+        "Sugói! Você conseguiu o personagem cinco estrelas no primeiro desejo!",
+    ]
+
+    def medir(nome, carregar):
+        start = time.perf_counter()
+        voz = carregar()
+        startup = time.perf_counter() - start
+
+        voz.tts(textos[0])  # aquecimento
+
+        audio_seconds = 0.0
+        start = time.perf_counter()
+        for _ in range(runs):
+            for texto in textos:
+                wav = voz.tts(texto)
+                audio_seconds += len(wav) / voz.sample_rate
+        elapsed = time.perf_counter() - start
+
+        print(f"  {nome:<12} início {startup:6.2f}s   RTF {elapsed / audio_seconds:.3f}")
+        return elapsed / audio_seconds
+
+    def carregar_torch():
+        from TTS.api import TTS
+        tts = TTS(model_name=model_name, progress_bar=False).to("cpu")
+        tts.sample_rate = tts.synthesizer.output_sample_rate
+        return tts
+
+    print("\n📊 Benchmark torch x onnxruntime (CPU)")
+    print("="*50)
+    resultados = {"onnx": medir("onnx", lambda: MiraiOnnxVoice(model_dir))}
+    if os.path.exists(_paths(model_dir, quantized=True)[0]):
+        resultados["onnx int8"] = medir("onnx int8", lambda: MiraiOnnxVoice(model_dir, quantized=True))
+    resultados["torch"] = medir("torch", carregar_torch)
+
+    for nome, rtf in resultados.items():
+        if nome != "torch":
+            print(f"⚡ {nome}: {resultados['torch'] / rtf:.2f}x mais rápido que torch")
+    print("="*50)
+
+
+# Teste direto
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend ONNX da voz da Mirai")
+    parser.add_argument("comando", choices=["export", "bench"])
+    parser.add_argument("--model", default=MODELO_PADRAO)
+    parser.add_argument("--dir", default=ONNX_DIR)
+    parser.add_argument("--int8", action="store_true", help="Gera também o modelo quantizado")
+    args = parser.parse_args()
+
+    if args.comando == "export":
+        export_onnx(args.model, args.dir, quantize=args.int8)
+    else:
+        benchmark(args.model, args.dir)